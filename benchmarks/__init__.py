@@ -0,0 +1,4 @@
+"""Benchmarks for the plugin's billing and encounter signal paths.
+
+Run from a care checkout with this plugin installed; see ``docs/benchmarks.md``.
+"""
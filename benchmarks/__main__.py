@@ -0,0 +1,126 @@
+"""Run the benchmark suite and emit JSON results.
+
+    python -m benchmarks --workers 1 4 --output benchmark.json
+
+Runs against a freshly created test database (``create_test_db``), so it
+needs the same database access as care's test suite.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import UTC, datetime
+from pathlib import Path
+from types import SimpleNamespace
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4], help="Concurrent worker counts")
+    parser.add_argument("--iterations", type=int, default=200, help="Operations per DB scenario and worker count")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16], help="In-flight operations for async scenarios")
+    parser.add_argument("--micro-iterations", type=int, default=10000, help="Calls per micro scenario")
+    parser.add_argument("--patients", type=int, default=200)
+    parser.add_argument("--history", type=int, default=20, help="Paid bookings per patient")
+    parser.add_argument("--schedules", type=int, default=4)
+    parser.add_argument("--revisit-days", type=int, default=7)
+    parser.add_argument("--invoices", type=int, default=20, help="Issued invoices receiving payments")
+    parser.add_argument("--payments", type=int, default=200, help="Existing payments per invoice")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--scenario", nargs="*", help="Only these scenarios")
+    parser.add_argument("--keepdb", action="store_true", help="Reuse the test database between runs")
+    parser.add_argument("--output", help="Write JSON here instead of stdout")
+    return parser.parse_args(argv)
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(  # noqa: S603
+            ["git", "rev-parse", "HEAD"],  # noqa: S607
+            cwd=Path(__file__).resolve().parent,
+            text=True,
+            stderr=subprocess.DEVNULL,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _selected(names, wanted):
+    return [name for name in names if not wanted or name in wanted]
+
+
+def run(args):
+    import django
+
+    django.setup()
+    from django.db import connection
+
+    from care_state_hmis.settings import plugin_settings
+
+    from . import harness, scenarios, seed
+
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=args.keepdb)
+    try:
+        rng = seed.make_rng(args.seed)
+        fixture = seed.seed_facility(
+            rng,
+            patients=args.patients,
+            schedules=args.schedules,
+            history=args.history,
+            revisit_allowed_days=args.revisit_days,
+        )
+        ctx = SimpleNamespace(rng=rng, fixture=fixture, invoices=seed.issued_invoices(fixture, args.invoices, args.payments))
+
+        results = []
+        for name in _selected(scenarios.DB_SCENARIOS, args.scenario):
+            scenario = scenarios.DB_SCENARIOS[name]
+            for workers in args.workers:
+                with scenarios.plugin_overrides(scenario):
+                    prepared = scenario(ctx, args.iterations)
+                    operations, check = prepared if isinstance(prepared, tuple) else (prepared, None)
+                    results.append({"scenario": name, "kind": "db", **harness.run_operations(operations, workers)})
+                    if check:
+                        results[-1]["check"] = check()
+                if scenario.plugin_settings:
+                    results[-1]["plugin_settings"] = scenario.plugin_settings
+                print(f"{name} x{workers}: {results[-1]['p50_ms']}ms p50, {results[-1]['throughput_ops']} ops/s", file=sys.stderr)
+        for name in _selected(scenarios.ASYNC_SCENARIOS, args.scenario):
+            for concurrency in args.concurrency:
+                operations = scenarios.ASYNC_SCENARIOS[name](ctx, args.iterations)
+                results.append({"scenario": name, "kind": "async", **harness.run_async_operations(operations, concurrency)})
+                print(f"{name} c{concurrency}: {results[-1]['throughput_ops']} ops/s", file=sys.stderr)
+        for name in _selected(scenarios.MICRO_SCENARIOS, args.scenario):
+            results.append({"scenario": name, "kind": "micro", **harness.run_micro(scenarios.MICRO_SCENARIOS[name](ctx), args.micro_iterations)})
+            print(f"{name}: {results[-1]['mean_ms']}ms mean", file=sys.stderr)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=args.keepdb)
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(UTC).isoformat(),
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "settings": {name: getattr(plugin_settings, name) for name in plugin_settings.defaults},
+            "parameters": {key: value for key, value in vars(args).items() if key != "output"},
+        },
+        "results": results,
+    }
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings.test")
+    report = json.dumps(run(args), indent=2, default=str)
+    if args.output:
+        Path(args.output).write_text(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Latency and throughput measurement for benchmark operations."""
+
+import asyncio
+import statistics
+import threading
+import time
+
+from django.db import close_old_connections, connections, transaction
+
+
+def _percentile(ordered, fraction):
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, round(fraction * (len(ordered) - 1)))
+    return ordered[index]
+
+
+class _QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def summarize(latencies, elapsed):
+    """Latency percentiles in milliseconds and operations per second."""
+    ordered = sorted(latencies)
+    return {
+        "operations": len(ordered),
+        "elapsed_s": round(elapsed, 4),
+        "throughput_ops": round(len(ordered) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3) if ordered else 0.0,
+        "p50_ms": round(_percentile(ordered, 0.50) * 1000, 3),
+        "p95_ms": round(_percentile(ordered, 0.95) * 1000, 3),
+        "p99_ms": round(_percentile(ordered, 0.99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+    }
+
+
+def run_operations(operations, workers=1, atomic=True):
+    """Run the callables in ``operations`` across ``workers`` threads.
+
+    Each operation runs in its own transaction (``atomic``), so on-commit work
+    is part of its latency. Every thread uses its own DB connection.
+    """
+    latencies = []
+    queries = []
+    errors = []
+    lock = threading.Lock()
+    queue = list(operations)
+    queue.reverse()
+
+    def worker():
+        close_old_connections()
+        local = []
+        counter = _QueryCounter()
+        try:
+            while True:
+                with lock:
+                    if not queue:
+                        break
+                    operation = queue.pop()
+                start = time.perf_counter()
+                counter.count = 0
+                try:
+                    with connections["default"].execute_wrapper(counter):
+                        if atomic:
+                            with transaction.atomic():
+                                operation()
+                        else:
+                            operation()
+                except Exception as e:  # noqa: BLE001
+                    with lock:
+                        errors.append(repr(e))
+                    continue
+                local.append((time.perf_counter() - start, counter.count))
+        finally:
+            with lock:
+                latencies.extend(elapsed for elapsed, _ in local)
+                queries.extend(count for _, count in local)
+            connections.close_all()
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    result = summarize(latencies, time.perf_counter() - start)
+    result["workers"] = workers
+    result["queries_per_op"] = round(statistics.fmean(queries), 2) if queries else 0.0
+    result["errors"] = len(errors)
+    if errors:
+        result["first_error"] = errors[0]
+    return result
+
+
+def run_async_operations(operations, concurrency=1):
+    """Await the coroutine functions in ``operations`` on one event loop, at most
+    ``concurrency`` in flight, as a single ASGI worker would serve them.
+    """
+    latencies = []
+    errors = []
+
+    async def run_all():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(operation):
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    await operation()
+                except Exception as e:  # noqa: BLE001
+                    errors.append(repr(e))
+                    return
+                latencies.append(time.perf_counter() - start)
+
+        await asyncio.gather(*(run(operation) for operation in operations))
+
+    start = time.perf_counter()
+    asyncio.run(run_all())
+    result = summarize(latencies, time.perf_counter() - start)
+    result["concurrency"] = concurrency
+    result["errors"] = len(errors)
+    if errors:
+        result["first_error"] = errors[0]
+    return result
+
+
+def run_micro(func, iterations):
+    """Time ``func`` called ``iterations`` times in this thread, without a DB transaction."""
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        began = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - began)
+    return summarize(latencies, time.perf_counter() - start)
@@ -0,0 +1,130 @@
+"""Measure ``manage.py check`` startup with and without the plugin.
+
+    python -m benchmarks.importtime --manage ../care/manage.py --baseline-settings config.settings.no_hmis
+
+Each run is ``python -X importtime manage.py check`` in a fresh interpreter.
+The plugin's share of the import time is read from the importtime tree (the
+cumulative time of ``care_state_hmis`` imports not nested in another
+``care_state_hmis`` import). ``--baseline-settings`` names a settings module
+without the plugin in ``INSTALLED_APPS`` for a measured baseline; without it
+the baseline is estimated as the total minus the plugin's share.
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+PLUGIN = "care_state_hmis"
+
+_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.importtime", description=__doc__.splitlines()[0])
+    parser.add_argument("--manage", default="manage.py", help="Path to care's manage.py")
+    parser.add_argument("--settings", default=os.environ.get("DJANGO_SETTINGS_MODULE", "config.settings.test"))
+    parser.add_argument("--baseline-settings", help="Settings module without the plugin installed")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per configuration; medians are reported")
+    parser.add_argument("--top", type=int, default=15, help="Slowest plugin-triggered imports to list")
+    parser.add_argument("--output", help="Write JSON here instead of stdout")
+    return parser.parse_args(argv)
+
+
+def parse_importtime(stderr):
+    """``[(module, self_us, cumulative_us, depth)]`` from ``-X importtime`` output."""
+    entries = []
+    for line in stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            entries.append((module, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return entries
+
+
+def plugin_imports(entries):
+    """Outermost plugin imports; their cumulative time includes everything they pulled in."""
+    outermost, plugin_depth = [], None
+    # Children are printed before their parent, so walk the tree from the root side
+    for module, _, cumulative_us, depth in reversed(entries):
+        if plugin_depth is not None and depth > plugin_depth:
+            continue
+        plugin_depth = None
+        if module.split(".")[0] == PLUGIN:
+            outermost.append((module, cumulative_us))
+            plugin_depth = depth
+    return outermost
+
+
+def run_check(manage, settings):
+    env = {**os.environ, "DJANGO_SETTINGS_MODULE": settings}
+    start = time.perf_counter()
+    completed = subprocess.run(  # noqa: S603
+        [sys.executable, "-X", "importtime", str(manage), "check"],
+        cwd=Path(manage).resolve().parent,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    wall = time.perf_counter() - start
+    if completed.returncode:
+        raise SystemExit(f"manage.py check failed with {settings}:\n{completed.stderr[-2000:]}")
+    entries = parse_importtime(completed.stderr)
+    return {
+        "wall_ms": wall * 1000,
+        "import_ms": sum(cumulative for _, _, cumulative, depth in entries if depth == 0) / 1000,
+        "plugin_imports": plugin_imports(entries),
+    }
+
+
+def _median(runs, key):
+    return round(statistics.median(run[key] for run in runs), 1)
+
+
+def measure(args):
+    runs = [run_check(args.manage, args.settings) for _ in range(args.repeat)]
+    for run in runs:
+        run["plugin_import_ms"] = sum(cumulative for _, cumulative in run["plugin_imports"]) / 1000
+    with_plugin = {key: _median(runs, key) for key in ("wall_ms", "import_ms", "plugin_import_ms")}
+
+    if args.baseline_settings:
+        baseline = [run_check(args.manage, args.baseline_settings) for _ in range(args.repeat)]
+        without_plugin = {key: _median(baseline, key) for key in ("wall_ms", "import_ms")}
+        without_plugin["estimated"] = False
+    else:
+        without_plugin = {
+            "wall_ms": round(with_plugin["wall_ms"] - with_plugin["plugin_import_ms"], 1),
+            "import_ms": round(with_plugin["import_ms"] - with_plugin["plugin_import_ms"], 1),
+            "estimated": True,
+        }
+
+    slowest = sorted(runs[-1]["plugin_imports"], key=lambda entry: entry[1], reverse=True)[: args.top]
+    return {
+        "meta": {
+            "python": sys.version.split()[0],
+            "parameters": {key: value for key, value in vars(args).items() if key != "output"},
+        },
+        "with_plugin": with_plugin,
+        "without_plugin": without_plugin,
+        "plugin_overhead_ms": round(with_plugin["wall_ms"] - without_plugin["wall_ms"], 1),
+        "slowest_plugin_imports": [{"module": module, "cumulative_ms": cumulative / 1000} for module, cumulative in slowest],
+    }
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    report = json.dumps(measure(args), indent=2)
+    if args.output:
+        Path(args.output).write_text(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""Benchmark scenarios.
+
+DB scenarios return a list of operations, prepared fresh for every worker
+count since most of them consume their data (a booking is linked once), or
+``(operations, check)`` where ``check()`` verifies the end state afterwards.
+Async scenarios return a list of coroutine functions awaited on one event
+loop, as one ASGI worker would. Micro scenarios return a single callable timed
+in-process without a database round trip.
+
+A DB scenario registered with plugin settings runs under them
+(``plugin_overrides``), so one run can compare a path with and without a
+feature enabled.
+"""
+
+from collections import Counter
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.test import override_settings
+from jsonschema import validate as jsonschema_validate
+from model_bakery import baker
+
+from care.emr.models.charge_item import ChargeItem
+from care.emr.models.encounter import Encounter
+from care.emr.models.invoice import Invoice
+from care.emr.models.scheduling.booking import TokenBooking
+from care.emr.resources.charge_item.spec import ChargeItemStatusOptions
+from care.emr.resources.invoice.spec import InvoiceStatusOptions
+from care_state_hmis import billing_service, invoice_ledger, invoicing
+from care_state_hmis.apps import PLUGIN_NAME
+from care_state_hmis.extensions import PatientDemographicsExtension
+from care_state_hmis.invoice_numbers import allocator, format_invoice_number
+from care_state_hmis.signals.encounter import guard_hospital_identifier
+
+from . import seed
+
+DB_SCENARIOS = {}
+ASYNC_SCENARIOS = {}
+MICRO_SCENARIOS = {}
+
+
+def db_scenario(name, **plugin_settings):
+    def register(func):
+        func.plugin_settings = plugin_settings
+        DB_SCENARIOS[name] = func
+        return func
+
+    return register
+
+
+def plugin_overrides(func):
+    """``override_settings`` for the plugin settings ``func`` was registered with."""
+    configs = getattr(settings, "PLUGIN_CONFIGS", {})
+    return override_settings(PLUGIN_CONFIGS={**configs, PLUGIN_NAME: {**configs.get(PLUGIN_NAME, {}), **func.plugin_settings}})
+
+
+def async_scenario(name):
+    def register(func):
+        ASYNC_SCENARIOS[name] = func
+        return func
+
+    return register
+
+
+def micro_scenario(name):
+    def register(func):
+        MICRO_SCENARIOS[name] = func
+        return func
+
+    return register
+
+
+def _link_operations(pairs):
+    def link(booking, charge_item):
+        def operation():
+            charge_item.save()
+            booking.charge_item = charge_item
+            booking.save(update_fields=["charge_item"])
+
+        return operation
+
+    return [link(booking, charge_item) for booking, charge_item in pairs]
+
+
+@db_scenario("booking_charge_item_save")
+def booking_charge_item_save(ctx, count):
+    """Create the default charge item and link it, as the booking view does; the
+    revisit decision is made before the item is written.
+    """
+    return _link_operations(seed.pending_bookings(ctx.rng, ctx.fixture, count))
+
+
+@db_scenario("booking_charge_item_save_fallback")
+def booking_charge_item_save_fallback(ctx, count):
+    """As above for an item not pointing at its booking: decided, and on a revisit
+    replaced, by the booking receiver.
+    """
+    return _link_operations(seed.pending_bookings(ctx.rng, ctx.fixture, count, appointment_resource=False))
+
+
+@db_scenario("booking_charge_item_save_block_numbers", HMIS_INVOICE_NUMBER_FORMAT="BLK{yy}{month}-{sequence:06d}")
+def booking_charge_item_save_block_numbers(ctx, count):
+    """``booking_charge_item_save`` with block-allocated invoice numbers instead of
+    the facility expression under ``InvoiceCreateLock``; compare their throughput
+    at the same worker count.
+    """
+    facility_id = ctx.fixture.facility.id
+
+    def check():
+        numbers = Invoice.objects.filter(facility_id=facility_id, number__startswith="BLK").values_list("number", flat=True)
+        return {"duplicate_numbers": sum(seen - 1 for seen in Counter(numbers).values())}
+
+    return _link_operations(seed.pending_bookings(ctx.rng, ctx.fixture, count)), check
+
+
+@db_scenario("automated_invoice_replay")
+def automated_invoice_replay(ctx, count):
+    """Re-run automated invoicing for invoiced bookings, as a retried request or
+    background re-run would; every repeat must stop at the ledger.
+    """
+    linked = seed.pending_bookings(ctx.rng, ctx.fixture, min(count, 50))
+    for operation in _link_operations(linked):
+        operation()
+    invoiced = [(booking, booking.charge_item) for booking, _ in linked if booking.charge_item]
+    repeats = []
+
+    def replay(booking, charge_item):
+        def operation():
+            if invoicing.create_automated_invoice(booking, charge_item) is not None:
+                repeats.append(booking.id)
+
+        return operation
+
+    def check():
+        problems = [problem for problem, _, _ in invoice_ledger.audit(ctx.fixture.facility.id)]
+        return {"repeats_invoiced": len(repeats), "duplicate_invoices": problems.count(invoice_ledger.DUPLICATE)}
+
+    return [replay(*invoiced[index % len(invoiced)]) for index in range(count)], check
+
+
+@db_scenario("payment_posting")
+def payment_posting(ctx, count):
+    """Post a payment to an issued invoice that already has ``--payments`` payments."""
+    invoices = ctx.invoices
+
+    def post(invoice, charge_item):
+        def operation():
+            seed.new_payment(charge_item, invoice).save()
+
+        return operation
+
+    return [post(*invoices[index % len(invoices)]) for index in range(count)]
+
+
+@db_scenario("payments_single_invoice")
+def payments_single_invoice(ctx, count):
+    """Every worker posts to the same invoice until it is exactly paid; it must balance once."""
+    invoice, charge_item = seed.issued_invoices(ctx.fixture, 1, 0, total=count)[0]
+
+    def check():
+        invoice.refresh_from_db()
+        charge_item.refresh_from_db()
+        return {
+            "invoice_balanced": invoice.status == InvoiceStatusOptions.balanced.value,
+            "charge_item_paid": charge_item.status == ChargeItemStatusOptions.paid.value,
+            "balanced_invoices": Invoice.objects.filter(id=invoice.id, status=InvoiceStatusOptions.balanced.value).count(),
+            "paid_charge_items": ChargeItem.objects.filter(id=charge_item.id, status=ChargeItemStatusOptions.paid.value).count(),
+        }
+
+    return [lambda: seed.new_payment(charge_item, invoice).save()] * count, check
+
+
+@db_scenario("encounter_create")
+def encounter_create(ctx, count):
+    """Create an encounter; the Hospital Identifier is assigned at commit."""
+    patients = ctx.fixture.patients
+
+    def create(patient):
+        def operation():
+            baker.make(Encounter, facility=ctx.fixture.facility, patient=patient, external_identifier=None)
+
+        return operation
+
+    return [create(patients[index % len(patients)]) for index in range(count)]
+
+
+@db_scenario("encounter_update")
+def encounter_update(ctx, count):
+    """Full ``save()`` of a loaded encounter, as the API does; exercises the identifier guard."""
+    encounter_ids = [
+        encounter.id
+        for encounter in baker.make(Encounter, facility=ctx.fixture.facility, patient=ctx.fixture.patients[0], _quantity=min(count, 50))
+    ]
+
+    def update(encounter_id):
+        def operation():
+            encounter = Encounter.objects.get(id=encounter_id)
+            encounter.save()
+
+        return operation
+
+    return [update(encounter_ids[index % len(encounter_ids)]) for index in range(count)]
+
+
+@db_scenario("invoice_number_allocator")
+def invoice_number_allocator(ctx, count):
+    """Hand out block-allocated numbers; one reservation per ``HMIS_INVOICE_NUMBER_BLOCK_SIZE``."""
+    facility_id = ctx.fixture.facility.id
+    return [lambda: allocator.next_sequence(facility_id)] * count
+
+
+@async_scenario("booking_invoice_sync_to_async")
+def booking_invoice_sync_to_async(ctx, count):
+    """Baseline: an async view running the sync booking save (and its receivers) through ``sync_to_async``."""
+
+    def atomic(operation):
+        def run():
+            with transaction.atomic():
+                operation()
+
+        return sync_to_async(run)
+
+    return [atomic(operation) for operation in _link_operations(seed.pending_bookings(ctx.rng, ctx.fixture, count))]
+
+
+@async_scenario("booking_invoice_service_sync_to_async")
+def booking_invoice_service_sync_to_async(ctx, count):
+    """The sync service layer (``decide_visit``, create, link, ``invoice_booking``), one
+    ``sync_to_async`` call per booking; the direct counterpart of ``booking_invoice_async``.
+    """
+
+    def link(booking, charge_item):
+        def run():
+            billing_service.decide_visit(charge_item)
+            charge_item.save()
+            TokenBooking.objects.filter(pk=booking.pk).update(charge_item=charge_item)
+            billing_service.invoice_booking(booking)
+
+        return sync_to_async(run)
+
+    return [link(booking, charge_item) for booking, charge_item in seed.pending_bookings(ctx.rng, ctx.fixture, count)]
+
+
+@async_scenario("booking_invoice_async")
+def booking_invoice_async(ctx, count):
+    """The async service layer: decide, create and link on the async ORM, then ``ainvoice_booking``."""
+
+    def link(booking, charge_item):
+        async def operation():
+            await billing_service.adecide_visit(charge_item)
+            await charge_item.asave()
+            await TokenBooking.objects.filter(pk=booking.pk).aupdate(charge_item=charge_item)
+            await billing_service.ainvoice_booking(booking)
+
+        return operation
+
+    return [link(booking, charge_item) for booking, charge_item in seed.pending_bookings(ctx.rng, ctx.fixture, count)]
+
+
+@micro_scenario("invoice_number_format")
+def invoice_number_format(ctx):
+    return lambda: format_invoice_number(ctx.fixture.facility.id, 12345)
+
+
+@micro_scenario("guard_in_memory")
+def guard_in_memory(ctx):
+    """The guard deciding from the loaded identifier alone (no DB read)."""
+    encounter = Encounter(id=1, external_identifier="260500000001")
+    encounter._state.adding = False  # noqa: SLF001
+    return lambda: guard_hospital_identifier(sender=Encounter, instance=encounter)
+
+
+DEMOGRAPHICS = {"caste": "General", "religion": "Other", "related_person": "Parent"}
+
+
+@micro_scenario("extension_validate_compiled")
+def extension_validate_compiled(ctx):
+    extension = PatientDemographicsExtension()
+    return lambda: extension.validate(DEMOGRAPHICS)
+
+
+@micro_scenario("extension_validate_uncompiled")
+def extension_validate_uncompiled(ctx):
+    """Baseline: interpreting the schema on every call."""
+    schema = PatientDemographicsExtension.write_schema
+    return lambda: jsonschema_validate(DEMOGRAPHICS, schema)
+
+
+@micro_scenario("extension_render")
+def extension_render(ctx):
+    extension = PatientDemographicsExtension()
+    return lambda: extension.serialize(DEMOGRAPHICS, "treatment_summary")
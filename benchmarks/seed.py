@@ -0,0 +1,216 @@
+"""Seed data at realistic shapes for the benchmark scenarios.
+
+Uses ``model_bakery`` (a care dev dependency) so required fields added to
+core models later do not break seeding; only the fields the plugin's
+receivers read are set explicitly. History is written with ``bulk_create``
+so seeding does not go through (and is not slowed by) the receivers.
+"""
+
+import random
+from dataclasses import dataclass, field
+from datetime import timedelta
+from decimal import Decimal
+
+from model_bakery import baker
+
+from care.emr.models.account import Account
+from care.emr.models.charge_item import ChargeItem
+from care.emr.models.charge_item_definition import ChargeItemDefinition
+from care.emr.models.invoice import Invoice
+from care.emr.models.patient import Patient
+from care.emr.models.payment_reconciliation import PaymentReconciliation
+from care.emr.models.scheduling.booking import TokenBooking, TokenSlot
+from care.emr.models.scheduling.schedule import Availability, SchedulableResource, Schedule
+from care.emr.resources.charge_item.spec import ChargeItemResourceOptions, ChargeItemStatusOptions
+from care.emr.resources.invoice.spec import InvoiceStatusOptions
+from care.emr.resources.payment_reconciliation.spec import (
+    PaymentReconciliationOutcomeOptions,
+    PaymentReconciliationStatusOptions,
+)
+from care.facility.models import Facility
+from care.users.models import User
+from care.utils.time_util import care_now
+from care_state_hmis.payment_totals import rebuild_invoice_totals
+
+BOOKED = "booked"
+
+
+@dataclass
+class ScheduleFixture:
+    schedule: Schedule
+    availability: Availability
+    definition: ChargeItemDefinition
+
+
+@dataclass
+class FacilityFixture:
+    facility: Facility
+    user: User
+    schedules: list = field(default_factory=list)
+    patients: list = field(default_factory=list)
+    accounts: dict = field(default_factory=dict)
+
+
+def make_rng(seed):
+    return random.Random(seed)  # noqa: S311
+
+
+def _definition(facility, title, price):
+    return baker.make(
+        ChargeItemDefinition,
+        facility=facility,
+        title=title,
+        price_components=[{"monetary_component_type": "base", "amount": str(price)}],
+    )
+
+
+def _slot(entry, start):
+    return TokenSlot.objects.create(
+        resource=entry.schedule.resource,
+        availability=entry.availability,
+        start_datetime=start,
+        end_datetime=start + timedelta(minutes=15),
+    )
+
+
+def _charge_item(fixture, patient, definition, status, **extra):
+    return baker.prepare(
+        ChargeItem,
+        facility=fixture.facility,
+        patient=patient,
+        account=fixture.accounts[patient.id],
+        charge_item_definition=definition,
+        status=status,
+        total_price=Decimal(100),
+        paid_invoice=None,
+        **extra,
+    )
+
+
+def seed_facility(rng, patients=200, schedules=4, history=20, revisit_allowed_days=7):
+    """A facility with OPD schedules, and patients with accounts and ``history`` paid bookings each."""
+    facility = baker.make(Facility)
+    user = baker.make(User)
+    fixture = FacilityFixture(facility, user)
+    now = care_now()
+
+    for index in range(schedules):
+        schedule = baker.make(
+            Schedule,
+            resource=baker.make(SchedulableResource, facility=facility, user=user),
+            valid_from=now - timedelta(days=365),
+            valid_to=now + timedelta(days=365),
+            revisit_allowed_days=revisit_allowed_days,
+            revisit_charge_item_definition=_definition(facility, f"Revisit {index}", 20),
+        )
+        fixture.schedules.append(
+            ScheduleFixture(
+                schedule,
+                baker.make(Availability, schedule=schedule),
+                _definition(facility, f"Consultation {index}", 100),
+            )
+        )
+
+    fixture.patients = baker.make(Patient, _quantity=patients)
+    fixture.accounts = {
+        account.patient_id: account
+        for account in Account.objects.bulk_create(
+            [baker.prepare(Account, facility=facility, patient=patient) for patient in fixture.patients]
+        )
+    }
+
+    # Paid booking history spread over the past year
+    slots, charge_items, patients_in_order = [], [], []
+    for patient in fixture.patients:
+        for _ in range(history):
+            entry = rng.choice(fixture.schedules)
+            start = now - timedelta(days=rng.randint(1, 365), minutes=rng.randint(0, 600))
+            slots.append(
+                TokenSlot(
+                    resource=entry.schedule.resource,
+                    availability=entry.availability,
+                    start_datetime=start,
+                    end_datetime=start + timedelta(minutes=15),
+                )
+            )
+            charge_items.append(_charge_item(fixture, patient, entry.definition, ChargeItemStatusOptions.paid.value, paid_on=start))
+            patients_in_order.append(patient)
+    slots = TokenSlot.objects.bulk_create(slots)
+    charge_items = ChargeItem.objects.bulk_create(charge_items)
+    TokenBooking.objects.bulk_create(
+        [
+            TokenBooking(token_slot=slot, patient=patient, booked_by=user, status=BOOKED, charge_item=charge_item)
+            for slot, patient, charge_item in zip(slots, patients_in_order, charge_items, strict=True)
+        ]
+    )
+    return fixture
+
+
+def paid_booking(fixture, patient, entry, definition, start):
+    """One paid booking on ``entry``'s schedule charged with ``definition``, written without the receivers."""
+    charge_item = _charge_item(fixture, patient, definition, ChargeItemStatusOptions.paid.value, paid_on=start)
+    ChargeItem.objects.bulk_create([charge_item])
+    return TokenBooking.objects.bulk_create(
+        [TokenBooking(token_slot=_slot(entry, start), patient=patient, booked_by=fixture.user, status=BOOKED, charge_item=charge_item)]
+    )[0]
+
+
+def pending_bookings(rng, fixture, count, appointment_resource=True):
+    """Bookings with an unsaved default charge item, as the booking view creates them.
+
+    With ``appointment_resource`` the item points at its booking, so the
+    revisit decision is made while it is created; without it the booking
+    receiver decides after the fact (the fallback path).
+    """
+    now = care_now()
+    pairs = []
+    for _ in range(count):
+        entry = rng.choice(fixture.schedules)
+        patient = rng.choice(fixture.patients)
+        slot = _slot(entry, now + timedelta(minutes=rng.randint(0, 600)))
+        booking = baker.make(TokenBooking, token_slot=slot, patient=patient, booked_by=fixture.user, status=BOOKED, charge_item=None)
+        extra = {}
+        if appointment_resource:
+            extra = {"service_resource": ChargeItemResourceOptions.appointment.value, "service_resource_id": str(booking.external_id)}
+        pairs.append((booking, _charge_item(fixture, patient, entry.definition, ChargeItemStatusOptions.billable.value, **extra)))
+    return pairs
+
+
+def _payment(charge_item, invoice, amount):
+    return baker.prepare(
+        PaymentReconciliation,
+        facility=charge_item.facility,
+        account=charge_item.account,
+        target_invoice=invoice,
+        amount=amount,
+        is_credit_note=False,
+        status=PaymentReconciliationStatusOptions.active.value,
+        outcome=PaymentReconciliationOutcomeOptions.complete.value,
+        payment_datetime=care_now(),
+    )
+
+
+def issued_invoices(fixture, count, payments_each, total=10**9):
+    """Issued invoices of ``total`` that already carry ``payments_each`` payments of 1."""
+    invoices = []
+    for patient in fixture.patients[:count]:
+        charge_item = _charge_item(fixture, patient, fixture.schedules[0].definition, ChargeItemStatusOptions.billed.value)
+        charge_item.save()
+        invoice = baker.make(
+            Invoice,
+            facility=fixture.facility,
+            account=fixture.accounts[patient.id],
+            patient=patient,
+            status=InvoiceStatusOptions.issued.value,
+            charge_items=[charge_item.id],
+            total_gross=Decimal(total),
+            total_net=Decimal(total),
+        )
+        PaymentReconciliation.objects.bulk_create([_payment(charge_item, invoice, Decimal(1)) for _ in range(payments_each)])
+        rebuild_invoice_totals(invoice.id)
+        invoices.append((invoice, charge_item))
+    return invoices
+
+
+def new_payment(charge_item, invoice):
+    return _payment(charge_item, invoice, Decimal(1))
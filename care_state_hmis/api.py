@@ -0,0 +1,161 @@
+"""Read-only endpoints: ``DailyFacilityStat`` rollups, streaming exports and receiver metrics."""
+
+from datetime import date
+from uuid import UUID
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from care.emr.models.organization import Organization
+from care.facility.models import Facility
+from care.security.authorization.base import AuthorizationController
+from care_state_hmis import exports, instrumentation, replica, reporting
+from care_state_hmis.filters import PatientDemographicsFilter
+
+
+def _facility(request, facility_external_id):
+    facility = get_object_or_404(Facility, external_id=facility_external_id)
+    if not AuthorizationController.call("can_read_facility_reports", request.user, facility):
+        raise PermissionDenied("You do not have access to this facility's reports")
+    return facility
+
+
+def _date_param(request, name):
+    value = request.query_params.get(name)
+    if not value:
+        raise ValidationError({name: "This parameter is required."})
+    try:
+        return date.fromisoformat(value)
+    except ValueError as e:
+        raise ValidationError({name: "Expected a date in YYYY-MM-DD format."}) from e
+
+
+def _uuid_params(request, name):
+    """Comma separated UUIDs of ``name``, as strings."""
+    values = [value for value in request.query_params.get(name, "").split(",") if value]
+    try:
+        return [str(UUID(value)) for value in values]
+    except ValueError as e:
+        raise ValidationError({name: "Expected comma separated UUIDs."}) from e
+
+
+def _date_range(request):
+    date_from = _date_param(request, "date_from")
+    date_to = _date_param(request, "date_to")
+    if date_to < date_from:
+        raise ValidationError({"date_to": "Must not be before date_from."})
+    return date_from, date_to
+
+
+def _metrics_param(request):
+    metrics = [metric for metric in request.query_params.get("metric", "").split(",") if metric]
+    if invalid := set(metrics) - set(reporting.Metric.values):
+        raise ValidationError({"metric": f"Unknown metrics: {', '.join(sorted(invalid))}"})
+    return metrics
+
+
+class DailyStatsView(APIView):
+    """``GET ?date_from=&date_to=&metric=``: daily rollup rows for the facility."""
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, facility_external_id):
+        facility = _facility(request, facility_external_id)
+        date_from, date_to = _date_range(request)
+        with replica.replica_reads():
+            rows = reporting.daily_rows(facility.id, date_from, date_to, _metrics_param(request))
+            rows = list(rows.values("date", "metric", "dimension", "value"))
+        return Response({"results": rows})
+
+
+class MonthlyStatsView(APIView):
+    """``GET ?year=&month=&metric=``: a facility-month summed from the daily rows."""
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, facility_external_id):
+        facility = _facility(request, facility_external_id)
+        try:
+            year = int(request.query_params["year"])
+            month = int(request.query_params["month"])
+        except (KeyError, ValueError) as e:
+            raise ValidationError({"detail": "year and month are required integers."}) from e
+        if not 1 <= month <= 12:
+            raise ValidationError({"month": "Must be between 1 and 12."})
+        with replica.replica_reads():
+            totals = reporting.monthly_totals(facility.id, year, month, _metrics_param(request))
+        return Response(
+            {
+                "year": year,
+                "month": month,
+                "results": [
+                    {"metric": metric, "dimension": dimension, "value": value}
+                    for (metric, dimension), value in sorted(totals.items())
+                ],
+            }
+        )
+
+
+def _export_facility_ids(request):
+    if organization_ids := _uuid_params(request, "organization"):
+        if len(organization_ids) > 1:
+            raise ValidationError({"organization": "Expected a single organization."})
+        organization = get_object_or_404(Organization, external_id=organization_ids[0])
+        if not AuthorizationController.call("can_export_organization", request.user, organization):
+            raise PermissionDenied("You do not have access to this organization's exports")
+        return exports.organization_facility_ids(organization)
+    facility_ids = _uuid_params(request, "facility")
+    if not facility_ids:
+        raise ValidationError({"facility": "Either facility or organization is required."})
+    facilities = Facility.objects.filter(external_id__in=facility_ids)
+    if len(facilities) != len(set(facility_ids)):
+        raise NotFound("Facility not found")
+    for facility in facilities:
+        if not AuthorizationController.call("can_export_facility", request.user, facility):
+            raise PermissionDenied("You do not have access to this facility's exports")
+    return [facility.id for facility in facilities]
+
+
+class ExportView(APIView):
+    """``GET ?date_from=&date_to=&facility=|organization=&export_format=csv|ndjson``
+
+    Streams every row of the dataset created in the range; ``automated=true``
+    limits invoices to the ones created by the plugin, and ``caste=`` /
+    ``religion=`` rows to patients with those demographics.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, dataset):
+        if dataset not in exports.DATASETS:
+            raise ValidationError({"dataset": f"Expected one of: {', '.join(exports.DATASETS)}"})
+        export_format = request.query_params.get("export_format", exports.CSV)
+        if export_format not in exports.FORMATS:
+            raise ValidationError({"export_format": f"Expected one of: {', '.join(exports.FORMATS)}"})
+        automated_only = request.query_params.get("automated") == "true"
+        if automated_only and dataset != "invoices":
+            raise ValidationError({"automated": "Only applies to invoices."})
+        date_from, date_to = _date_range(request)
+        facility_ids = _export_facility_ids(request)
+
+        demographics = PatientDemographicsFilter.filters_from(request.query_params)
+        rows = exports.export_rows(dataset, date_from, date_to, facility_ids, automated_only, demographics)
+        response = StreamingHttpResponse(
+            exports.encode(rows, export_format, exports.DATASETS[dataset].columns),
+            content_type=exports.FORMATS[export_format],
+        )
+        response["Content-Disposition"] = f'attachment; filename="{dataset}_{date_from}_{date_to}.{export_format}"'
+        return response
+
+
+class MetricsView(APIView):
+    """This process's receiver metrics in the Prometheus text format (``HMIS_INSTRUMENTATION = "metrics"``)."""
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return HttpResponse(instrumentation.prometheus_text(), content_type="text/plain; version=0.0.4")
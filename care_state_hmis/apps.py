@@ -5,8 +5,41 @@ PLUGIN_NAME = "care_state_hmis"
 
 class CareSSMMConfig(AppConfig):
     name = PLUGIN_NAME
+    default_auto_field = "django.db.models.BigAutoField"
 
     def ready(self):
+        from care_state_hmis.settings import plugin_settings
+
+        # Validate and freeze the settings before any receiver reads them
+        plugin_settings.reload()
+        if plugin_settings.HMIS_REPLICA_DATABASE:
+            from care_state_hmis.replica import check_configuration
+
+            check_configuration()
+        if plugin_settings.HMIS_INVOICE_NUMBER_FORMAT:
+            from care_state_hmis.invoice_numbers import check_configuration
+
+            check_configuration()
+
+        if plugin_settings.HMIS_STARTUP_PROFILE:
+            self._profiled_ready()
+            return
+
         import care_state_hmis.signals  # noqa
         import care_state_hmis.authorization  # noqa
         import care_state_hmis.extensions # noqa
+
+    def _profiled_ready(self):
+        import importlib
+
+        from care_state_hmis.startup import profile_imports
+
+        with profile_imports("care_state_hmis.ready"):
+            import care_state_hmis.signals  # noqa
+            import care_state_hmis.authorization  # noqa
+            import care_state_hmis.extensions # noqa
+
+        # What the receiver stubs would otherwise load on first use
+        with profile_imports("care_state_hmis deferred receivers"):
+            for module in care_state_hmis.signals.DEFERRED_MODULES:
+                importlib.import_module(module)
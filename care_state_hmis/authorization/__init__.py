@@ -1 +1 @@
-from . import encounter # noqa
\ No newline at end of file
+from . import encounter, reports # noqa
@@ -0,0 +1,136 @@
+"""Memoised encounter permission checks.
+
+Resolving a permission runs the full role / organization lookup. Results are
+memoised for the duration of a request, keyed by everything the resolution
+depends on — user, permission, facility, the encounter's organization cache
+and its current location — so a page of encounters in the same departments
+resolves in a constant number of queries. With ``HMIS_AUTHZ_CACHE_TTL_SECONDS``
+set they are additionally shared through the Django cache for that long.
+
+Changes that can alter a resolution bump a per-user version, which drops both
+layers for that user: their memberships, the permissions of a role (for every
+user holding it) and the organizations of a location (for every member of the
+location's facility, since the key only has the location id).
+"""
+
+import hashlib
+from contextvars import ContextVar
+
+from django.core.cache import cache
+from django.core.signals import request_finished, request_started
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from care.emr.models.location import FacilityLocation, FacilityLocationOrganization
+from care.emr.models.organization import FacilityOrganizationUser, OrganizationUser
+from care.security.models import RolePermission
+from care_state_hmis.settings import plugin_settings
+
+_request_memo = ContextVar("hmis_authz_memo", default=None)
+
+
+@receiver(request_started, dispatch_uid="hmis_authz_memo_open")
+def open_request_memo(**kwargs):
+    _request_memo.set({})
+
+
+@receiver(request_finished, dispatch_uid="hmis_authz_memo_close")
+def close_request_memo(**kwargs):
+    _request_memo.set(None)
+
+
+def _version_key(user_id):
+    return f"hmis:authz:version:{user_id}"
+
+
+def _user_version(user_id, memo):
+    if memo is not None and ("version", user_id) in memo:
+        return memo["version", user_id]
+    version = cache.get(_version_key(user_id), 0)
+    if memo is not None:
+        memo["version", user_id] = version
+    return version
+
+
+def _cache_key(user_id, version, key):
+    digest = hashlib.sha1(repr(key).encode(), usedforsecurity=False).hexdigest()
+    return f"hmis:authz:{user_id}:{version}:{digest}"
+
+
+def memoized_encounter_permission(user, encounter, permission, resolve):
+    """Return ``resolve()`` for this user/encounter/permission, memoised."""
+    key = (
+        user.pk,
+        permission,
+        encounter.facility_id,
+        tuple(sorted(encounter.facility_organization_cache or ())),
+        encounter.current_location_id,
+    )
+    memo = _request_memo.get()
+    if memo is not None and key in memo:
+        return memo[key]
+
+    ttl = plugin_settings.HMIS_AUTHZ_CACHE_TTL_SECONDS
+    if ttl:
+        cache_key = _cache_key(user.pk, _user_version(user.pk, memo), key)
+        result = cache.get(cache_key)
+        if result is None:
+            result = resolve()
+            cache.set(cache_key, result, ttl)
+    else:
+        result = resolve()
+
+    if memo is not None:
+        memo[key] = result
+    return result
+
+
+def invalidate_user(user_id):
+    cache.add(_version_key(user_id), 0, timeout=None)
+    cache.incr(_version_key(user_id))
+    memo = _request_memo.get()
+    if memo is not None:
+        for key in [key for key in memo if key[0] == user_id or key == ("version", user_id)]:
+            del memo[key]
+
+
+@receiver(post_save, sender=FacilityOrganizationUser, dispatch_uid="hmis_authz_facility_org_user_saved")
+@receiver(post_delete, sender=FacilityOrganizationUser, dispatch_uid="hmis_authz_facility_org_user_deleted")
+@receiver(post_save, sender=OrganizationUser, dispatch_uid="hmis_authz_org_user_saved")
+@receiver(post_delete, sender=OrganizationUser, dispatch_uid="hmis_authz_org_user_deleted")
+def invalidate_membership(sender, instance, **kwargs):
+    invalidate_user(instance.user_id)
+
+
+def invalidate_users(user_ids):
+    for user_id in set(user_ids):
+        invalidate_user(user_id)
+
+
+@receiver(post_save, sender=RolePermission, dispatch_uid="hmis_authz_role_permission_saved")
+@receiver(post_delete, sender=RolePermission, dispatch_uid="hmis_authz_role_permission_deleted")
+def invalidate_role(sender, instance, **kwargs):
+    invalidate_users(
+        [
+            *FacilityOrganizationUser.objects.filter(role_id=instance.role_id).values_list("user_id", flat=True),
+            *OrganizationUser.objects.filter(role_id=instance.role_id).values_list("user_id", flat=True),
+        ]
+    )
+
+
+def _invalidate_facility_members(facility_id):
+    invalidate_users(FacilityOrganizationUser.objects.filter(organization__facility_id=facility_id).values_list("user_id", flat=True))
+
+
+@receiver(post_save, sender=FacilityLocation, dispatch_uid="hmis_authz_location_saved")
+def invalidate_location(sender, instance, created, update_fields=None, **kwargs):
+    # Frequent saves (e.g. of the current encounter) leave the organizations alone
+    if created or (update_fields is not None and "facility_organization_cache" not in update_fields):
+        return
+    _invalidate_facility_members(instance.facility_id)
+
+
+@receiver(post_save, sender=FacilityLocationOrganization, dispatch_uid="hmis_authz_location_organization_saved")
+@receiver(post_delete, sender=FacilityLocationOrganization, dispatch_uid="hmis_authz_location_organization_deleted")
+def invalidate_location_organization(sender, instance, **kwargs):
+    _invalidate_facility_members(instance.location.facility_id)
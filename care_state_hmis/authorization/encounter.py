@@ -1,3 +1,6 @@
+from django.db.models import Q
+
+from care.emr.models.organization import FacilityOrganizationUser
 from care.emr.resources.encounter.constants import COMPLETED_CHOICES
 from care.security.authorization.base import (
     AuthorizationController,
@@ -5,12 +8,17 @@ from care.security.authorization.base import (
 )
 from care.security.authorization.encounter import EncounterAccess
 from care.security.permissions.encounter import EncounterPermissions
+from care_state_hmis.authorization.cache import memoized_encounter_permission
 
 
 class HMISEncounterAccess(AuthorizationHandler):
     def check_permission_in_encounter(self, user, encounter, permission):
-        encounter_access = EncounterAccess()
-        return encounter_access.check_permission_in_encounter(user, encounter, permission)
+        return memoized_encounter_permission(
+            user,
+            encounter,
+            permission,
+            lambda: EncounterAccess().check_permission_in_encounter(user, encounter, permission),
+        )
 
     def can_restart_encounter_obj(self, user, encounter):
         """
@@ -28,5 +36,31 @@ class HMISEncounterAccess(AuthorizationHandler):
             user, encounter, EncounterPermissions.can_write_encounter.name
         )
 
+    def filter_restartable_encounters(self, user, queryset):
+        """
+        Restrict ``queryset`` to encounters ``can_restart_encounter_obj`` allows,
+        evaluated by the database
+        """
+        if user.is_superuser:
+            return queryset
+        roles = self.get_role_from_permissions(
+            [EncounterPermissions.can_write_encounter.name]
+        )
+        organization_ids = list(
+            FacilityOrganizationUser.objects.filter(
+                user=user, role_id__in=roles
+            ).values_list("organization_id", flat=True)
+        )
+        return queryset.filter(
+            Q(facility_organization_cache__overlap=organization_ids)
+            | Q(current_location__facility_organization_cache__overlap=organization_ids),
+            updated_by_id=user.id,
+            status__in=COMPLETED_CHOICES,
+        )
+
 
 AuthorizationController.override_authz_controllers.append(HMISEncounterAccess)
+
+
+def filter_restartable_encounters(user, queryset):
+    return AuthorizationController.call("filter_restartable_encounters", user, queryset)
@@ -0,0 +1,47 @@
+from care.security.authorization.base import (
+    AuthorizationController,
+    AuthorizationHandler,
+)
+from care.security.permissions.patient import PatientPermissions
+
+# Rollups count the facility's patients by caste and religion
+REPORT_PERMISSION = PatientPermissions.can_list_patients.name
+# Exports stream patient-level encounter and billing rows
+EXPORT_PERMISSION = PatientPermissions.can_view_clinical_data.name
+
+
+class HMISReportAccess(AuthorizationHandler):
+    def can_read_facility_reports(self, user, facility):
+        """
+        Check if the user holds the report permission in one of the facility's organizations
+        """
+        if user.is_superuser:
+            return True
+        return self.check_permission_in_facility_organization(
+            [REPORT_PERMISSION], user, facility=facility
+        )
+
+    def can_export_facility(self, user, facility):
+        """
+        Check if the user holds the export permission in one of the facility's organizations
+        """
+        if user.is_superuser:
+            return True
+        return self.check_permission_in_facility_organization(
+            [EXPORT_PERMISSION], user, facility=facility
+        )
+
+    def can_export_organization(self, user, organization):
+        """
+        Check if the user holds the export permission in the organization or one of its parents
+        """
+        if user.is_superuser:
+            return True
+        return self.check_permission_in_organization(
+            [EXPORT_PERMISSION],
+            user,
+            orgs=[organization.id, *(organization.parent_cache or [])],
+        )
+
+
+AuthorizationController.override_authz_controllers.append(HMISReportAccess)
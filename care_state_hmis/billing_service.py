@@ -0,0 +1,207 @@
+"""Appointment and payment billing orchestration.
+
+The receivers in ``signals/billing.py`` only filter the saves they care about
+and call the sync functions here. Async callers (async views, ASGI consumers)
+use the ``a``-prefixed entry points so they can await the billing steps
+without wrapping a whole save and its receivers in ``sync_to_async``. They do
+not add throughput: the async ORM runs each query through ``sync_to_async``
+on the same shared thread, and the transactional unit that creates, issues
+and pays an invoice cannot be opened from async code at all, so it is handed
+to that thread as well (``benchmarks``' ``booking_invoice_*`` scenarios
+compare the two).
+
+Async callers link the charge item without ``save()`` (e.g. ``aupdate``), so
+the booking receiver does not also run, then await ``ainvoice_booking``. A
+charge item decided with ``adecide_visit`` before ``acreate`` is left alone
+by ``decide_appointment_charge_item``.
+
+A free revisit (no revisit definition on the schedule) keeps the view's
+default item, written ``not_billable`` with the decision in its meta: the
+booking records its visit and nothing is deleted, relinked or invoiced.
+"""
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+
+from care.emr.models.charge_item import ChargeItem
+from care.emr.models.scheduling.booking import TokenBooking
+from care.emr.resources.charge_item.spec import ChargeItemStatusOptions
+from care.emr.resources.invoice.spec import InvoiceStatusOptions
+from care.utils.time_util import care_now
+from care_state_hmis import instrumentation, invoicing, payment_totals, rebalance, replica, revisit, revisit_policy
+from care_state_hmis.invoice_transitions import transition_invoice
+from care_state_hmis.models import AutomatedInvoiceLedger
+from care_state_hmis.settings import plugin_settings
+
+# The booking's charge item and slot → availability; the schedule's revisit
+# settings come from ``revisit_policy``.
+BOOKING_RELATIONS = ("charge_item__facility", "token_slot__availability")
+
+
+def _visit_decision(policy, last_paid_on, slot_start):
+    if not revisit.is_revisit(policy, last_paid_on, slot_start):
+        return revisit.NEW_VISIT
+    return revisit.REVISIT if policy.revisit_definition_id else revisit.FREE_REVISIT
+
+
+def _record_decision(charge_item, booking, policy, decision):
+    if decision == revisit.REVISIT:
+        definition = revisit_policy.revisit_definition(policy)
+        revisit.apply_revisit_in_place(charge_item, booking, definition, charge_item.facility)
+    elif decision == revisit.FREE_REVISIT:
+        revisit.apply_free_revisit_in_place(charge_item)
+    charge_item.meta = {**(charge_item.meta or {}), revisit.VISIT_KEY: decision}
+
+
+def _decision_booking():
+    return TokenBooking.objects.select_related("patient", "token_slot__availability")
+
+
+def decide_visit(charge_item):
+    """Record new-vs-revisit on an unsaved default appointment ``charge_item``,
+    rewriting it in place on a charged revisit, so the right item is written once.
+    """
+    booking = _decision_booking().filter(external_id=charge_item.service_resource_id).first()
+    if booking is None:
+        return
+    token_slot = booking.token_slot
+    policy = revisit_policy.policy_for(token_slot.availability.schedule_id)
+    last_paid_on = revisit.last_paid_on(booking.patient_id, policy, token_slot.start_datetime)
+    _record_decision(charge_item, booking, policy, _visit_decision(policy, last_paid_on, token_slot.start_datetime))
+
+
+async def adecide_visit(charge_item):
+    """``decide_visit`` for async callers, before ``acreate``."""
+    if revisit.visit_decision(charge_item):
+        return
+    booking = await _decision_booking().filter(external_id=charge_item.service_resource_id).afirst()
+    if booking is None:
+        return
+    token_slot = booking.token_slot
+    policy = await revisit_policy.apolicy_for(token_slot.availability.schedule_id)
+    last_paid_on = await revisit.alast_paid_on(booking.patient_id, policy, token_slot.start_datetime)
+    decision = _visit_decision(policy, last_paid_on, token_slot.start_datetime)
+    if decision == revisit.REVISIT:
+        # Loading and pricing the revisit definition read the database
+        await sync_to_async(_record_decision)(charge_item, booking, policy, decision)
+    else:
+        _record_decision(charge_item, booking, policy, decision)
+
+
+def _relink_revisit(booking, default_charge_item, policy):
+    """Apply a revisit to a default charge item written without a decision (fallback path)."""
+    if not policy.revisit_definition_id:
+        # Kept as the not-billable record of the free revisit
+        _record_decision(default_charge_item, booking, policy, revisit.FREE_REVISIT)
+        ChargeItem.objects.filter(pk=default_charge_item.pk).update(status=default_charge_item.status, meta=default_charge_item.meta)
+        return default_charge_item
+    default_charge_item.delete()
+    definition = revisit_policy.revisit_definition(policy)
+    charge_item = revisit.build_revisit_charge_item(booking, definition, default_charge_item.facility)
+    charge_item.save()
+    # A queryset update does not re-fire the booking receiver
+    TokenBooking.objects.filter(pk=booking.pk).update(charge_item=charge_item)
+    booking.charge_item = charge_item
+    return charge_item
+
+
+def _billable(charge_item):
+    return charge_item is not None and charge_item.status == ChargeItemStatusOptions.billable.value
+
+
+def invoice_booking(booking):
+    """Apply the revisit decision to the booking's linked charge item and invoice it.
+
+    Returns the automated invoice, or None when nothing was invoiced here.
+    """
+    loaded = TokenBooking.objects.select_related(*BOOKING_RELATIONS).get(pk=booking.pk)
+    booking.charge_item = charge_item = loaded.charge_item
+    booking.token_slot = token_slot = loaded.token_slot
+    # Skip processing if the default charge item is already paid
+    if charge_item is None or charge_item.paid_invoice_id:
+        return None
+
+    decision = revisit.visit_decision(charge_item)
+    if decision is None:
+        # Linked without going through decide_visit
+        policy = revisit_policy.policy_for(token_slot.availability.schedule_id)
+        last_paid_on = revisit.last_paid_on(booking.patient_id, policy, token_slot.start_datetime)
+        if revisit.is_revisit(policy, last_paid_on, token_slot.start_datetime):
+            decision = revisit.REVISIT
+            charge_item = _relink_revisit(booking, charge_item, policy)
+    # A free revisit's item was written not billable: nothing to do
+    instrumentation.outcome("new_charge" if decision in (None, revisit.NEW_VISIT) else "revisit")
+
+    if not _billable(charge_item):
+        return None
+    if plugin_settings.HMIS_INVOICE_ASYNC_AUTOMATION:
+        invoicing.enqueue_appointment_invoice(booking, charge_item.facility_id)
+        return None
+    return invoicing.create_automated_invoice(booking, charge_item)
+
+
+async def ainvoice_booking(booking):
+    """``invoice_booking`` for async callers."""
+    # Repeats stop here without leaving the event loop
+    if await AutomatedInvoiceLedger.objects.filter(booking_external_id=booking.external_id).aexists():
+        return None
+    loaded = await TokenBooking.objects.select_related(*BOOKING_RELATIONS).aget(pk=booking.pk)
+    booking.charge_item = charge_item = loaded.charge_item
+    booking.token_slot = token_slot = loaded.token_slot
+    if charge_item is None or charge_item.paid_invoice_id:
+        return None
+
+    decision = revisit.visit_decision(charge_item)
+    if decision is None:
+        policy = await revisit_policy.apolicy_for(token_slot.availability.schedule_id)
+        last_paid_on = await revisit.alast_paid_on(booking.patient_id, policy, token_slot.start_datetime)
+        if revisit.is_revisit(policy, last_paid_on, token_slot.start_datetime):
+            charge_item = await sync_to_async(_relink_revisit)(booking, charge_item, policy)
+
+    if not _billable(charge_item):
+        return None
+    if plugin_settings.HMIS_INVOICE_ASYNC_AUTOMATION:
+        await invoicing.aenqueue_appointment_invoice(booking, charge_item.facility_id)
+        return None
+    # Invoice numbering, the ledger claim and settlement share one
+    # transaction, which the async ORM cannot open; like every async ORM
+    # query it runs on the shared sync thread
+    return await sync_to_async(invoicing.create_automated_invoice)(booking, charge_item)
+
+
+def _settle_invoice_items(invoice):
+    ChargeItem.objects.filter(
+        account_id=invoice.account_id,
+        status=ChargeItemStatusOptions.billed.value,
+        id__in=invoice.charge_items,
+    ).update(
+        status=ChargeItemStatusOptions.paid.value,
+        paid_invoice=invoice,
+        paid_on=care_now(),
+    )
+    revisit.record_paid_visits(invoice.charge_items)
+
+
+def balance_payment(payment):
+    """Balance the payment's target invoice once fully paid, then rebalance the account."""
+    instrumentation.outcome("rebalance_only")
+    # Balancing decides on the invoice and its totals, so they must not come
+    # from a lagging replica.
+    with replica.primary_reads():
+        if payment.target_invoice_id:
+            invoice = payment.target_invoice
+            if invoice.status == InvoiceStatusOptions.issued.value:
+                net_paid = payment_totals.net_paid(payment.target_invoice_id)
+
+                instrumentation.outcome("partially_paid")
+                if net_paid >= invoice.total_gross:
+                    with transaction.atomic():
+                        # Only the posting that moves the invoice out of issued
+                        # settles its charge items, so it cannot balance twice.
+                        if transition_invoice(invoice, InvoiceStatusOptions.issued.value, InvoiceStatusOptions.balanced.value):
+                            instrumentation.outcome("balanced")
+                            _settle_invoice_items(invoice)
+                        else:
+                            instrumentation.outcome("already_balanced")
+
+    rebalance.schedule_account_rebalance(payment.account_id)
@@ -0,0 +1,207 @@
+"""Set-based invoicing for imported appointment backlogs.
+
+Bookings loaded by a migration or backlog import (e.g. via ``bulk_create``)
+never went through ``handle_appointment_invoice_payment``.
+``bulk_invoice_bookings`` applies the same rules to them in batches: revisit
+classification from one history query per batch, then charge items, invoices
+and PaymentReconciliations written with bulk operations, followed by the
+balancing ``handle_payment_reconciliation_rebalance`` would have done and the
+reporting rollups for the touched days.
+
+Bookings already in the ``invoice_ledger`` are skipped and every invoiced
+booking is recorded there, so re-running an import never bills twice.
+
+Bookings are processed in slot order and each invoiced booking counts as
+paid history for later bookings, as it would when saved one by one.
+"""
+
+from dataclasses import dataclass
+
+from django.db import transaction
+
+from care.emr.models.charge_item import ChargeItem
+from care.emr.models.invoice import Invoice
+from care.emr.models.payment_reconciliation import PaymentReconciliation
+from care.emr.models.scheduling.booking import TokenBooking
+from care.emr.resources.charge_item.spec import ChargeItemStatusOptions
+from care.emr.resources.invoice.spec import InvoiceStatusOptions
+from care.emr.resources.invoice.sync_items import sync_invoice_items
+from care.utils.lock import ObjectLocked
+from care.utils.time_util import care_now
+from care_state_hmis import invoice_ledger, invoicing, rebalance, reporting, revisit
+from care_state_hmis.models import AutomatedInvoiceLedger, InvoicePaymentTotal
+
+
+@dataclass
+class BulkInvoiceResult:
+    processed: int = 0
+    revisits: int = 0
+    invoiced: int = 0
+
+    def __iadd__(self, other):
+        self.processed += other.processed
+        self.revisits += other.revisits
+        self.invoiced += other.invoiced
+        return self
+
+
+def pending_bookings(queryset=None):
+    """Bookings with a charge item that has not been invoiced yet (free revisits are never invoiced)."""
+    queryset = TokenBooking.objects.all() if queryset is None else queryset
+    return (
+        queryset.filter(charge_item__isnull=False, charge_item__paid_invoice__isnull=True)
+        .exclude(charge_item__status=ChargeItemStatusOptions.not_billable.value)
+        .exclude(external_id__in=invoice_ledger.invoiced_booking_ids())
+    )
+
+
+def _history_row(booking, charge_item, schedule, paid_on):
+    return {
+        "id": booking.id,
+        "patient_id": booking.patient_id,
+        "slot_start": booking.token_slot.start_datetime,
+        "paid_on": paid_on,
+        "definition_id": charge_item.charge_item_definition_id,
+        "schedule_resource_id": schedule.resource_id,
+        "schedule_resource_type": schedule.resource.resource_type,
+        "schedule_facility_id": schedule.resource.facility_id,
+    }
+
+
+def _classify(bookings, now, result):
+    """Apply revisit rules in memory; returns the bookings to relink, the
+    replaced charge item ids, the charge items kept as free revisits and the
+    ``(booking, charge_item)`` pairs to bill.
+    """
+    history = revisit.paid_history({booking.patient_id for booking in bookings})
+    relinked, replaced, freed, billable = [], [], [], []
+    for booking in bookings:
+        token_slot = booking.token_slot
+        schedule = token_slot.availability.schedule
+        facility = schedule.resource.facility
+        definition = schedule.revisit_charge_item_definition
+        scope, scope_id = revisit.revisit_scope(schedule)
+        last_paid_on = revisit.pick_last_paid_on(
+            history,
+            booking.patient_id,
+            scope,
+            scope_id,
+            token_slot.start_datetime,
+            definition.id if definition else None,
+        )
+
+        charge_item = booking.charge_item
+        # Items created through decide_appointment_charge_item are already decided
+        decision = revisit.visit_decision(charge_item)
+        replacement = charge_item
+        if decision is None and revisit.is_revisit(schedule, last_paid_on, token_slot.start_datetime):
+            if definition:
+                decision = revisit.REVISIT
+                replacement = revisit.build_revisit_charge_item(booking, definition, facility)
+            else:
+                decision = revisit.FREE_REVISIT
+                revisit.apply_free_revisit_in_place(charge_item)
+                charge_item.meta = {**(charge_item.meta or {}), revisit.VISIT_KEY: decision}
+                freed.append(charge_item)
+        if decision in (revisit.REVISIT, revisit.FREE_REVISIT):
+            result.revisits += 1
+        if replacement is not charge_item:
+            replaced.append(charge_item.id)
+            booking.charge_item = charge_item = replacement
+            relinked.append(booking)
+
+        if charge_item and charge_item.status == ChargeItemStatusOptions.billable.value:
+            billable.append((booking, charge_item))
+            # Paid in full below, so later bookings in the batch see it
+            history.append(_history_row(booking, charge_item, schedule, now))
+    return relinked, replaced, freed, billable
+
+
+def _bill(billable, now):
+    """Invoice, issue, pay and balance ``billable`` pairs with bulk writes."""
+    try:
+        with invoicing.invoice_create_lock():
+            invoices = invoicing.create_invoice_drafts(billable)
+    except ObjectLocked as e:
+        raise RuntimeError("Invoice creation lock is busy, retry the batch") from e
+
+    charge_items = []
+    for (_, charge_item), invoice in zip(billable, invoices, strict=True):
+        charge_item.paid_invoice = invoice
+        charge_item.status = ChargeItemStatusOptions.billed.value
+        charge_items.append(charge_item)
+    ChargeItem.objects.bulk_update(charge_items, ["paid_invoice", "status"])
+
+    for invoice in invoices:
+        sync_invoice_items(invoice)
+        invoice.status = InvoiceStatusOptions.issued.value
+        invoice.issue_date = now
+    Invoice.objects.bulk_update(invoices, [*invoicing.INVOICE_TOTAL_FIELDS, "status", "issue_date"])
+
+    payments = PaymentReconciliation.objects.bulk_create(
+        [invoicing.build_cash_payment(booking, charge_item, invoice, now) for (booking, charge_item), invoice in zip(billable, invoices, strict=True)]
+    )
+    InvoicePaymentTotal.objects.bulk_create(
+        [InvoicePaymentTotal(invoice_id=payment.target_invoice_id, total_payments=payment.amount) for payment in payments]
+    )
+    AutomatedInvoiceLedger.objects.bulk_create(invoice_ledger.build_entries(billable, invoices, payments))
+
+    # What handle_payment_reconciliation_rebalance does for each payment
+    balanced = [
+        (charge_item, invoice)
+        for (_, charge_item), invoice in zip(billable, invoices, strict=True)
+        if charge_item.total_price >= invoice.total_gross
+    ]
+    paid_charge_item_ids = [charge_item.id for charge_item, _ in balanced]
+    ChargeItem.objects.filter(
+        id__in=paid_charge_item_ids,
+        status=ChargeItemStatusOptions.billed.value,
+    ).update(
+        status=ChargeItemStatusOptions.paid.value,
+        paid_on=now,
+    )
+    Invoice.objects.filter(id__in=[invoice.id for _, invoice in balanced]).update(status=InvoiceStatusOptions.balanced.value)
+    revisit.record_paid_visits(paid_charge_item_ids)
+    for account_id in {charge_item.account_id for _, charge_item in billable}:
+        rebalance.schedule_account_rebalance(account_id)
+
+
+def _process_batch(booking_ids):
+    result = BulkInvoiceResult()
+    # Re-checked per batch: the receivers may have invoiced some since listing
+    bookings = list(
+        pending_bookings(TokenBooking.objects.filter(id__in=booking_ids))
+        .select_related(
+            "patient",
+            "charge_item__facility",
+            "token_slot__availability__schedule__resource__facility",
+            "token_slot__availability__schedule__revisit_charge_item_definition",
+        )
+        .order_by("token_slot__start_datetime", "id")
+    )
+    now = care_now()
+    with transaction.atomic():
+        relinked, replaced, freed, billable = _classify(bookings, now, result)
+        ChargeItem.objects.bulk_create([booking.charge_item for booking in relinked])
+        TokenBooking.objects.bulk_update(relinked, ["charge_item"])
+        ChargeItem.objects.filter(id__in=replaced).delete()
+        ChargeItem.objects.bulk_update(freed, ["status", "meta"])
+        if billable:
+            _bill(billable, now)
+        for booking in bookings:
+            token_slot = booking.token_slot
+            reporting.mark_dirty(reporting.OPD, token_slot.availability.schedule.resource.facility_id, token_slot.start_datetime)
+        for _, charge_item in billable:
+            reporting.mark_dirty(reporting.REVENUE, charge_item.facility_id, now)
+    result.processed = len(bookings)
+    result.invoiced = len(billable)
+    return result
+
+
+def bulk_invoice_bookings(bookings, batch_size=500):
+    """Invoice every pending booking in ``bookings``; returns a ``BulkInvoiceResult``."""
+    booking_ids = list(pending_bookings(bookings).order_by("token_slot__start_datetime", "id").values_list("id", flat=True))
+    result = BulkInvoiceResult()
+    for start in range(0, len(booking_ids), batch_size):
+        result += _process_batch(booking_ids[start:start + batch_size])
+    return result
@@ -0,0 +1,112 @@
+"""Indexed patient demographics from the ``patient_demographics`` extension.
+
+The extension values live in the patient's ``extensions`` JSON; this module
+mirrors them into ``PatientDemographics`` so reports and list endpoints can
+filter and group by them with an index instead of JSON extraction.
+
+The values each patient was loaded with are remembered (``post_init``) so a
+save that leaves them untouched costs no query; only patients whose original
+is unknown (deferred ``extensions``) fall back to an upsert.
+"""
+
+from django.db.models import Exists, OuterRef, Subquery
+
+from care.emr.models.patient import Patient
+from care_state_hmis.extensions import PatientDemographicsExtension
+from care_state_hmis.models import PatientDemographics
+
+EXTENSION_NAME = PatientDemographicsExtension.extension_name
+DEMOGRAPHIC_FIELDS = ("caste", "religion", "related_person")
+
+# Instance attribute holding the values as last read from / written to the DB
+LOADED_VALUES_ATTR = "_hmis_loaded_demographics"
+_UNKNOWN = object()
+
+
+def extension_values(patient):
+    """The demographics fields of ``patient``, or None without extension data."""
+    data = (patient.extensions or {}).get(EXTENSION_NAME)
+    if not isinstance(data, dict):
+        return None
+    values = {field: data.get(field) or "" for field in DEMOGRAPHIC_FIELDS}
+    if not any(values.values()):
+        return None
+    return values
+
+
+def track_loaded_values(patient):
+    """Remember the demographics ``patient`` was read from the database with.
+
+    Only rows read from the database carry a pk at construction; a deferred
+    ``extensions`` is absent from ``__dict__`` and stays unknown.
+    """
+    if patient.pk is not None and "extensions" in patient.__dict__:
+        patient.__dict__[LOADED_VALUES_ATTR] = extension_values(patient)
+
+
+def sync_patient_demographics(patient, created=False):
+    """Mirror ``patient``'s extension values; returns whether a row was written."""
+    values = extension_values(patient)
+    loaded = None if created else patient.__dict__.get(LOADED_VALUES_ATTR, _UNKNOWN)
+    if loaded is not _UNKNOWN and loaded == values:
+        return False
+    if values is None:
+        PatientDemographics.objects.filter(patient_id=patient.id).delete()
+    elif created:
+        PatientDemographics.objects.create(patient_id=patient.id, **values)
+    else:
+        PatientDemographics.objects.update_or_create(patient_id=patient.id, defaults=values)
+    patient.__dict__[LOADED_VALUES_ATTR] = values
+    return True
+
+
+def iter_patient_batches(batch_size):
+    """Yield lists of patients in keyset-paginated batches by id."""
+    last_id = 0
+    while True:
+        batch = list(Patient.objects.filter(id__gt=last_id).order_by("id").only("id", "extensions")[:batch_size])
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1].id
+
+
+def backfill_patient_demographics(patients):
+    """Upsert rows for ``patients`` and drop rows of those without data; returns the rows written."""
+    rows = []
+    empty = []
+    for patient in patients:
+        values = extension_values(patient)
+        if values is None:
+            empty.append(patient.id)
+        else:
+            rows.append(PatientDemographics(patient_id=patient.id, **values))
+    if empty:
+        PatientDemographics.objects.filter(patient_id__in=empty).delete()
+    PatientDemographics.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=["patient_id"],
+        update_fields=[*DEMOGRAPHIC_FIELDS, "modified_date"],
+    )
+    return len(rows)
+
+
+def demographics_for(patient_field, queryset=None):
+    """``PatientDemographics`` rows matching ``patient_field`` of the outer query."""
+    queryset = PatientDemographics.objects.all() if queryset is None else queryset
+    return queryset.filter(patient_id=OuterRef(patient_field))
+
+
+def filter_by_demographics(queryset, patient_field, filters):
+    """Rows of ``queryset`` whose patient's demographics match ``filters``, e.g. ``{"caste__in": [...]}``."""
+    if not filters:
+        return queryset
+    return queryset.filter(Exists(demographics_for(patient_field).filter(**filters)))
+
+
+def annotate_demographics(queryset, patient_field="patient_id", fields=("caste", "religion")):
+    """Annotate ``queryset`` with ``hmis_<field>`` for grouping by demographics."""
+    return queryset.annotate(
+        **{f"hmis_{field}": Subquery(demographics_for(patient_field).values(field)[:1]) for field in fields}
+    )
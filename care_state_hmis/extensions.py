@@ -1,7 +1,66 @@
+from jsonschema import Draft202012Validator
+from rest_framework.exceptions import ValidationError
+
 from care.emr.extensions.base import PlugExtension, ExtensionResource
 from care.emr.registries.extensions.registry import ExtensionRegistry
 
 
+class CompiledSchema:
+    """A JSON schema checked and compiled once, with precomputed fast paths.
+
+    Flat objects of string properties, optionally restricted by ``enum``, are
+    validated with set lookups; anything else, and every failure, goes through
+    the compiled ``jsonschema`` validator so errors read the same.
+    """
+
+    def __init__(self, schema):
+        Draft202012Validator.check_schema(schema)
+        self.validator = Draft202012Validator(schema)
+        properties = schema.get("properties", {})
+        self.fields = frozenset(properties)
+        self.closed = schema.get("additionalProperties") is False
+        self.enums = {name: frozenset(spec["enum"]) for name, spec in properties.items() if "enum" in spec}
+        self.string_fields = frozenset(name for name, spec in properties.items() if spec.get("type") == "string")
+        self.simple = self.string_fields == self.fields
+        # render context -> fields hidden in it
+        hidden = {}
+        for name, spec in properties.items():
+            for context in spec.get("x-ui", {}).get("render_blacklist", []):
+                hidden.setdefault(context, set()).add(name)
+        self.hidden = {context: frozenset(names) for context, names in hidden.items()}
+
+    def _fast_valid(self, data):
+        if not self.simple or not isinstance(data, dict):
+            return False
+        for name, value in data.items():
+            if name not in self.fields:
+                if self.closed:
+                    return False
+                continue
+            if not isinstance(value, str):
+                return False
+            allowed = self.enums.get(name)
+            if allowed is not None and value not in allowed:
+                return False
+        return True
+
+    def validate(self, data):
+        if self._fast_valid(data):
+            return
+        errors = {
+            ".".join(str(part) for part in error.absolute_path) or "non_field_errors": error.message
+            for error in self.validator.iter_errors(data)
+        }
+        if errors:
+            raise ValidationError(errors)
+
+    def render(self, data, context=None):
+        hidden = self.hidden.get(context)
+        if not hidden or not data:
+            return data
+        return {name: value for name, value in data.items() if name not in hidden}
+
+
 class PatientDemographicsExtension(PlugExtension):
     extension_name = "patient_demographics"
     extension_version = "1.0.0"
@@ -24,8 +83,8 @@ class PatientDemographicsExtension(PlugExtension):
                 "enum": ["Hindu", "Muslim", "Christian", "Sikh", "Jain", "Other"],
             },
         },
-        "additionalProperties": "false",
-    },
+        "additionalProperties": False,
+    }
     retrieve_schema = {
         "$schema": "https://json-schema.org/draft/2020-12/schema",
         "title": "Patient Demographics",
@@ -46,8 +105,22 @@ class PatientDemographicsExtension(PlugExtension):
                 "enum": ["Hindu", "Muslim", "Christian", "Sikh", "Jain", "Other"],
             },
         },
-        "additionalProperties": "false",
+        "additionalProperties": False,
     }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Compiled once when the extension is registered from ``ready()``
+        self.compiled_write_schema = CompiledSchema(self.write_schema)
+        self.compiled_retrieve_schema = CompiledSchema(self.retrieve_schema)
+
+    def validate(self, data):
+        self.compiled_write_schema.validate(data)
+        return data
+
+    def serialize(self, data, context=None):
+        """``data`` with the fields blacklisted for the render ``context`` removed."""
+        return self.compiled_retrieve_schema.render(data, context)
+
 
 ExtensionRegistry.register(PatientDemographicsExtension())
@@ -0,0 +1,28 @@
+from rest_framework.filters import BaseFilterBackend
+
+from care_state_hmis.demographics import filter_by_demographics
+
+
+class PatientDemographicsFilter(BaseFilterBackend):
+    """Filter by the patient's indexed ``caste`` / ``religion``.
+
+    Both query params take comma separated values. Views whose rows are not
+    patients set ``demographics_patient_field`` to the path of the patient id,
+    e.g. ``"patient_id"`` for encounters and bookings. Views that build their
+    querysets elsewhere (``ExportView``) pass ``filters_from()`` along instead.
+    """
+
+    params = ("caste", "religion")
+
+    @classmethod
+    def filters_from(cls, query_params):
+        """``{"<param>__in": values}`` for the params present in ``query_params``."""
+        filters = {}
+        for param in cls.params:
+            if values := [value for value in query_params.get(param, "").split(",") if value]:
+                filters[f"{param}__in"] = values
+        return filters
+
+    def filter_queryset(self, request, queryset, view):
+        patient_field = getattr(view, "demographics_patient_field", "id")
+        return filter_by_demographics(queryset, patient_field, self.filters_from(request.query_params))
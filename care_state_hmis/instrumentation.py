@@ -0,0 +1,167 @@
+"""Timing of the plugin's hot-path signal receivers.
+
+``instrumented`` wraps a receiver and, when ``HMIS_INSTRUMENTATION`` is set,
+records per call: wall time, DB query count and time, time spent waiting for
+``InvoiceCreateLock`` (via ``lock_wait``) and the outcome branch the receiver
+reported (via ``outcome``). Disabled, the wrapper costs one attribute read.
+
+- ``"log"`` emits one structured ``care_state_hmis.instrumentation`` record
+  per call, with the measurements in ``extra``.
+- ``"metrics"`` aggregates them in process; ``prometheus_text`` renders the
+  aggregates in the Prometheus text format (served by ``MetricsView``). Each
+  worker process reports its own figures.
+"""
+
+import functools
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import connection
+
+from care_state_hmis.settings import plugin_settings
+
+logger = logging.getLogger(__name__)
+
+LOG = "log"
+METRICS = "metrics"
+
+_current = ContextVar("hmis_measurement", default=None)
+
+
+class Measurement:
+    __slots__ = ("lock_wait", "outcome", "queries", "query_time")
+
+    def __init__(self, outcome):
+        self.outcome = outcome
+        self.queries = 0
+        self.query_time = 0.0
+        self.lock_wait = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.query_time += time.perf_counter() - start
+
+
+class _Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            # receiver -> [calls, seconds, queries, query seconds, lock wait seconds]
+            self.totals = defaultdict(lambda: [0, 0.0, 0, 0.0, 0.0])
+            # (receiver, outcome) -> calls
+            self.outcomes = defaultdict(int)
+
+    def record(self, name, elapsed, measurement):
+        with self._lock:
+            totals = self.totals[name]
+            totals[0] += 1
+            totals[1] += elapsed
+            totals[2] += measurement.queries
+            totals[3] += measurement.query_time
+            totals[4] += measurement.lock_wait
+            self.outcomes[(name, measurement.outcome)] += 1
+
+
+registry = _Registry()
+
+
+def _emit(name, elapsed, measurement):
+    mode = plugin_settings.HMIS_INSTRUMENTATION
+    if mode == METRICS:
+        registry.record(name, elapsed, measurement)
+    elif mode == LOG:
+        logger.info(
+            "%s %s in %.2fms",
+            name,
+            measurement.outcome,
+            elapsed * 1000,
+            extra={
+                "receiver": name,
+                "outcome": measurement.outcome,
+                "wall_ms": elapsed * 1000,
+                "queries": measurement.queries,
+                "query_ms": measurement.query_time * 1000,
+                "lock_wait_ms": measurement.lock_wait * 1000,
+            },
+        )
+
+
+def instrumented(name, default_outcome="completed"):
+    """Measure the wrapped receiver under ``name`` while instrumentation is enabled."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not plugin_settings.HMIS_INSTRUMENTATION:
+                return func(*args, **kwargs)
+            measurement = Measurement(default_outcome)
+            token = _current.set(measurement)
+            start = time.perf_counter()
+            try:
+                with connection.execute_wrapper(measurement):
+                    return func(*args, **kwargs)
+            except Exception:
+                measurement.outcome = "error" if measurement.outcome == default_outcome else measurement.outcome
+                raise
+            finally:
+                _current.reset(token)
+                _emit(name, time.perf_counter() - start, measurement)
+
+        return wrapper
+
+    return decorator
+
+
+def outcome(value):
+    """Record the branch the running receiver took; a no-op when not measuring."""
+    if measurement := _current.get():
+        measurement.outcome = value
+
+
+@contextmanager
+def lock_wait(lock):
+    """Enter ``lock`` (a context manager), timing the acquisition when measuring."""
+    measurement = _current.get()
+    if measurement is None:
+        with lock:
+            yield
+        return
+    start = time.perf_counter()
+    with lock:
+        measurement.lock_wait += time.perf_counter() - start
+        yield
+
+
+def prometheus_text():
+    """Aggregated metrics in the Prometheus text exposition format."""
+    series = [
+        ("hmis_receiver_calls_total", "counter", "Receiver invocations", 0),
+        ("hmis_receiver_seconds_total", "counter", "Receiver wall time", 1),
+        ("hmis_receiver_queries_total", "counter", "Database queries run by the receiver", 2),
+        ("hmis_receiver_query_seconds_total", "counter", "Database time spent in the receiver", 3),
+        ("hmis_receiver_lock_wait_seconds_total", "counter", "Time spent waiting for the invoice create lock", 4),
+    ]
+    with registry._lock:  # noqa: SLF001
+        totals = {name: list(values) for name, values in registry.totals.items()}
+        outcomes = dict(registry.outcomes)
+    lines = []
+    for metric, kind, help_text, index in series:
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} {kind}"]
+        lines += [f'{metric}{{receiver="{name}"}} {values[index]}' for name, values in sorted(totals.items())]
+    lines += ["# HELP hmis_receiver_outcomes_total Receiver invocations by branch taken", "# TYPE hmis_receiver_outcomes_total counter"]
+    lines += [
+        f'hmis_receiver_outcomes_total{{receiver="{name}",outcome="{branch}"}} {count}'
+        for (name, branch), count in sorted(outcomes.items())
+    ]
+    return "\n".join(lines) + "\n"
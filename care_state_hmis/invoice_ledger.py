@@ -0,0 +1,168 @@
+"""Idempotency ledger of automated appointment invoices.
+
+Every path that invoices a booking (the booking receiver, the invoice queue
+and ``bulk_invoice_bookings``) first claims the booking's
+``AutomatedInvoiceLedger`` row inside the transaction that creates the
+invoice. ``claim_booking`` is an insert-if-absent on the unique
+``booking_external_id``: a repeat finds the row in one indexed lookup and
+stops, and a concurrent first attempt blocks on the unique index until the
+winner commits, then finds its row.
+
+``audit`` compares the ledger with the invoices and payments it records and
+lists automated invoices the ledger does not know about.
+"""
+
+from care.emr.models.invoice import Invoice
+from care.emr.models.payment_reconciliation import PaymentReconciliation
+from care.emr.models.scheduling.booking import TokenBooking
+from care.emr.resources.invoice.spec import InvoiceStatusOptions
+from care.emr.resources.payment_reconciliation.spec import PaymentReconciliationStatusOptions
+from care_state_hmis.models import AutomatedInvoiceLedger
+
+# Problems reported by ``audit``
+MISSING_INVOICE = "missing_invoice"
+INVOICE_STATUS = "invoice_status"
+MISSING_PAYMENT = "missing_payment"
+DUPLICATE = "duplicate"
+UNRECORDED = "unrecorded"
+
+SETTLED_INVOICE_STATUSES = (InvoiceStatusOptions.issued.value, InvoiceStatusOptions.balanced.value)
+
+
+def claim_booking(booking, charge_item):
+    """``(entry, created)``; ``created`` is False if the booking was already invoiced."""
+    return AutomatedInvoiceLedger.objects.get_or_create(
+        booking_external_id=booking.external_id,
+        defaults={
+            "booking_id": booking.id,
+            "facility_id": charge_item.facility_id,
+            "charge_item_id": charge_item.id,
+        },
+    )
+
+
+def record_invoice(entry, invoice):
+    entry.invoice_id = invoice.id
+    entry.save(update_fields=["invoice_id"])
+
+
+def record_payment(booking, payment):
+    AutomatedInvoiceLedger.objects.filter(booking_external_id=booking.external_id).update(payment_id=payment.id)
+
+
+def build_entries(billable, invoices, payments):
+    """Ledger rows for ``(booking, charge_item)`` pairs billed in bulk."""
+    return [
+        AutomatedInvoiceLedger(
+            booking_external_id=booking.external_id,
+            booking_id=booking.id,
+            facility_id=charge_item.facility_id,
+            charge_item_id=charge_item.id,
+            invoice_id=invoice.id,
+            payment_id=payment.id,
+        )
+        for (booking, charge_item), invoice, payment in zip(billable, invoices, payments, strict=True)
+    ]
+
+
+def invoiced_booking_ids():
+    """Subquery of the external ids of bookings already invoiced."""
+    return AutomatedInvoiceLedger.objects.values("booking_external_id")
+
+
+def _ledger_problems(entries):
+    invoices = dict(
+        Invoice.objects.filter(id__in=[entry.invoice_id for entry in entries if entry.invoice_id]).values_list("id", "status")
+    )
+    payments = dict(
+        PaymentReconciliation.objects.filter(id__in=[entry.payment_id for entry in entries if entry.payment_id]).values_list(
+            "id", "status"
+        )
+    )
+    for entry in entries:
+        status = invoices.get(entry.invoice_id)
+        if status is None:
+            yield MISSING_INVOICE, entry, None
+        elif status not in SETTLED_INVOICE_STATUSES:
+            yield INVOICE_STATUS, entry, status
+        if payments.get(entry.payment_id) != PaymentReconciliationStatusOptions.active.value:
+            yield MISSING_PAYMENT, entry, payments.get(entry.payment_id)
+
+
+def _unrecorded_invoices(facility_id, since, batch_size):
+    invoices = Invoice.objects.filter(meta__automated=True).exclude(
+        id__in=AutomatedInvoiceLedger.objects.filter(invoice_id__isnull=False).values("invoice_id")
+    )
+    if facility_id:
+        invoices = invoices.filter(facility_id=facility_id)
+    if since:
+        invoices = invoices.filter(created_date__gte=since)
+    batch = []
+    for invoice in invoices.only("id", "status", "charge_items", "facility_id").iterator(chunk_size=batch_size):
+        batch.append(invoice)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def audit(facility_id=None, since=None, batch_size=1000):
+    """Yield ``(problem, entry_or_invoice, detail)`` for everything that disagrees with the ledger.
+
+    ``entry_or_invoice`` is the ``AutomatedInvoiceLedger`` row for ledger
+    problems and the ``Invoice`` for ``DUPLICATE`` / ``UNRECORDED``.
+    """
+    entries = AutomatedInvoiceLedger.objects.order_by("id")
+    if facility_id:
+        entries = entries.filter(facility_id=facility_id)
+    if since:
+        entries = entries.filter(created_date__gte=since)
+    batch = []
+    for entry in entries.iterator(chunk_size=batch_size):
+        batch.append(entry)
+        if len(batch) == batch_size:
+            yield from _ledger_problems(batch)
+            batch = []
+    yield from _ledger_problems(batch)
+
+    for invoices in _unrecorded_invoices(facility_id, since, batch_size):
+        charge_item_ids = {invoice.charge_items[0] for invoice in invoices if invoice.charge_items}
+        recorded = dict(
+            AutomatedInvoiceLedger.objects.filter(charge_item_id__in=charge_item_ids).values_list("charge_item_id", "invoice_id")
+        )
+        for invoice in invoices:
+            charge_item_id = invoice.charge_items[0] if invoice.charge_items else None
+            if charge_item_id in recorded:
+                yield DUPLICATE, invoice, recorded[charge_item_id]
+            else:
+                yield UNRECORDED, invoice, charge_item_id
+
+
+def record_unrecorded(invoice):
+    """Ledger an automated invoice created before the ledger existed; returns the entry or None."""
+    if not invoice.charge_items:
+        return None
+    booking = TokenBooking.objects.filter(charge_item_id=invoice.charge_items[0]).only("id", "external_id").first()
+    if booking is None:
+        return None
+    payment_id = (
+        PaymentReconciliation.objects.filter(
+            target_invoice_id=invoice.id,
+            status=PaymentReconciliationStatusOptions.active.value,
+        )
+        .order_by("created_date")
+        .values_list("id", flat=True)
+        .first()
+    )
+    entry, created = AutomatedInvoiceLedger.objects.get_or_create(
+        booking_external_id=booking.external_id,
+        defaults={
+            "booking_id": booking.id,
+            "facility_id": invoice.facility_id,
+            "charge_item_id": invoice.charge_items[0],
+            "invoice_id": invoice.id,
+            "payment_id": payment_id,
+        },
+    )
+    return entry if created else None
@@ -0,0 +1,154 @@
+"""Block-allocated invoice numbers for automated invoices.
+
+The core ``evaluate_invoice_identifier_default_expression`` derives the number
+from the facility's current invoice count, so every caller has to hold the
+global ``InvoiceCreateLock``. When ``HMIS_INVOICE_NUMBER_FORMAT`` is set, each
+worker process instead reserves ``HMIS_INVOICE_NUMBER_BLOCK_SIZE`` numbers per
+facility with one atomic ``UPDATE ... RETURNING`` and hands them out locally.
+
+Manual invoices keep the facility's expression, so the two series must not
+overlap: ``check_configuration`` requires the template to start with a literal
+prefix, and the first number handed out for a facility checks that its
+expression does not render a number of the template's shape.
+
+See ``docs/invoice_number_blocks.md`` for the format and gap semantics.
+"""
+
+import re
+import threading
+from string import Formatter
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from care.emr.resources.invoice.default_expression_evaluator import (
+    evaluate_invoice_identifier_default_expression,
+)
+from care.utils.time_util import care_now
+from care_state_hmis.models import InvoiceNumberBlock
+from care_state_hmis.settings import plugin_settings
+
+FIELDS = {"sequence", "facility_id", "year", "yy", "month"}
+
+
+def allocator_enabled():
+    return bool(plugin_settings.HMIS_INVOICE_NUMBER_FORMAT)
+
+
+def check_configuration():
+    template = plugin_settings.HMIS_INVOICE_NUMBER_FORMAT
+    if not template:
+        return
+    try:
+        parsed = list(Formatter().parse(template))
+        format_invoice_number(0, 0)
+    except (ValueError, KeyError, IndexError) as e:
+        raise ImproperlyConfigured(f"HMIS_INVOICE_NUMBER_FORMAT: {e}") from None
+    fields = {field for _, field, _, _ in parsed if field is not None}
+    if "sequence" not in fields:
+        raise ImproperlyConfigured("HMIS_INVOICE_NUMBER_FORMAT must contain '{sequence}'")
+    if fields - FIELDS:
+        raise ImproperlyConfigured(f"HMIS_INVOICE_NUMBER_FORMAT: unknown fields {sorted(fields - FIELDS)}")
+    if not parsed[0][0]:
+        raise ImproperlyConfigured(
+            "HMIS_INVOICE_NUMBER_FORMAT must start with a literal prefix that no facility identifier expression produces"
+        )
+
+
+def number_pattern(template):
+    """A regex matching every number ``template`` can render."""
+    parts = []
+    for literal, field, _, _ in Formatter().parse(template):
+        parts.append(re.escape(literal))
+        if field is not None:
+            parts.append(".+?")
+    return re.compile("".join(parts), re.DOTALL)
+
+
+def _check_disjoint(facility):
+    """Refuse to allocate for a facility whose expression renders numbers of the template's shape."""
+    template = plugin_settings.HMIS_INVOICE_NUMBER_FORMAT
+    expression_number = evaluate_invoice_identifier_default_expression(facility)
+    if expression_number and number_pattern(template).fullmatch(str(expression_number)):
+        raise ImproperlyConfigured(
+            f"HMIS_INVOICE_NUMBER_FORMAT '{template}' overlaps the identifier expression of facility "
+            f"{facility.id} (next number '{expression_number}'); use a prefix the expression does not produce"
+        )
+
+
+def _reserve(facility_id, size):
+    """Reserve ``size`` numbers for ``facility_id``; returns the range as ``(start, end)``."""
+    # Reservations commit on their own connection: a range handed out must
+    # never return to the pool when the invoice transaction rolls back,
+    # otherwise another worker could reserve it again. It is closed right
+    # away; a worker reserves once per block.
+    conn = connections.create_connection(DEFAULT_DB_ALIAS)
+    try:
+        table = conn.ops.quote_name(InvoiceNumberBlock._meta.db_table)  # noqa: SLF001
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} SET next_value = next_value + %s WHERE facility_id = %s RETURNING next_value",  # noqa: S608
+                [size, facility_id],
+            )
+            row = cursor.fetchone()
+            if row is None:
+                cursor.execute(
+                    f"INSERT INTO {table} (facility_id, next_value) VALUES (%s, %s) "  # noqa: S608
+                    "ON CONFLICT (facility_id) DO UPDATE SET next_value = "
+                    f"{table}.next_value + %s RETURNING next_value",
+                    [facility_id, 1 + size, size],
+                )
+                row = cursor.fetchone()
+    finally:
+        conn.close()
+    end = row[0]
+    return end - size, end
+
+
+class InvoiceNumberAllocator:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._blocks = {}
+        self._checked = set()
+
+    def next_sequence(self, facility_id):
+        with self._lock:
+            start, end = self._blocks.get(facility_id, (0, 0))
+            if start >= end:
+                start, end = _reserve(facility_id, plugin_settings.HMIS_INVOICE_NUMBER_BLOCK_SIZE)
+            self._blocks[facility_id] = (start + 1, end)
+            return start
+
+    def check_facility(self, facility):
+        """``_check_disjoint`` once per facility and template in this process."""
+        key = (facility.id, plugin_settings.HMIS_INVOICE_NUMBER_FORMAT)
+        if key in self._checked:
+            return
+        _check_disjoint(facility)
+        with self._lock:
+            self._checked.add(key)
+
+    def reset(self):
+        """Drop locally held blocks; their unused numbers become gaps."""
+        with self._lock:
+            self._blocks.clear()
+            self._checked.clear()
+
+
+allocator = InvoiceNumberAllocator()
+
+
+def format_invoice_number(facility_id, sequence):
+    now = care_now()
+    return plugin_settings.HMIS_INVOICE_NUMBER_FORMAT.format(
+        sequence=sequence,
+        facility_id=facility_id,
+        year=now.strftime("%Y"),
+        yy=now.strftime("%y"),
+        month=now.strftime("%m"),
+    )
+
+
+def next_invoice_number(facility):
+    allocator.check_facility(facility)
+    return format_invoice_number(facility.id, allocator.next_sequence(facility.id))
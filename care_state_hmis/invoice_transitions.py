@@ -0,0 +1,44 @@
+"""Optimistic invoice status transitions.
+
+Instead of holding ``InvoiceLock`` around a read-then-save, a transition is a
+single ``UPDATE ... WHERE status = <expected>``: the status the caller last
+saw acts as the version. Exactly one concurrent caller wins; the others see
+zero rows updated, re-read the invoice and either find the work already done
+or retry, a bounded number of times.
+"""
+
+from care.emr.models.invoice import Invoice
+from care.utils.time_util import care_now
+
+MAX_ATTEMPTS = 3
+
+
+class InvoiceTransitionConflict(Exception):
+    """The invoice kept changing under the transition, or left the expected status."""
+
+
+def transition_invoice(invoice, expected, target, **fields):
+    """Move ``invoice`` from ``expected`` to ``target`` status, setting ``fields`` too.
+
+    Returns True if this call made the transition and False if the invoice
+    was already in ``target``. Raises ``InvoiceTransitionConflict`` when it
+    is in any other status.
+    """
+    for _ in range(MAX_ATTEMPTS):
+        updated = Invoice.objects.filter(pk=invoice.pk, status=expected).update(
+            status=target,
+            modified_date=care_now(),
+            **fields,
+        )
+        if updated:
+            invoice.status = target
+            for name, value in fields.items():
+                setattr(invoice, name, value)
+            return True
+        current = Invoice.objects.filter(pk=invoice.pk).values_list("status", flat=True).first()
+        if current == target:
+            invoice.status = target
+            return False
+        if current != expected:
+            break
+    raise InvoiceTransitionConflict(f"Invoice {invoice.pk} could not move from {expected} to {target} (now {current})")
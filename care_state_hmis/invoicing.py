@@ -0,0 +1,319 @@
+"""Automated invoicing for appointment charge items.
+
+``create_automated_invoice`` is the synchronous path used from the booking
+``post_save`` receiver. With ``HMIS_INVOICE_ASYNC_AUTOMATION`` enabled the
+receiver calls ``enqueue_appointment_invoice`` instead, and
+``process_invoice_queue`` (run from a Celery task) drains the queue in
+batches, taking ``InvoiceCreateLock`` once per facility per batch. With the
+block allocator enabled (``invoice_numbers``) neither path takes the lock.
+A queued booking whose processing keeps failing is parked after
+``HMIS_INVOICE_QUEUE_MAX_ATTEMPTS`` claims and reported by
+``invoice_queue_stats`` until ``retry_parked_invoices`` re-queues it.
+
+Both paths claim the booking in ``invoice_ledger`` in the transaction that
+creates its invoice, so a booking is invoiced at most once however often it
+is processed.
+"""
+
+import logging
+from collections import defaultdict
+from contextlib import nullcontext
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import F, Min, Q
+from rest_framework.exceptions import ValidationError
+
+from care.emr.locks.billing import InvoiceCreateLock
+from care.emr.models.invoice import Invoice
+from care.emr.models.payment_reconciliation import PaymentReconciliation
+from care.emr.models.scheduling.booking import TokenBooking
+from care.emr.resources.charge_item.spec import ChargeItemStatusOptions
+from care.emr.resources.invoice.default_expression_evaluator import (
+    evaluate_invoice_identifier_default_expression,
+)
+from care.emr.resources.invoice.spec import InvoiceStatusOptions
+from care.emr.resources.invoice.sync_items import sync_invoice_items
+from care.emr.resources.payment_reconciliation.spec import (
+    PaymentReconciliationIssuerTypeOptions,
+    PaymentReconciliationKindOptions,
+    PaymentReconciliationOutcomeOptions,
+    PaymentReconciliationPaymentMethodOptions,
+    PaymentReconciliationStatusOptions,
+    PaymentReconciliationTypeOptions,
+)
+from care.utils.lock import ObjectLocked
+from care.utils.time_util import care_now
+from care_state_hmis import instrumentation, invoice_ledger, invoice_numbers
+from care_state_hmis.invoice_transitions import transition_invoice
+from care_state_hmis.models import PendingAppointmentInvoice
+from care_state_hmis.settings import plugin_settings
+
+logger = logging.getLogger(__name__)
+
+# How long a worker may hold a claimed batch before another worker retries it
+CLAIM_LEASE = timedelta(minutes=5)
+
+# Fields ``sync_invoice_items`` recomputes on the invoice
+INVOICE_TOTAL_FIELDS = [
+    "total_net",
+    "total_gross",
+    "total_price_components",
+    "charge_items_copy",
+]
+
+
+def invoice_create_lock():
+    """``InvoiceCreateLock`` unless numbers come from the block allocator."""
+    if invoice_numbers.allocator_enabled():
+        return nullcontext()
+    return instrumentation.lock_wait(InvoiceCreateLock())
+
+
+def _invoice_number(facility):
+    if invoice_numbers.allocator_enabled():
+        return invoice_numbers.next_invoice_number(facility)
+    return evaluate_invoice_identifier_default_expression(facility)
+
+
+def build_invoice_draft(booking, charge_item, number):
+    return Invoice(
+        facility_id=charge_item.facility_id,
+        account_id=charge_item.account_id,
+        patient_id=booking.patient_id,
+        status=InvoiceStatusOptions.draft.value,
+        number=number,
+        charge_items=[charge_item.id],
+        created_by_id=booking.created_by_id,
+        updated_by_id=booking.updated_by_id,
+        meta={
+            "automated": True,
+        },
+    )
+
+
+def create_invoice_draft(booking, charge_item):
+    """Create the draft automated invoice; the caller holds ``invoice_create_lock()``."""
+    invoice = build_invoice_draft(booking, charge_item, _invoice_number(charge_item.facility))
+    invoice.save(force_insert=True)
+    return invoice
+
+
+def create_invoice_drafts(pairs):
+    """Drafts for ``(booking, charge_item)`` pairs; the caller holds ``invoice_create_lock()``."""
+    if invoice_numbers.allocator_enabled():
+        return Invoice.objects.bulk_create(
+            [build_invoice_draft(booking, charge_item, _invoice_number(charge_item.facility)) for booking, charge_item in pairs]
+        )
+    # Expression numbers are derived from the invoice count, so each draft
+    # has to exist before the next number is evaluated.
+    return [create_invoice_draft(booking, charge_item) for booking, charge_item in pairs]
+
+
+def build_cash_payment(booking, charge_item, invoice, payment_datetime):
+    return PaymentReconciliation(
+        facility_id=charge_item.facility_id,
+        account_id=charge_item.account_id,
+        amount=charge_item.total_price,
+        tendered_amount=charge_item.total_price,
+        returned_amount=0,
+        is_credit_note=False,
+        issuer_type=PaymentReconciliationIssuerTypeOptions.patient.value,
+        kind=PaymentReconciliationKindOptions.deposit.value,
+        method=PaymentReconciliationPaymentMethodOptions.cash.value,
+        outcome=PaymentReconciliationOutcomeOptions.complete.value,
+        reconciliation_type=PaymentReconciliationTypeOptions.payment.value,
+        status=PaymentReconciliationStatusOptions.active.value,
+        payment_datetime=payment_datetime,
+        target_invoice=invoice,
+        created_by_id=booking.created_by_id,
+        updated_by_id=booking.updated_by_id,
+    )
+
+
+def settle_invoice(booking, charge_item, invoice):
+    """Bill ``charge_item`` on the draft ``invoice``, issue it and record the cash payment; returns the payment."""
+    charge_item.paid_invoice = invoice
+    charge_item.status = ChargeItemStatusOptions.billed.value
+    charge_item.save(update_fields=["paid_invoice", "status"])
+    sync_invoice_items(invoice)
+    invoice.save(update_fields=INVOICE_TOTAL_FIELDS)
+
+    # issue invoice
+    transition_invoice(
+        invoice,
+        InvoiceStatusOptions.draft.value,
+        InvoiceStatusOptions.issued.value,
+        issue_date=care_now(),
+    )
+
+    # record payment
+    payment = build_cash_payment(booking, charge_item, invoice, care_now())
+    payment.save(force_insert=True)
+    return payment
+
+
+def create_automated_invoice(booking, charge_item):
+    """Invoice ``charge_item`` for ``booking``; None if the booking was already invoiced."""
+    with transaction.atomic():
+        entry, created = invoice_ledger.claim_booking(booking, charge_item)
+        if not created:
+            instrumentation.outcome("already_invoiced")
+            return None
+        try:
+            with invoice_create_lock():
+                invoice = create_invoice_draft(booking, charge_item)
+        except ObjectLocked as e:
+            raise ValidationError("Invoice creation failed") from e
+        entry.invoice_id = invoice.id
+        entry.payment_id = settle_invoice(booking, charge_item, invoice).id
+        entry.save(update_fields=["invoice_id", "payment_id"])
+    return invoice
+
+
+def enqueue_appointment_invoice(booking, facility_id):
+    """Queue ``booking`` for invoicing once the surrounding transaction commits."""
+    from care_state_hmis.tasks import process_appointment_invoice_queue
+
+    _, created = PendingAppointmentInvoice.objects.get_or_create(
+        booking_id=booking.id,
+        defaults={"facility_id": facility_id},
+    )
+    if created:
+        transaction.on_commit(process_appointment_invoice_queue.delay)
+
+
+async def aenqueue_appointment_invoice(booking, facility_id):
+    """``enqueue_appointment_invoice`` for async callers, which are outside a transaction."""
+    from care_state_hmis.tasks import process_appointment_invoice_queue
+
+    _, created = await PendingAppointmentInvoice.objects.aget_or_create(
+        booking_id=booking.id,
+        defaults={"facility_id": facility_id},
+    )
+    if created:
+        await sync_to_async(process_appointment_invoice_queue.delay, thread_sensitive=False)()
+
+
+def _pending():
+    return PendingAppointmentInvoice.objects.filter(processed_at__isnull=True)
+
+
+def _parked_filter():
+    max_attempts = plugin_settings.HMIS_INVOICE_QUEUE_MAX_ATTEMPTS
+    return Q(attempts__gte=max_attempts) if max_attempts else Q(pk__in=[])
+
+
+def _claim_batch(batch_size):
+    now = care_now()
+    with transaction.atomic():
+        ids = list(
+            _pending()
+            .select_for_update(skip_locked=True)
+            .exclude(_parked_filter())
+            .filter(Q(claimed_until__isnull=True) | Q(claimed_until__lt=now))
+            .order_by("enqueued_at")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        PendingAppointmentInvoice.objects.filter(id__in=ids).update(
+            claimed_until=now + CLAIM_LEASE,
+            attempts=F("attempts") + 1,
+        )
+    return list(PendingAppointmentInvoice.objects.filter(id__in=ids).order_by("enqueued_at"))
+
+
+def _billable_charge_item(booking):
+    charge_item = booking.charge_item
+    if not charge_item or charge_item.status != ChargeItemStatusOptions.billable.value:
+        return None
+    return charge_item
+
+
+def _create_facility_drafts(entries, bookings):
+    """Create drafts for one facility's entries under a single ``invoice_create_lock()``.
+
+    The invoice id is stored on the entry and the ledger in the same
+    transaction, so a retry after a later failure settles the existing draft
+    instead of creating a second invoice; a booking invoiced by another path
+    picks up that invoice, which is no longer a draft and is left alone.
+    """
+    with transaction.atomic(), invoice_create_lock():
+        for entry in entries:
+            if entry.invoice_id:
+                continue
+            booking = bookings.get(entry.booking_id)
+            charge_item = booking and _billable_charge_item(booking)
+            if charge_item is None:
+                continue
+            ledger_entry, created = invoice_ledger.claim_booking(booking, charge_item)
+            if created:
+                invoice_ledger.record_invoice(ledger_entry, create_invoice_draft(booking, charge_item))
+            entry.invoice_id = ledger_entry.invoice_id
+            entry.save(update_fields=["invoice_id"])
+
+
+def _settle_entry(entry, booking):
+    with transaction.atomic():
+        charge_item = booking and _billable_charge_item(booking)
+        if charge_item is not None and entry.invoice_id:
+            invoice = Invoice.objects.get(id=entry.invoice_id)
+            if invoice.status == InvoiceStatusOptions.draft.value:
+                invoice_ledger.record_payment(booking, settle_invoice(booking, charge_item, invoice))
+        entry.processed_at = care_now()
+        entry.last_error = ""
+        entry.save(update_fields=["processed_at", "last_error"])
+
+
+def process_invoice_queue(batch_size=None):
+    """Invoice one claimed batch of queued bookings; returns the number processed."""
+    entries = _claim_batch(batch_size or plugin_settings.HMIS_INVOICE_QUEUE_BATCH_SIZE)
+    if not entries:
+        return 0
+    bookings = TokenBooking.objects.select_related("charge_item__facility").in_bulk(
+        [entry.booking_id for entry in entries]
+    )
+    by_facility = defaultdict(list)
+    for entry in entries:
+        by_facility[entry.facility_id].append(entry)
+
+    processed = 0
+    for facility_id, facility_entries in by_facility.items():
+        try:
+            _create_facility_drafts(facility_entries, bookings)
+        except ObjectLocked:
+            # Left claimed; picked up again once the lease expires. Contention
+            # is not the entries' fault, so it does not count as an attempt.
+            logger.warning("Invoice creation lock busy for facility %s, retrying later", facility_id)
+            PendingAppointmentInvoice.objects.filter(id__in=[entry.id for entry in facility_entries]).update(
+                attempts=F("attempts") - 1
+            )
+            continue
+        for entry in facility_entries:
+            try:
+                _settle_entry(entry, bookings.get(entry.booking_id))
+                processed += 1
+            except Exception as e:
+                logger.exception("Failed to invoice booking %s (attempt %s)", entry.booking_id, entry.attempts)
+                max_attempts = plugin_settings.HMIS_INVOICE_QUEUE_MAX_ATTEMPTS
+                if max_attempts and entry.attempts >= max_attempts:
+                    logger.error("Parked queued booking %s after %s attempts", entry.booking_id, entry.attempts)
+                entry.last_error = str(e)
+                entry.save(update_fields=["last_error"])
+    return processed
+
+
+def retry_parked_invoices():
+    """Re-queue parked bookings with a fresh attempt budget; returns how many."""
+    return _pending().filter(_parked_filter()).update(attempts=0, claimed_until=None)
+
+
+def invoice_queue_stats():
+    """Queue depth, the age in seconds of the oldest pending booking and the parked count."""
+    pending = _pending().exclude(_parked_filter())
+    oldest = pending.aggregate(oldest=Min("enqueued_at"))["oldest"]
+    return {
+        "depth": pending.count(),
+        "lag_seconds": (care_now() - oldest).total_seconds() if oldest else 0,
+        "parked": _pending().filter(_parked_filter()).count(),
+    }
@@ -0,0 +1,45 @@
+import json
+from collections import Counter
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from care_state_hmis import invoice_ledger
+
+
+class Command(BaseCommand):
+    help = "Check the automated invoice ledger against invoices and payments, and find automated invoices it does not record."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--facility", type=int, help="Only this facility id")
+        parser.add_argument("--since", type=date.fromisoformat, help="Only rows created on or after this day (YYYY-MM-DD)")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--record-unrecorded",
+            action="store_true",
+            help="Ledger automated invoices created before the ledger existed",
+        )
+
+    def handle(self, *args, **options):
+        problems = Counter()
+        recorded = 0
+        for problem, row, detail in invoice_ledger.audit(options["facility"], options["since"], options["batch_size"]):
+            if problem == invoice_ledger.UNRECORDED and options["record_unrecorded"]:
+                if invoice_ledger.record_unrecorded(row):
+                    recorded += 1
+                    continue
+            problems[problem] += 1
+            self.stdout.write(f"{problem}: {self._describe(problem, row, detail)}")
+        if options["record_unrecorded"]:
+            self.stdout.write(f"Recorded {recorded} automated invoices")
+        self.stdout.write(json.dumps(dict(problems)))
+        if problems:
+            raise CommandError(f"{sum(problems.values())} automated billing problems")
+        self.stdout.write(self.style.SUCCESS("Automated invoice ledger is consistent"))
+
+    def _describe(self, problem, row, detail):
+        if problem == invoice_ledger.DUPLICATE:
+            return f"invoice {row.id} bills charge item {row.charge_items[0]}, already invoiced as {detail}"
+        if problem == invoice_ledger.UNRECORDED:
+            return f"invoice {row.id} (charge item {detail}) has no ledger row"
+        return f"booking {row.booking_external_id}: invoice {row.invoice_id}, payment {row.payment_id} ({detail})"
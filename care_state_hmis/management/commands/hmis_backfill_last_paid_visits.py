@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from care_state_hmis.models import LastPaidVisit
+from care_state_hmis.revisit import (
+    compute_last_paid_visits,
+    iter_orphaned_patient_batches,
+    iter_patient_batches,
+)
+
+
+class Command(BaseCommand):
+    help = "Rebuild the LastPaidVisit table from TokenBooking history, in patient batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="Patients per batch")
+
+    def handle(self, *args, **options):
+        total = 0
+        for patient_ids in iter_patient_batches(options["batch_size"]):
+            expected = compute_last_paid_visits(patient_ids)
+            rows = [
+                LastPaidVisit(patient_id=patient_id, scope=scope, scope_id=scope_id, **values)
+                for (patient_id, scope, scope_id), values in expected.items()
+            ]
+            with transaction.atomic():
+                LastPaidVisit.objects.filter(patient_id__in=patient_ids).delete()
+                LastPaidVisit.objects.bulk_create(rows)
+            total += len(rows)
+            self.stdout.write(f"Backfilled {len(rows)} visits for {len(patient_ids)} patients (up to patient {patient_ids[-1]})")
+        removed = 0
+        for patient_ids in iter_orphaned_patient_batches(options["batch_size"]):
+            removed += LastPaidVisit.objects.filter(patient_id__in=patient_ids).delete()[0]
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {total} visits, removed {removed} stale rows"))
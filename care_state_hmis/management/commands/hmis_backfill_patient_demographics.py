@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from care_state_hmis.demographics import backfill_patient_demographics, iter_patient_batches
+
+
+class Command(BaseCommand):
+    help = "Rebuild the PatientDemographics table from patient extension data, in patient batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Patients per batch")
+
+    def handle(self, *args, **options):
+        total = 0
+        for patients in iter_patient_batches(options["batch_size"]):
+            with transaction.atomic():
+                written = backfill_patient_demographics(patients)
+            total += written
+            self.stdout.write(f"Backfilled {written} of {len(patients)} patients (up to patient {patients[-1].id})")
+        self.stdout.write(self.style.SUCCESS(f"Backfilled demographics for {total} patients"))
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from care.emr.models.scheduling.booking import TokenBooking
+from care_state_hmis.bulk import bulk_invoice_bookings, pending_bookings
+
+
+class Command(BaseCommand):
+    help = (
+        "Apply the appointment auto-invoicing rules (revisit detection, invoice, "
+        "cash payment) to bookings that were created without the booking signals."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ids-file", help="File with one booking id or external id per line")
+        parser.add_argument("--facility", help="Only bookings of this facility (external id)")
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--dry-run", action="store_true", help="Only count the pending bookings")
+
+    def _read_ids(self, path):
+        ids, external_ids = [], []
+        with open(path) as f:
+            for line in f:
+                value = line.strip()
+                if not value:
+                    continue
+                (ids if value.isdigit() else external_ids).append(value)
+        return ids, external_ids
+
+    def handle(self, *args, **options):
+        bookings = TokenBooking.objects.all()
+        if options["ids_file"]:
+            ids, external_ids = self._read_ids(options["ids_file"])
+            bookings = bookings.filter(id__in=ids) | bookings.filter(external_id__in=external_ids)
+        elif not options["facility"]:
+            raise CommandError("Pass --ids-file and/or --facility")
+        if options["facility"]:
+            bookings = bookings.filter(token_slot__availability__schedule__resource__facility__external_id=options["facility"])
+
+        if options["dry_run"]:
+            self.stdout.write(f"{pending_bookings(bookings).count()} bookings pending invoicing")
+            return
+        result = bulk_invoice_bookings(bookings, batch_size=options["batch_size"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Processed {result.processed} bookings: {result.revisits} revisits, {result.invoiced} invoiced")
+        )
@@ -0,0 +1,72 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from care.utils.time_util import care_now
+from care_state_hmis.models import LastPaidVisit
+from care_state_hmis.revisit import (
+    compute_last_paid_visits,
+    iter_orphaned_patient_batches,
+    iter_patient_batches,
+    live_last_paid_on,
+    scope_revisit_definition_ids,
+    stored_last_paid_visits,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Check that every LastPaidVisit row gives the answer of the live TokenBooking scan "
+        "(revisit.live_last_paid_on) for each schedule in its scope."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="Patients per batch")
+        parser.add_argument("--fix", action="store_true", help="Repair mismatched rows in place")
+
+    def handle(self, *args, **options):
+        now = care_now()
+        definitions = {}
+        mismatches = missing = 0
+        for patient_ids in iter_patient_batches(options["batch_size"]):
+            stored = stored_last_paid_visits(patient_ids)
+            expected = compute_last_paid_visits(patient_ids)
+            for key, have in stored.items():
+                patient_id, scope, scope_id = key
+                if (scope, scope_id) not in definitions:
+                    definitions[scope, scope_id] = scope_revisit_definition_ids(scope, scope_id)
+                for revisit_definition_id in definitions[scope, scope_id]:
+                    # Rows holding the asking schedule's revisit definition are
+                    # skipped by last_paid_on, as are future-dated ones
+                    if have["charge_item_definition_id"] == revisit_definition_id or have["slot_start"] > now:
+                        continue
+                    live = live_last_paid_on(patient_id, scope, scope_id, now, revisit_definition_id)
+                    if have["paid_on"] == live:
+                        continue
+                    mismatches += 1
+                    self.stdout.write(
+                        f"Mismatch for patient={patient_id} {scope}:{scope_id} revisit_definition={revisit_definition_id}: "
+                        f"live {live}, stored {have['paid_on']}"
+                    )
+                    if options["fix"]:
+                        self._repair(key, expected.get(key))
+                    break
+            # No row only costs the live scan, but the backfill should have written one
+            for key in expected.keys() - stored.keys():
+                missing += 1
+                if options["fix"]:
+                    self._repair(key, expected[key])
+        for patient_ids in iter_orphaned_patient_batches(options["batch_size"]):
+            for key, have in stored_last_paid_visits(patient_ids).items():
+                mismatches += 1
+                self.stdout.write(f"Mismatch for patient={key[0]} {key[1]}:{key[2]}: live None, stored {have['paid_on']}")
+                if options["fix"]:
+                    self._repair(key, None)
+        if (mismatches or missing) and not options["fix"]:
+            raise CommandError(f"{mismatches} LastPaidVisit rows disagree with the live scan, {missing} are missing")
+        self.stdout.write(self.style.SUCCESS(f"Checked LastPaidVisit, {mismatches} mismatches, {missing} missing"))
+
+    def _repair(self, key, values):
+        patient_id, scope, scope_id = key
+        if values is None:
+            LastPaidVisit.objects.filter(patient_id=patient_id, scope=scope, scope_id=scope_id).delete()
+        else:
+            LastPaidVisit.objects.update_or_create(patient_id=patient_id, scope=scope, scope_id=scope_id, defaults=values)
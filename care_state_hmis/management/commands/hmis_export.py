@@ -0,0 +1,46 @@
+import sys
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from care.emr.models.organization import Organization
+from care_state_hmis import exports
+
+
+class Command(BaseCommand):
+    help = "Stream encounters, invoices or payments created in a date range as CSV or NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("dataset", choices=sorted(exports.DATASETS))
+        parser.add_argument("--from", dest="date_from", type=date.fromisoformat, required=True, help="First day (YYYY-MM-DD)")
+        parser.add_argument("--to", dest="date_to", type=date.fromisoformat, required=True, help="Last day, inclusive (YYYY-MM-DD)")
+        parser.add_argument("--facility", type=int, nargs="*", help="Facility ids")
+        parser.add_argument("--organization", type=int, help="Organization id (e.g. a district); exports all its facilities")
+        parser.add_argument("--format", dest="export_format", choices=sorted(exports.FORMATS), default=exports.CSV)
+        parser.add_argument("--automated", action="store_true", help="Only invoices created by the plugin")
+        parser.add_argument("--caste", nargs="*", help="Only patients with these castes")
+        parser.add_argument("--religion", nargs="*", help="Only patients with these religions")
+        parser.add_argument("--output", help="File to write (default: stdout)")
+
+    def handle(self, *args, **options):
+        if options["automated"] and options["dataset"] != "invoices":
+            raise CommandError("--automated only applies to invoices")
+        if options["organization"]:
+            facility_ids = exports.organization_facility_ids(Organization.objects.get(id=options["organization"]))
+        elif options["facility"]:
+            facility_ids = options["facility"]
+        else:
+            raise CommandError("Pass --facility or --organization")
+
+        demographics = {f"{field}__in": options[field] for field in ("caste", "religion") if options[field]}
+        rows = exports.export_rows(
+            options["dataset"], options["date_from"], options["date_to"], facility_ids, options["automated"], demographics
+        )
+        chunks = exports.encode(rows, options["export_format"], exports.DATASETS[options["dataset"]].columns)
+        output = open(options["output"], "w", newline="") if options["output"] else sys.stdout  # noqa: SIM115
+        try:
+            for chunk in chunks:
+                output.write(chunk)
+        finally:
+            if output is not sys.stdout:
+                output.close()
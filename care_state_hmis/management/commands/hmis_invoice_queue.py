@@ -0,0 +1,24 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from care_state_hmis.invoicing import invoice_queue_stats, process_invoice_queue, retry_parked_invoices
+
+
+class Command(BaseCommand):
+    help = "Report the appointment invoice queue depth and lag, optionally draining it."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--process", action="store_true", help="Drain the queue before reporting")
+        parser.add_argument("--batch-size", type=int, default=None)
+        parser.add_argument("--retry-parked", action="store_true", help="Re-queue bookings parked after repeated failures")
+
+    def handle(self, *args, **options):
+        if options["retry_parked"]:
+            self.stdout.write(f"Re-queued {retry_parked_invoices()} parked bookings")
+        if options["process"]:
+            processed = 0
+            while batch := process_invoice_queue(options["batch_size"]):
+                processed += batch
+            self.stdout.write(f"Processed {processed} bookings")
+        self.stdout.write(json.dumps(invoice_queue_stats()))
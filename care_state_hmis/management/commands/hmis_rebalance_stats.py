@@ -0,0 +1,12 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from care_state_hmis.rebalance import rebalance_counters
+
+
+class Command(BaseCommand):
+    help = "Report how many account rebalances were requested, coalesced and dispatched."
+
+    def handle(self, *args, **options):
+        self.stdout.write(json.dumps(rebalance_counters()))
@@ -0,0 +1,43 @@
+from contextlib import nullcontext
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from care_state_hmis import replica, reporting
+
+
+class Command(BaseCommand):
+    help = "Recompute DailyFacilityStat rollups for a date range from the source rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="date_from", type=date.fromisoformat, required=True, help="First day (YYYY-MM-DD)")
+        parser.add_argument("--to", dest="date_to", type=date.fromisoformat, required=True, help="Last day, inclusive (YYYY-MM-DD)")
+        parser.add_argument("--facility", type=int, nargs="*", help="Only these facility ids")
+        parser.add_argument(
+            "--group",
+            choices=sorted(reporting.GROUP_METRICS),
+            nargs="*",
+            help="Only these rollup groups (default: all)",
+        )
+        parser.add_argument("--chunk-days", type=int, default=31, help="Days recomputed per transaction")
+        parser.add_argument(
+            "--replica",
+            action="store_true",
+            help="Read source rows from HMIS_REPLICA_DATABASE (for historical ranges; recent days may lag)",
+        )
+
+    def handle(self, *args, **options):
+        date_from, date_to = options["date_from"], options["date_to"]
+        if date_to < date_from:
+            raise CommandError("--to must not be before --from")
+        groups = options["group"] or tuple(reporting.GROUP_METRICS)
+        total = 0
+        start = date_from
+        while start <= date_to:
+            end = min(start + timedelta(days=options["chunk_days"] - 1), date_to)
+            with replica.replica_reads() if options["replica"] else nullcontext():
+                written = reporting.rebuild(start, end, options["facility"], groups)
+            total += written
+            self.stdout.write(f"Rebuilt {start} to {end}: {written} rows")
+            start = end + timedelta(days=1)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {total} rollup rows"))
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from care.emr.models.payment_reconciliation import PaymentReconciliation
+from care_state_hmis.payment_totals import rebuild_invoice_totals_batch
+
+
+class Command(BaseCommand):
+    help = "Recompute InvoicePaymentTotal rows from PaymentReconciliation history, repairing drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--invoice", type=int, nargs="*", help="Only these invoice ids")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Invoices per batch")
+        parser.add_argument("--dry-run", action="store_true", help="Report drift without writing")
+
+    def _batches(self, batch_size):
+        last_id = 0
+        while True:
+            batch = list(
+                PaymentReconciliation.objects.filter(target_invoice_id__gt=last_id)
+                .order_by("target_invoice_id")
+                .values_list("target_invoice_id", flat=True)
+                .distinct()[:batch_size]
+            )
+            if not batch:
+                return
+            yield batch
+            last_id = batch[-1]
+
+    def handle(self, *args, **options):
+        batches = [options["invoice"]] if options["invoice"] else self._batches(options["batch_size"])
+        drifted = total = 0
+        for invoice_ids in batches:
+            # Each batch is rebuilt under its rows' locks, so payments posted
+            # meanwhile are neither lost nor counted twice
+            total += len(set(invoice_ids))
+            for invoice_id, stored, expected in rebuild_invoice_totals_batch(invoice_ids, dry_run=options["dry_run"]):
+                drifted += 1
+                self.stdout.write(f"Invoice {invoice_id}: stored {stored}, expected {expected}")
+        action = "Found" if options["dry_run"] else "Repaired"
+        self.stdout.write(self.style.SUCCESS(f"{action} {drifted} drifted totals across {total} invoices"))
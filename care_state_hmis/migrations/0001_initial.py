@@ -0,0 +1,30 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="LastPaidVisit",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("patient_id", models.BigIntegerField()),
+                ("scope", models.CharField(choices=[("facility", "Facility"), ("resource", "Resource")], max_length=16)),
+                ("scope_id", models.BigIntegerField()),
+                ("booking_id", models.BigIntegerField(db_index=True)),
+                ("slot_start", models.DateTimeField()),
+                ("paid_on", models.DateTimeField()),
+                ("charge_item_definition_id", models.BigIntegerField(blank=True, null=True)),
+                ("modified_date", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(fields=("patient_id", "scope", "scope_id"), name="hmis_last_paid_visit_unique")
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("care_state_hmis", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PendingAppointmentInvoice",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("booking_id", models.BigIntegerField(unique=True)),
+                ("facility_id", models.BigIntegerField()),
+                ("enqueued_at", models.DateTimeField(auto_now_add=True)),
+                ("claimed_until", models.DateTimeField(blank=True, null=True)),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                ("invoice_id", models.BigIntegerField(blank=True, null=True)),
+                ("processed_at", models.DateTimeField(blank=True, null=True)),
+                ("last_error", models.TextField(blank=True, default="")),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        condition=models.Q(("processed_at__isnull", True)),
+                        fields=["enqueued_at"],
+                        name="hmis_pending_invoice_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("care_state_hmis", "0002_pendingappointmentinvoice"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="InvoiceNumberBlock",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("facility_id", models.BigIntegerField(unique=True)),
+                ("next_value", models.BigIntegerField(default=1)),
+            ],
+        ),
+    ]
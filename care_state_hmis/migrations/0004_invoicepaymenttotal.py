@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("care_state_hmis", "0003_invoicenumberblock"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="InvoicePaymentTotal",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("invoice_id", models.BigIntegerField(unique=True)),
+                ("total_payments", models.DecimalField(decimal_places=6, default=0, max_digits=20)),
+                ("total_credit_notes", models.DecimalField(decimal_places=6, default=0, max_digits=20)),
+            ],
+        ),
+    ]
@@ -0,0 +1,25 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("care_state_hmis", "0004_invoicepaymenttotal"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PatientDemographics",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("patient_id", models.BigIntegerField(unique=True)),
+                ("caste", models.CharField(blank=True, db_index=True, default="", max_length=32)),
+                ("religion", models.CharField(blank=True, db_index=True, default="", max_length=32)),
+                ("related_person", models.TextField(blank=True, default="")),
+                ("modified_date", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "indexes": [models.Index(fields=["caste", "religion"], name="hmis_demographics_idx")],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("care_state_hmis", "0005_patientdemographics"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyFacilityStat",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("facility_id", models.BigIntegerField()),
+                ("date", models.DateField()),
+                (
+                    "metric",
+                    models.CharField(
+                        choices=[
+                            ("opd_new", "Opd New"),
+                            ("opd_revisit", "Opd Revisit"),
+                            ("ip_admissions", "Ip Admissions"),
+                            ("revenue", "Revenue"),
+                        ],
+                        max_length=32,
+                    ),
+                ),
+                ("dimension", models.CharField(blank=True, default="", max_length=64)),
+                ("value", models.DecimalField(decimal_places=6, default=0, max_digits=20)),
+                ("modified_date", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("facility_id", "date", "metric", "dimension"), name="hmis_daily_stat_unique"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("care_state_hmis", "0006_dailyfacilitystat"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AutomatedInvoiceLedger",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("booking_external_id", models.UUIDField(unique=True)),
+                ("booking_id", models.BigIntegerField()),
+                ("facility_id", models.BigIntegerField()),
+                ("charge_item_id", models.BigIntegerField(db_index=True)),
+                ("invoice_id", models.BigIntegerField(blank=True, null=True)),
+                ("payment_id", models.BigIntegerField(blank=True, null=True)),
+                ("created_date", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "indexes": [models.Index(fields=["facility_id", "created_date"], name="hmis_invoice_ledger_idx")],
+            },
+        ),
+    ]
@@ -0,0 +1,90 @@
+"""Partial index for the revisit lookup on core's ``emr_tokenbooking``.
+
+The index is built with ``CREATE INDEX CONCURRENTLY`` so ``migrate`` does not
+block bookings while it runs. It belongs to a core table, so it is kept out of
+the migration state of both apps; Django records that this migration ran.
+"""
+
+import importlib
+import pkgutil
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+from care.emr.resources.scheduling.slot.spec import CANCELLED_STATUS_CHOICES
+
+INDEXED_FIELDS = {"patient", "token_slot", "charge_item", "status"}
+
+
+def _creates_indexed_field(operation):
+    if isinstance(operation, migrations.CreateModel):
+        return operation.name_lower == "tokenbooking"
+    return isinstance(operation, migrations.AddField) and operation.model_name_lower == "tokenbooking" and operation.name in INDEXED_FIELDS
+
+
+def emr_dependency():
+    """The ``emr`` migration that creates the last of the indexed columns.
+
+    Found in core's migration modules instead of pinned by name; it never
+    changes once written, so upgrading core does not move this dependency.
+    """
+    emr_migrations = importlib.import_module("care.emr.migrations")
+    latest = None
+    for module_info in pkgutil.iter_modules(emr_migrations.__path__):
+        name = module_info.name
+        if name.startswith(("_", "~")):
+            continue
+        migration = importlib.import_module(f"{emr_migrations.__name__}.{name}").Migration
+        if any(_creates_indexed_field(operation) for operation in migration.operations) and (latest is None or name > latest):
+            latest = name
+    return ("emr", latest)
+
+
+class AddCoreIndexConcurrently(AddIndexConcurrently):
+    """``AddIndexConcurrently`` on a model of another app, without touching migration state."""
+
+    def __init__(self, app_label, model_name, index):
+        self.core_app_label = app_label
+        super().__init__(model_name, index)
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(self.core_app_label, self.model_name)
+        connection = schema_editor.connection
+        # Databases migrated before this migration existed already have the index
+        with connection.cursor() as cursor:
+            existing = connection.introspection.get_constraints(cursor, model._meta.db_table)  # noqa: SLF001
+        if self.index.name not in existing:
+            super().database_forwards(self.core_app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        super().database_backwards(self.core_app_label, schema_editor, from_state, to_state)
+
+    def deconstruct(self):
+        name, args, kwargs = super().deconstruct()
+        return name, args, {"app_label": self.core_app_label, **kwargs}
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("care_state_hmis", "0007_automatedinvoiceledger"),
+        emr_dependency(),
+    ]
+
+    operations = [
+        # Revisit lookup: a patient's charged, non-cancelled bookings, joined
+        # to their slot for ordering.
+        AddCoreIndexConcurrently(
+            "emr",
+            "tokenbooking",
+            models.Index(
+                fields=["patient", "token_slot"],
+                name="hmis_booking_paid_patient_idx",
+                condition=models.Q(charge_item__isnull=False) & ~models.Q(status__in=CANCELLED_STATUS_CHOICES),
+            ),
+        ),
+    ]
@@ -0,0 +1,4 @@
+from .billing import *  # noqa
+from .demographics import *  # noqa
+from .reporting import *  # noqa
+from .revisit import *  # noqa
@@ -0,0 +1,91 @@
+from django.db import models
+
+__all__ = ["AutomatedInvoiceLedger", "InvoiceNumberBlock", "InvoicePaymentTotal", "PendingAppointmentInvoice"]
+
+
+class PendingAppointmentInvoice(models.Model):
+    """A booking waiting for its automated invoice to be created off the request path.
+
+    ``invoice_id`` is set together with the draft invoice and ``processed_at``
+    once it is issued and paid, so retries resume rather than duplicate.
+    """
+
+    booking_id = models.BigIntegerField(unique=True)
+    facility_id = models.BigIntegerField()
+    enqueued_at = models.DateTimeField(auto_now_add=True)
+    claimed_until = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    invoice_id = models.BigIntegerField(null=True, blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default="")
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["enqueued_at"],
+                name="hmis_pending_invoice_idx",
+                condition=models.Q(processed_at__isnull=True),
+            )
+        ]
+
+    def __str__(self):
+        return f"Booking {self.booking_id} ({'processed' if self.processed_at else 'pending'})"
+
+
+class InvoiceNumberBlock(models.Model):
+    """High-water mark of invoice sequence numbers reserved per facility.
+
+    Workers reserve contiguous ranges from here (see ``invoice_numbers``);
+    ``next_value`` is the first number not yet handed to any worker.
+    """
+
+    facility_id = models.BigIntegerField(unique=True)
+    next_value = models.BigIntegerField(default=1)
+
+    def __str__(self):
+        return f"Facility {self.facility_id}: next {self.next_value}"
+
+
+class InvoicePaymentTotal(models.Model):
+    """Running sums of active, completed PaymentReconciliations per invoice.
+
+    Kept up to date with F-expression deltas from the payment signals so the
+    auto-balance check reads one row; ``hmis_rebuild_invoice_payment_totals``
+    repairs drift.
+    """
+
+    invoice_id = models.BigIntegerField(unique=True)
+    total_payments = models.DecimalField(max_digits=20, decimal_places=6, default=0)
+    total_credit_notes = models.DecimalField(max_digits=20, decimal_places=6, default=0)
+
+    @property
+    def net_paid(self):
+        return self.total_payments - self.total_credit_notes
+
+    def __str__(self):
+        return f"Invoice {self.invoice_id}: {self.net_paid}"
+
+
+class AutomatedInvoiceLedger(models.Model):
+    """The automated invoice (and cash payment) produced for a booking.
+
+    A row is inserted in the same transaction as the invoice, and the unique
+    ``booking_external_id`` makes invoicing a booking insert-if-absent: a
+    retried request, a repeated ``post_save`` or a re-run queue worker finds
+    the row and stops. ``hmis_audit_automated_invoices`` checks it against
+    the invoices and payments it points at.
+    """
+
+    booking_external_id = models.UUIDField(unique=True)
+    booking_id = models.BigIntegerField()
+    facility_id = models.BigIntegerField()
+    charge_item_id = models.BigIntegerField(db_index=True)
+    invoice_id = models.BigIntegerField(null=True, blank=True)
+    payment_id = models.BigIntegerField(null=True, blank=True)
+    created_date = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["facility_id", "created_date"], name="hmis_invoice_ledger_idx")]
+
+    def __str__(self):
+        return f"Booking {self.booking_external_id}: invoice {self.invoice_id}"
@@ -0,0 +1,26 @@
+from django.db import models
+
+__all__ = ["PatientDemographics"]
+
+
+class PatientDemographics(models.Model):
+    """Indexed copy of a patient's ``patient_demographics`` extension values.
+
+    Kept in sync on patient save so reports can filter and group by caste and
+    religion without extracting them from the extension JSON. Rebuilt by
+    ``hmis_backfill_patient_demographics``.
+    """
+
+    patient_id = models.BigIntegerField(unique=True)
+    caste = models.CharField(max_length=32, blank=True, default="", db_index=True)
+    religion = models.CharField(max_length=32, blank=True, default="", db_index=True)
+    related_person = models.TextField(blank=True, default="")
+    modified_date = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["caste", "religion"], name="hmis_demographics_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.patient_id} {self.caste}/{self.religion}"
@@ -0,0 +1,37 @@
+from django.db import models
+
+__all__ = ["DailyFacilityStat"]
+
+
+class DailyFacilityStat(models.Model):
+    """One reporting figure for a facility on a (local) calendar day.
+
+    ``dimension`` is empty for the total and ``caste:<value>`` /
+    ``religion:<value>`` for demographics breakdowns of visit and admission
+    counts. Rows are derived data, refreshed per facility-day by
+    ``care_state_hmis.reporting`` and rebuilt by ``hmis_rebuild_daily_stats``.
+    """
+
+    class Metric(models.TextChoices):
+        opd_new = "opd_new"
+        opd_revisit = "opd_revisit"
+        ip_admissions = "ip_admissions"
+        revenue = "revenue"
+
+    facility_id = models.BigIntegerField()
+    date = models.DateField()
+    metric = models.CharField(max_length=32, choices=Metric.choices)
+    dimension = models.CharField(max_length=64, blank=True, default="")
+    value = models.DecimalField(max_digits=20, decimal_places=6, default=0)
+    modified_date = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["facility_id", "date", "metric", "dimension"],
+                name="hmis_daily_stat_unique",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.facility_id} {self.date} {self.metric}[{self.dimension}]={self.value}"
@@ -0,0 +1,42 @@
+from django.db import models
+
+__all__ = ["LastPaidVisit"]
+
+
+class LastPaidVisit(models.Model):
+    """Latest paid appointment of a patient within a revisit scope.
+
+    A row is kept for both scopes the revisit check can use — the facility
+    (healthcare service schedules only) and the individual schedule resource —
+    so toggling ``HMIS_INVOICE_ALLOW_REVISIT_ACROSS_DEPARTMENTS`` does not
+    require a rebuild. Core ids are stored as plain integers; this table is a
+    derived cache and is rebuilt by ``hmis_backfill_last_paid_visits``.
+
+    Visits charged with a revisit definition are stored too; ``last_paid_on``
+    falls back to the live scan when the row holds the asking schedule's own
+    revisit definition, exactly as the scan would skip it.
+    """
+
+    class Scope(models.TextChoices):
+        facility = "facility"
+        resource = "resource"
+
+    patient_id = models.BigIntegerField()
+    scope = models.CharField(max_length=16, choices=Scope.choices)
+    scope_id = models.BigIntegerField()
+    booking_id = models.BigIntegerField(db_index=True)
+    slot_start = models.DateTimeField()
+    paid_on = models.DateTimeField()
+    charge_item_definition_id = models.BigIntegerField(null=True, blank=True)
+    modified_date = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["patient_id", "scope", "scope_id"],
+                name="hmis_last_paid_visit_unique",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.patient_id} {self.scope}:{self.scope_id} @ {self.paid_on}"
@@ -0,0 +1,170 @@
+"""Incrementally maintained payment totals per invoice.
+
+Each PaymentReconciliation save contributes ``amount`` to its invoice's
+payments or credit notes while it is active and complete. On every save the
+previous contribution (captured in ``pre_save``) is diffed against the new one
+and only the delta is applied, so status transitions, amount edits and
+re-targeting to another invoice are all covered. The save and its delta are
+expected to share a transaction (the API's requests are atomic), so a
+concurrent rebuild either sees both or neither.
+
+Every change also marks the affected days for the revenue rollup
+(``reporting``).
+"""
+
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, F, Sum, When
+
+from care.emr.models.payment_reconciliation import PaymentReconciliation
+from care.emr.resources.payment_reconciliation.spec import (
+    PaymentReconciliationOutcomeOptions,
+    PaymentReconciliationStatusOptions,
+)
+from care_state_hmis import reporting
+from care_state_hmis.models import InvoicePaymentTotal
+
+PREVIOUS_STATE_ATTR = "_hmis_previous_payment_state"
+STATE_FIELDS = ("target_invoice_id", "amount", "is_credit_note", "status", "outcome", "facility_id", "payment_datetime")
+
+
+def _contribution(state):
+    """``(invoice_id, payments, credit_notes)`` a reconciliation state adds, or None."""
+    if not state or not state["target_invoice_id"]:
+        return None
+    if state["status"] != PaymentReconciliationStatusOptions.active.value:
+        return None
+    if state["outcome"] != PaymentReconciliationOutcomeOptions.complete.value:
+        return None
+    amount = state["amount"] or Decimal(0)
+    if state["is_credit_note"]:
+        return state["target_invoice_id"], Decimal(0), amount
+    return state["target_invoice_id"], amount, Decimal(0)
+
+
+def _state(instance):
+    return {field: getattr(instance, field) for field in STATE_FIELDS}
+
+
+def aggregate_invoice_totals(invoice_ids):
+    rows = (
+        PaymentReconciliation.objects.filter(
+            target_invoice_id__in=invoice_ids,
+            outcome=PaymentReconciliationOutcomeOptions.complete.value,
+            status=PaymentReconciliationStatusOptions.active.value,
+        )
+        .values("target_invoice_id")
+        .annotate(
+            total_payments=Sum(Case(When(is_credit_note=False, then="amount"))),
+            total_credit_notes=Sum(Case(When(is_credit_note=True, then="amount"))),
+        )
+    )
+    totals = {invoice_id: (Decimal(0), Decimal(0)) for invoice_id in invoice_ids}
+    for row in rows:
+        totals[row["target_invoice_id"]] = (row["total_payments"] or Decimal(0), row["total_credit_notes"] or Decimal(0))
+    return totals
+
+
+def rebuild_invoice_totals(invoice_id):
+    """Set the invoice's totals from its payment history, creating the row if needed.
+
+    The aggregate is taken while holding the row lock. A concurrent change
+    already applied to the row has committed by then and is in the aggregate;
+    one not yet applied waits for the lock and adds its delta on top. Two
+    first writers both insert-if-absent, so neither fails on the unique
+    ``invoice_id`` nor overwrites the other's count.
+    """
+    with transaction.atomic():
+        InvoicePaymentTotal.objects.bulk_create([InvoicePaymentTotal(invoice_id=invoice_id)], ignore_conflicts=True)
+        total = InvoicePaymentTotal.objects.select_for_update().get(invoice_id=invoice_id)
+        total.total_payments, total.total_credit_notes = aggregate_invoice_totals([invoice_id])[invoice_id]
+        total.save(update_fields=["total_payments", "total_credit_notes"])
+    return total
+
+
+def rebuild_invoice_totals_batch(invoice_ids, dry_run=False):
+    """``rebuild_invoice_totals`` for many invoices in one transaction.
+
+    Existing rows are locked (in id order) before the aggregate, so concurrent
+    deltas are ordered around the rebuild as in ``rebuild_invoice_totals``.
+    Missing rows are inserted-if-absent after it: a first writer racing the
+    insert waits for this transaction and then re-aggregates under the lock.
+    Returns ``(invoice_id, stored, expected)`` for every drifted invoice, with
+    ``stored`` None for a missing row; ``dry_run`` only reads.
+    """
+    with transaction.atomic():
+        stored = InvoicePaymentTotal.objects.filter(invoice_id__in=invoice_ids).order_by("invoice_id")
+        if not dry_run:
+            stored = stored.select_for_update()
+        stored = {row.invoice_id: row for row in stored}
+        drifted = []
+        for invoice_id, expected in aggregate_invoice_totals(invoice_ids).items():
+            row = stored.get(invoice_id)
+            current = (row.total_payments, row.total_credit_notes) if row else None
+            if current == expected:
+                continue
+            drifted.append((invoice_id, current, expected))
+            if row is None:
+                stored[invoice_id] = InvoicePaymentTotal(invoice_id=invoice_id)
+            stored[invoice_id].total_payments, stored[invoice_id].total_credit_notes = expected
+        if drifted and not dry_run:
+            rows = [stored[invoice_id] for invoice_id, _, _ in drifted]
+            InvoicePaymentTotal.objects.bulk_update([row for row in rows if row.pk], ["total_payments", "total_credit_notes"])
+            InvoicePaymentTotal.objects.bulk_create([row for row in rows if not row.pk], ignore_conflicts=True)
+    return drifted
+
+
+def _apply(invoice_id, payments, credit_notes):
+    if not payments and not credit_notes:
+        return
+    updated = InvoicePaymentTotal.objects.filter(invoice_id=invoice_id).update(
+        total_payments=F("total_payments") + payments,
+        total_credit_notes=F("total_credit_notes") + credit_notes,
+    )
+    if not updated:
+        # First time this invoice is seen: seed from the full history, which
+        # already includes the change being applied.
+        rebuild_invoice_totals(invoice_id)
+
+
+def remember_previous_state(instance):
+    if instance._state.adding:  # noqa: SLF001
+        return
+    previous = PaymentReconciliation.objects.filter(pk=instance.pk).values(*STATE_FIELDS).first()
+    setattr(instance, PREVIOUS_STATE_ATTR, previous)
+
+
+def record_payment_change(instance):
+    """Apply the delta between the reconciliation's previous and saved state."""
+    previous = instance.__dict__.pop(PREVIOUS_STATE_ATTR, None)
+    current = _state(instance)
+    if previous != current:
+        reporting.mark_payment_state(previous)
+        reporting.mark_payment_state(current)
+    before = _contribution(previous)
+    after = _contribution(current)
+    if before == after:
+        return
+    deltas = {}
+    if before:
+        deltas[before[0]] = (-before[1], -before[2])
+    if after:
+        payments, credit_notes = deltas.get(after[0], (Decimal(0), Decimal(0)))
+        deltas[after[0]] = (payments + after[1], credit_notes + after[2])
+    for invoice_id, (payments, credit_notes) in deltas.items():
+        _apply(invoice_id, payments, credit_notes)
+
+
+def record_payment_deleted(instance):
+    state = _state(instance)
+    reporting.mark_payment_state(state)
+    if before := _contribution(state):
+        _apply(before[0], -before[1], -before[2])
+
+
+def net_paid(invoice_id):
+    total = InvoicePaymentTotal.objects.filter(invoice_id=invoice_id).first()
+    if total is None:
+        total = rebuild_invoice_totals(invoice_id)
+    return total.net_paid
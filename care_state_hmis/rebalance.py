@@ -0,0 +1,68 @@
+"""Coalesced account rebalancing for payment signals.
+
+Every qualifying PaymentReconciliation save used to run a full account
+rebalance. ``schedule_account_rebalance`` instead collects dirty accounts per
+transaction and rebalances each once after commit. With
+``HMIS_ACCOUNT_REBALANCE_WINDOW_SECONDS`` set, a cache marker additionally
+limits each account to one rebalance per window across all workers, run by a
+delayed Celery task.
+"""
+
+from django.core.cache import cache
+
+from care.emr.resources.account.sync_items import rebalance_account_task
+from care_state_hmis.settings import plugin_settings
+from care_state_hmis.transactions import OnCommitBatch
+
+COUNTERS = ("requested", "coalesced", "dispatched")
+
+
+def _pending_key(account_id):
+    return f"hmis:rebalance:pending:{account_id}"
+
+
+def _incr(counter):
+    key = f"hmis:rebalance:{counter}"
+    cache.add(key, 0, timeout=None)
+    cache.incr(key)
+
+
+def rebalance_counters():
+    return {counter: cache.get(f"hmis:rebalance:{counter}", 0) for counter in COUNTERS}
+
+
+def clear_pending_marker(account_id):
+    cache.delete(_pending_key(account_id))
+
+
+def _dispatch(account_id):
+    window = plugin_settings.HMIS_ACCOUNT_REBALANCE_WINDOW_SECONDS
+    if window <= 0:
+        _incr("dispatched")
+        rebalance_account_task(account_id)
+        return
+    # The marker outlives the window so a lost task cannot block the account
+    # for longer than one extra window.
+    if not cache.add(_pending_key(account_id), 1, timeout=window * 2):
+        _incr("coalesced")
+        return
+    from care_state_hmis.tasks import debounced_rebalance_account
+
+    _incr("dispatched")
+    debounced_rebalance_account.apply_async(args=[account_id], countdown=window)
+
+
+def _flush(account_ids):
+    for account_id in account_ids:
+        _dispatch(account_id)
+
+
+_pending_accounts = OnCommitBatch(_flush)
+
+
+def schedule_account_rebalance(account_id):
+    if not account_id:
+        return
+    _incr("requested")
+    if not _pending_accounts.add(account_id):
+        _incr("coalesced")
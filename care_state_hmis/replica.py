@@ -0,0 +1,149 @@
+"""Read-replica routing for the plugin's read-heavy paths.
+
+With ``HMIS_REPLICA_DATABASE`` naming a ``DATABASES`` alias (and
+``ReplicaRouter`` in ``DATABASE_ROUTERS``), reads inside ``replica_reads()``
+go to that alias while it is within the staleness budget,
+``HMIS_REPLICA_MAX_LAG_SECONDS``; otherwise, and always for writes, they stay
+on the primary. The lag is measured at most every
+``HMIS_REPLICA_LAG_CHECK_SECONDS`` per process.
+
+Reads that decide a write on fresh data (the totals checked right before
+balancing an invoice, on-commit rollup refreshes) run under
+``primary_reads()``, which also wins over an enclosing ``replica_reads()``.
+Lazily consumed querysets (streamed exports) take ``read_alias()`` with
+``.using()`` instead of relying on the block still being active.
+"""
+
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+from care_state_hmis.settings import plugin_settings
+
+logger = logging.getLogger(__name__)
+
+ROUTER = "care_state_hmis.replica.ReplicaRouter"
+
+# 0 while the standby has replayed everything it received (an idle primary
+# does not make it stale); NULL when the alias is not a standby.
+POSTGRES_LAG_SQL = """
+SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END
+"""
+
+_read_alias = ContextVar("hmis_read_alias", default=None)
+
+_lag_lock = threading.Lock()
+_lag = (-math.inf, 0.0)  # (checked_at, seconds)
+
+
+def check_configuration():
+    alias = plugin_settings.HMIS_REPLICA_DATABASE
+    if not alias:
+        return
+    if alias not in settings.DATABASES:
+        raise ImproperlyConfigured(f"HMIS_REPLICA_DATABASE: '{alias}' is not in DATABASES")
+    if ROUTER not in settings.DATABASE_ROUTERS:
+        raise ImproperlyConfigured(f"HMIS_REPLICA_DATABASE needs '{ROUTER}' in DATABASE_ROUTERS")
+
+
+def measure_lag(alias):
+    """Seconds ``alias`` is behind the primary; infinite when it cannot be reached."""
+    connection = connections[alias]
+    if connection.vendor != "postgresql":
+        # e.g. a second SQLite alias on the same file for local testing
+        return 0.0
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(POSTGRES_LAG_SQL)
+            (lag,) = cursor.fetchone()
+    except DatabaseError:
+        logger.warning("Replica %s is unavailable, reading from the primary", alias, exc_info=True)
+        return math.inf
+    return float(lag or 0)
+
+
+def replica_lag(alias):
+    global _lag  # noqa: PLW0603
+    now = time.monotonic()
+    checked_at, lag = _lag
+    if now - checked_at < plugin_settings.HMIS_REPLICA_LAG_CHECK_SECONDS:
+        return lag
+    with _lag_lock:
+        checked_at, lag = _lag
+        if now - checked_at >= plugin_settings.HMIS_REPLICA_LAG_CHECK_SECONDS:
+            lag = measure_lag(alias)
+            _lag = (time.monotonic(), lag)
+    return lag
+
+
+def read_alias(max_lag=None):
+    """The replica if enabled and within ``max_lag`` seconds (default: the budget), else the primary."""
+    alias = plugin_settings.HMIS_REPLICA_DATABASE
+    if not alias or _read_alias.get() == DEFAULT_DB_ALIAS:
+        return DEFAULT_DB_ALIAS
+    budget = plugin_settings.HMIS_REPLICA_MAX_LAG_SECONDS if max_lag is None else max_lag
+    if replica_lag(alias) > budget:
+        return DEFAULT_DB_ALIAS
+    return alias
+
+
+async def aread_alias(max_lag=None):
+    """``read_alias`` for async callers; measuring the lag needs a thread."""
+    if not plugin_settings.HMIS_REPLICA_DATABASE:
+        return DEFAULT_DB_ALIAS
+    return await sync_to_async(read_alias)(max_lag)
+
+
+@contextmanager
+def replica_reads(max_lag=None):
+    """Route reads in the block to the replica while it is within the staleness budget."""
+    token = _read_alias.set(read_alias(max_lag))
+    try:
+        yield _read_alias.get()
+    finally:
+        _read_alias.reset(token)
+
+
+@contextmanager
+def primary_reads():
+    """Route reads in the block to the primary, even inside ``replica_reads()``."""
+    token = _read_alias.set(DEFAULT_DB_ALIAS)
+    try:
+        yield DEFAULT_DB_ALIAS
+    finally:
+        _read_alias.reset(token)
+
+
+class ReplicaRouter:
+    """Applies ``replica_reads()`` / ``primary_reads()``; defers to later routers otherwise."""
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        # Instances read from the replica are saved to the primary
+        instance = hints.get("instance")
+        alias = plugin_settings.HMIS_REPLICA_DATABASE
+        if alias and instance is not None and instance._state.db == alias:  # noqa: SLF001
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, plugin_settings.HMIS_REPLICA_DATABASE}
+        if obj1._state.db in aliases and obj2._state.db in aliases:  # noqa: SLF001
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if plugin_settings.HMIS_REPLICA_DATABASE and db == plugin_settings.HMIS_REPLICA_DATABASE:
+            return False
+        return None
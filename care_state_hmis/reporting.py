@@ -0,0 +1,315 @@
+"""Daily per-facility rollups for state HMIS reports.
+
+Figures are kept in ``DailyFacilityStat`` at facility-day granularity:
+
+- ``opd_new`` / ``opd_revisit``: non-cancelled bookings by slot day, split by
+  the visit decision recorded on their charge item — including free revisits,
+  whose item is kept not billable. Items without a recorded decision (imported,
+  or linked before decisions were recorded) are revisits when charged from the
+  schedule's revisit definition. Bookings without a charge item are not counted.
+- ``ip_admissions``: inpatient encounters by creation day, which is also the
+  month encoded in their Hospital Identifier.
+- ``revenue``: active, complete payments less credit notes by payment day.
+
+Visit and admission counts are also broken down by the patient's indexed
+caste and religion (``PatientDemographics``), as stored when the day is
+recomputed; rebuild the range after bulk demographics corrections.
+
+Signals mark the facility-days they touch and each one is recomputed from the
+source rows once, after commit, so the rollup never drifts on edits,
+cancellations or rollbacks. ``rebuild`` recomputes arbitrary date ranges.
+
+A facility-day recompute scans all of that day's bookings, so it is kept off
+the request path: a cache marker limits each facility-day to one refresh per
+``HMIS_DAILY_STATS_REFRESH_WINDOW_SECONDS`` across all workers, run by a
+delayed Celery task. The committing request only resolves the days it touched
+(one query per transaction for bookings) and sets the markers. A window of 0
+refreshes inline after commit, for small deployments and tests.
+
+Rows are upserted on ``hmis_daily_stat_unique`` rather than deleted and
+re-inserted, and a refresh holds a transaction-level advisory lock on its
+facility-day while it reads and writes, so concurrent refreshes of the same
+day neither collide nor let an older snapshot overwrite a newer one.
+"""
+
+import logging
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Case, Count, DecimalField, F, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from care.emr.models.encounter import Encounter
+from care.emr.models.payment_reconciliation import PaymentReconciliation
+from care.emr.models.scheduling.booking import TokenBooking
+from care.emr.resources.payment_reconciliation.spec import (
+    PaymentReconciliationOutcomeOptions,
+    PaymentReconciliationStatusOptions,
+)
+from care.emr.resources.scheduling.slot.spec import CANCELLED_STATUS_CHOICES
+from care_state_hmis import replica, revisit
+from care_state_hmis.demographics import annotate_demographics
+from care_state_hmis.models import DailyFacilityStat
+from care_state_hmis.settings import plugin_settings
+from care_state_hmis.transactions import OnCommitBatch
+
+logger = logging.getLogger(__name__)
+
+Metric = DailyFacilityStat.Metric
+
+# Encounter classes counted as admissions
+INPATIENT_CLASSES = ("imp",)
+
+OPD = "opd"
+IP = "ip"
+REVENUE = "revenue"
+GROUP_METRICS = {
+    OPD: [Metric.opd_new.value, Metric.opd_revisit.value],
+    IP: [Metric.ip_admissions.value],
+    REVENUE: [Metric.revenue.value],
+}
+
+BOOKING_FACILITY = "token_slot__availability__schedule__resource__facility_id"
+VISIT_DECISION = f"charge_item__meta__{revisit.VISIT_KEY}"
+
+STAT_KEY_FIELDS = ["facility_id", "date", "metric", "dimension"]
+
+# Serializes refreshes of one group's facility-day; released at commit
+REFRESH_LOCK_SQL = "SELECT pg_advisory_xact_lock(hashtext(%s))"
+
+
+def _bounds(date_from, date_to):
+    """Aware datetimes covering the local days ``date_from`` to ``date_to`` inclusive."""
+    start = timezone.make_aware(datetime.combine(date_from, time.min))
+    end = timezone.make_aware(datetime.combine(date_to + timedelta(days=1), time.min))
+    return start, end
+
+
+def _add_counts(totals, rows, metric_of):
+    for row in rows:
+        metric = metric_of(row)
+        if metric is None:
+            continue
+        key = (row["facility"], row["day"], metric)
+        totals[(*key, "")] += row["count"]
+        if row["hmis_caste"]:
+            totals[(*key, f"caste:{row['hmis_caste']}")] += row["count"]
+        if row["hmis_religion"]:
+            totals[(*key, f"religion:{row['hmis_religion']}")] += row["count"]
+
+
+def _opd_totals(totals, facility_ids, start, end):
+    bookings = TokenBooking.objects.filter(
+        token_slot__start_datetime__gte=start,
+        token_slot__start_datetime__lt=end,
+        charge_item__isnull=False,
+    ).exclude(status__in=CANCELLED_STATUS_CHOICES)
+    if facility_ids is not None:
+        bookings = bookings.filter(**{f"{BOOKING_FACILITY}__in": facility_ids})
+    rows = (
+        annotate_demographics(bookings, "patient_id")
+        .annotate(
+            facility=F(BOOKING_FACILITY),
+            day=TruncDate("token_slot__start_datetime"),
+            is_revisit=Case(
+                When(**{f"{VISIT_DECISION}__in": [revisit.REVISIT, revisit.FREE_REVISIT]}, then=Value(True)),
+                When(**{VISIT_DECISION: revisit.NEW_VISIT}, then=Value(False)),
+                When(
+                    charge_item__charge_item_definition_id=F("token_slot__availability__schedule__revisit_charge_item_definition_id"),
+                    then=Value(True),
+                ),
+                default=Value(False),
+            ),
+        )
+        .values("facility", "day", "is_revisit", "hmis_caste", "hmis_religion")
+        .annotate(count=Count("id"))
+        .order_by()
+    )
+    _add_counts(totals, rows, lambda row: Metric.opd_revisit.value if row["is_revisit"] else Metric.opd_new.value)
+
+
+def _ip_totals(totals, facility_ids, start, end):
+    encounters = Encounter.objects.filter(
+        encounter_class__in=INPATIENT_CLASSES,
+        created_date__gte=start,
+        created_date__lt=end,
+    )
+    if facility_ids is not None:
+        encounters = encounters.filter(facility_id__in=facility_ids)
+    rows = (
+        annotate_demographics(encounters, "patient_id")
+        .annotate(facility=F("facility_id"), day=TruncDate("created_date"))
+        .values("facility", "day", "hmis_caste", "hmis_religion")
+        .annotate(count=Count("id"))
+        .order_by()
+    )
+    _add_counts(totals, rows, lambda row: Metric.ip_admissions.value)
+
+
+def _revenue_totals(totals, facility_ids, start, end):
+    payments = PaymentReconciliation.objects.filter(
+        payment_datetime__gte=start,
+        payment_datetime__lt=end,
+        status=PaymentReconciliationStatusOptions.active.value,
+        outcome=PaymentReconciliationOutcomeOptions.complete.value,
+    )
+    if facility_ids is not None:
+        payments = payments.filter(facility_id__in=facility_ids)
+    rows = (
+        payments.annotate(facility=F("facility_id"), day=TruncDate("payment_datetime"))
+        .values("facility", "day")
+        .annotate(
+            net=Sum(
+                Case(
+                    When(is_credit_note=True, then=-F("amount")),
+                    default=F("amount"),
+                    output_field=DecimalField(max_digits=20, decimal_places=6),
+                )
+            )
+        )
+        .order_by()
+    )
+    for row in rows:
+        totals[(row["facility"], row["day"], Metric.revenue.value, "")] += row["net"] or Decimal(0)
+
+
+GROUP_COMPUTE = {OPD: _opd_totals, IP: _ip_totals, REVENUE: _revenue_totals}
+
+
+def compute(groups, date_from, date_to, facility_ids=None):
+    """``{(facility_id, date, metric, dimension): value}`` for ``groups`` over the range."""
+    start, end = _bounds(date_from, date_to)
+    totals = defaultdict(Decimal)
+    for group in groups:
+        GROUP_COMPUTE[group](totals, facility_ids, start, end)
+    return totals
+
+
+def _store(groups, date_from, date_to, facility_ids, totals):
+    """Upsert ``totals`` and drop the range's rows that no longer have a value."""
+    metrics = [metric for group in groups for metric in GROUP_METRICS[group]]
+    rows = [
+        DailyFacilityStat(facility_id=facility_id, date=day, metric=metric, dimension=dimension, value=value)
+        for (facility_id, day, metric, dimension), value in totals.items()
+        if value
+    ]
+    kept = {(row.facility_id, row.date, row.metric, row.dimension) for row in rows}
+    existing = DailyFacilityStat.objects.filter(date__gte=date_from, date__lte=date_to, metric__in=metrics)
+    if facility_ids is not None:
+        existing = existing.filter(facility_id__in=facility_ids)
+    with transaction.atomic():
+        DailyFacilityStat.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=STAT_KEY_FIELDS,
+            update_fields=["value", "modified_date"],
+        )
+        stale = [pk for pk, *key in existing.values_list("id", *STAT_KEY_FIELDS) if tuple(key) not in kept]
+        DailyFacilityStat.objects.filter(id__in=stale).delete()
+
+
+def rebuild(date_from, date_to, facility_ids=None, groups=tuple(GROUP_METRICS)):
+    """Recompute every rollup row in the range; returns the number of rows written."""
+    totals = compute(groups, date_from, date_to, facility_ids)
+    _store(groups, date_from, date_to, facility_ids, totals)
+    return sum(1 for value in totals.values() if value)
+
+
+def refresh_day(group, facility_id, day):
+    """Recompute ``group`` for one facility-day under its advisory lock.
+
+    The lock is taken before the source rows are read, so a refresh that
+    waited on another reads what that one committed.
+    """
+    # The rows that triggered the refresh were only just committed
+    with replica.primary_reads(), transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(REFRESH_LOCK_SQL, [f"hmis:daily_stat:{group}:{facility_id}:{day.isoformat()}"])
+        rebuild(day, day, [facility_id], [group])
+
+
+def _pending_key(group, facility_id, day):
+    return f"hmis:daily_stat:pending:{group}:{facility_id}:{day.isoformat()}"
+
+
+def clear_pending_marker(group, facility_id, day):
+    cache.delete(_pending_key(group, facility_id, day))
+
+
+def _dispatch(group, facility_id, day):
+    window = plugin_settings.HMIS_DAILY_STATS_REFRESH_WINDOW_SECONDS
+    if window <= 0:
+        try:
+            refresh_day(group, facility_id, day)
+        except DatabaseError:
+            # The save that marked the day has committed; hmis_rebuild_daily_stats repairs it
+            logger.exception("Could not refresh %s rollup of facility %s on %s", group, facility_id, day)
+        return
+    # The marker outlives the window so a lost task cannot hold the day back
+    # for longer than one extra window.
+    if not cache.add(_pending_key(group, facility_id, day), 1, timeout=window * 2):
+        return
+    from care_state_hmis.tasks import refresh_daily_stats
+
+    refresh_daily_stats.apply_async(args=[group, facility_id, day.isoformat()], countdown=window)
+
+
+def _refresh(pending):
+    for group, facility_id, day in pending:
+        _dispatch(group, facility_id, day)
+
+
+_dirty = OnCommitBatch(_refresh)
+
+
+def mark_dirty(group, facility_id, moment):
+    """Recompute ``group`` for the facility on ``moment``'s local day after commit."""
+    if facility_id is None or moment is None:
+        return
+    _dirty.add((group, facility_id, timezone.localdate(moment)))
+
+
+def _refresh_bookings(booking_ids):
+    # One query for every booking saved in the transaction
+    with replica.primary_reads():
+        rows = TokenBooking.objects.filter(id__in=list(booking_ids)).values_list(BOOKING_FACILITY, "token_slot__start_datetime")
+        _refresh({(OPD, facility_id, timezone.localdate(start)) for facility_id, start in rows if facility_id is not None and start})
+
+
+_dirty_bookings = OnCommitBatch(_refresh_bookings)
+
+
+def mark_booking(booking_id):
+    """Recompute OPD for the booking's facility-day after commit."""
+    _dirty_bookings.add(booking_id)
+
+
+def is_inpatient(encounter_class):
+    return encounter_class in INPATIENT_CLASSES
+
+
+def mark_payment_state(state):
+    if state:
+        mark_dirty(REVENUE, state["facility_id"], state["payment_datetime"])
+
+
+def monthly_totals(facility_id, year, month, metrics=None):
+    """Sum the daily rows of one facility-month: ``{(metric, dimension): value}``."""
+    rows = DailyFacilityStat.objects.filter(facility_id=facility_id, date__year=year, date__month=month)
+    if metrics:
+        rows = rows.filter(metric__in=metrics)
+    return {
+        (row["metric"], row["dimension"]): row["value"]
+        for row in rows.values("metric", "dimension").annotate(value=Sum("value")).order_by()
+    }
+
+
+def daily_rows(facility_id, date_from, date_to, metrics=None):
+    rows = DailyFacilityStat.objects.filter(facility_id=facility_id, date__gte=date_from, date__lte=date_to)
+    if metrics:
+        rows = rows.filter(metric__in=metrics)
+    return rows.order_by("date", "metric", "dimension")
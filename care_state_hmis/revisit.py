@@ -0,0 +1,349 @@
+"""Revisit-window lookups backed by the ``LastPaidVisit`` table.
+
+``last_paid_on`` answers "when was this patient's last paid, non-revisit visit
+in this scope" for ``handle_appointment_invoice_payment``. With
+``HMIS_REVISIT_USE_LAST_PAID_VISIT`` enabled it is a unique-key lookup; the
+live scan over TokenBooking is kept as the fallback and as the source of truth
+for the backfill and consistency commands.
+"""
+
+from django.db.models import F
+
+from care.emr.models.scheduling.booking import TokenBooking
+from care.emr.models.scheduling.schedule import Schedule
+from care.emr.resources.charge_item.apply_charge_item_definition import (
+    apply_charge_item_definition,
+)
+from care.emr.resources.charge_item.spec import ChargeItemResourceOptions, ChargeItemStatusOptions
+from care.emr.resources.scheduling.schedule.spec import SchedulableResourceTypeOptions
+from care.emr.resources.scheduling.slot.spec import CANCELLED_STATUS_CHOICES
+from care_state_hmis import replica
+from care_state_hmis.models import LastPaidVisit
+from care_state_hmis.settings import plugin_settings
+
+HEALTHCARE_SERVICE = SchedulableResourceTypeOptions.healthcare_service.value
+
+# ChargeItem.meta key recording the new-vs-revisit decision made for it
+VISIT_KEY = "hmis_visit"
+NEW_VISIT = "new"
+REVISIT = "revisit"
+# Revisit on a schedule without a revisit definition: its default item is
+# kept, not billable, as the record of the visit
+FREE_REVISIT = "free_revisit"
+
+# Fields of a default appointment charge item kept when it is turned into a
+# revisit item in place; everything else comes from the revisit definition.
+KEPT_CHARGE_ITEM_FIELDS = {
+    "id",
+    "external_id",
+    "facility",
+    "patient",
+    "account",
+    "encounter",
+    "service_resource",
+    "service_resource_id",
+    "paid_invoice",
+    "meta",
+    "created_by",
+    "updated_by",
+    "created_date",
+    "modified_date",
+}
+
+
+def revisit_scope(schedule):
+    """Return the ``(scope, scope_id)`` revisits of ``schedule`` are counted in."""
+    if plugin_settings.HMIS_INVOICE_ALLOW_REVISIT_ACROSS_DEPARTMENTS:
+        return LastPaidVisit.Scope.facility.value, schedule.resource.facility_id
+    return LastPaidVisit.Scope.resource.value, schedule.resource_id
+
+
+def _scope_filters(scope, scope_id):
+    if scope == LastPaidVisit.Scope.facility.value:
+        return {
+            "token_slot__availability__schedule__resource__facility_id": scope_id,
+            "token_slot__availability__schedule__resource__resource_type": HEALTHCARE_SERVICE,
+        }
+    return {"token_slot__availability__schedule__resource_id": scope_id}
+
+
+def _schedule_scope_filters(scope, scope_id):
+    prefix = "token_slot__availability__schedule__"
+    return {name.removeprefix(prefix): value for name, value in _scope_filters(scope, scope_id).items()}
+
+
+def _paid_bookings():
+    # The two excludes are kept separate so the cancelled-status predicate
+    # matches ``hmis_booking_paid_patient_idx`` (migration 0008).
+    return TokenBooking.objects.exclude(status__in=CANCELLED_STATUS_CHOICES).filter(
+        charge_item__isnull=False,
+        charge_item__status=ChargeItemStatusOptions.paid.value,
+    )
+
+
+def _last_paid_on_query(patient_id, scope, scope_id, before, revisit_definition_id):
+    return (
+        _paid_bookings()
+        .exclude(charge_item__charge_item_definition_id=revisit_definition_id)
+        .filter(
+            patient_id=patient_id,
+            token_slot__start_datetime__lte=before,
+            **_scope_filters(scope, scope_id),
+        )
+        .order_by("-token_slot__start_datetime")
+        .values_list("charge_item__paid_on", flat=True)
+    )
+
+
+def live_last_paid_on(patient_id, scope, scope_id, before, revisit_definition_id):
+    # History scan; a visit paid within the replica's staleness budget may be missed
+    with replica.replica_reads():
+        return _last_paid_on_query(patient_id, scope, scope_id, before, revisit_definition_id).first()
+
+
+def _stored_visit_answers(visit, before, revisit_definition_id):
+    # The table tracks the latest paid visit overall; fall back to the scan
+    # when there is no row yet (e.g. before the backfill has reached the
+    # patient), when the booking is back-dated before it, or when the stored
+    # visit was charged with this schedule's revisit definition.
+    return visit is not None and visit.slot_start <= before and visit.charge_item_definition_id != revisit_definition_id
+
+
+def last_paid_on(patient_id, policy, before):
+    """Last paid visit of ``patient_id`` in the scope of ``policy`` (a ``RevisitPolicy``)."""
+    scope, scope_id, revisit_definition_id = policy.scope, policy.scope_id, policy.revisit_definition_id
+    if plugin_settings.HMIS_REVISIT_USE_LAST_PAID_VISIT:
+        visit = LastPaidVisit.objects.filter(patient_id=patient_id, scope=scope, scope_id=scope_id).first()
+        if _stored_visit_answers(visit, before, revisit_definition_id):
+            return visit.paid_on
+    return live_last_paid_on(patient_id, scope, scope_id, before, revisit_definition_id)
+
+
+async def alast_paid_on(patient_id, policy, before):
+    """``last_paid_on`` with the async ORM."""
+    scope, scope_id, revisit_definition_id = policy.scope, policy.scope_id, policy.revisit_definition_id
+    if plugin_settings.HMIS_REVISIT_USE_LAST_PAID_VISIT:
+        visit = await LastPaidVisit.objects.filter(patient_id=patient_id, scope=scope, scope_id=scope_id).afirst()
+        if _stored_visit_answers(visit, before, revisit_definition_id):
+            return visit.paid_on
+    query = _last_paid_on_query(patient_id, scope, scope_id, before, revisit_definition_id)
+    return await query.using(await replica.aread_alias()).afirst()
+
+
+def is_revisit(schedule, last_paid_on, slot_start):
+    """Whether a booking at ``slot_start`` falls in the revisit window of
+    ``schedule`` (a Schedule or its ``RevisitPolicy``).
+    """
+    if not schedule.revisit_allowed_days or last_paid_on is None:
+        return False
+    return abs((last_paid_on - slot_start).days) <= schedule.revisit_allowed_days
+
+
+def build_revisit_charge_item(booking, revisit_charge_item_definition, facility):
+    """Unsaved charge item replacing the default one on a revisit booking."""
+    charge_item = apply_charge_item_definition(
+        revisit_charge_item_definition,
+        booking.patient,
+        facility,
+        quantity=1,
+    )
+    charge_item.service_resource = ChargeItemResourceOptions.appointment.value
+    charge_item.service_resource_id = str(booking.external_id)
+    charge_item.created_by_id = booking.created_by_id
+    charge_item.updated_by_id = booking.updated_by_id
+    charge_item.meta = {
+        "automated": True,
+        VISIT_KEY: REVISIT,
+    }
+    return charge_item
+
+
+def apply_revisit_in_place(charge_item, booking, revisit_charge_item_definition, facility):
+    """Turn an unsaved default appointment ``charge_item`` into the revisit item,
+    so it is written once instead of being inserted, deleted and replaced.
+    """
+    revisit_item = build_revisit_charge_item(booking, revisit_charge_item_definition, facility)
+    for field in charge_item._meta.concrete_fields:  # noqa: SLF001
+        if field.name not in KEPT_CHARGE_ITEM_FIELDS:
+            setattr(charge_item, field.attname, getattr(revisit_item, field.attname))
+    charge_item.meta = {**(charge_item.meta or {}), **revisit_item.meta}
+
+
+def apply_free_revisit_in_place(charge_item):
+    """Keep the default item of a free revisit as a record of the visit that is never invoiced."""
+    charge_item.status = ChargeItemStatusOptions.not_billable.value
+
+
+def visit_decision(charge_item):
+    """The decision recorded on ``charge_item`` by ``decide_appointment_charge_item``, if any."""
+    return (charge_item.meta or {}).get(VISIT_KEY)
+
+
+def _visit_rows(bookings):
+    """Yield ``(key, values)`` for both scopes of each booking row."""
+    for booking in bookings:
+        values = {
+            "booking_id": booking["id"],
+            "slot_start": booking["slot_start"],
+            "paid_on": booking["paid_on"],
+            "charge_item_definition_id": booking["definition_id"],
+        }
+        patient_id = booking["patient_id"]
+        yield (patient_id, LastPaidVisit.Scope.resource.value, booking["schedule_resource_id"]), values
+        if booking["schedule_resource_type"] == HEALTHCARE_SERVICE:
+            yield (patient_id, LastPaidVisit.Scope.facility.value, booking["schedule_facility_id"]), values
+
+
+def _history_values(queryset):
+    return (
+        queryset.annotate(
+            slot_start=F("token_slot__start_datetime"),
+            paid_on=F("charge_item__paid_on"),
+            definition_id=F("charge_item__charge_item_definition_id"),
+            schedule_resource_id=F("token_slot__availability__schedule__resource_id"),
+            schedule_resource_type=F("token_slot__availability__schedule__resource__resource_type"),
+            schedule_facility_id=F("token_slot__availability__schedule__resource__facility_id"),
+        )
+        .filter(paid_on__isnull=False)
+        .values(
+            "id",
+            "patient_id",
+            "slot_start",
+            "paid_on",
+            "definition_id",
+            "schedule_resource_id",
+            "schedule_resource_type",
+            "schedule_facility_id",
+        )
+    )
+
+
+def paid_history(patient_ids):
+    """Paid, non-cancelled booking rows of ``patient_ids``, as used by ``pick_last_paid_on``."""
+    return list(_history_values(_paid_bookings().filter(patient_id__in=patient_ids)))
+
+
+def pick_last_paid_on(history, patient_id, scope, scope_id, before, revisit_definition_id):
+    """In-memory equivalent of ``live_last_paid_on`` over ``paid_history`` rows."""
+    if scope == LastPaidVisit.Scope.facility.value:
+
+        def in_scope(row):
+            return row["schedule_facility_id"] == scope_id and row["schedule_resource_type"] == HEALTHCARE_SERVICE
+
+    else:
+
+        def in_scope(row):
+            return row["schedule_resource_id"] == scope_id
+
+    latest = None
+    for row in history:
+        if (
+            row["patient_id"] == patient_id
+            and row["slot_start"] <= before
+            and row["definition_id"] != revisit_definition_id
+            and in_scope(row)
+            and (latest is None or row["slot_start"] > latest["slot_start"])
+        ):
+            latest = row
+    return latest["paid_on"] if latest else None
+
+
+def compute_last_paid_visits(patient_ids):
+    """Compute the expected table contents for ``patient_ids`` from live history."""
+    latest = {}
+    bookings = _history_values(_paid_bookings().filter(patient_id__in=patient_ids))
+    for key, values in _visit_rows(bookings):
+        current = latest.get(key)
+        if current is None or values["slot_start"] >= current["slot_start"]:
+            latest[key] = values
+    return latest
+
+
+def _upsert(key, values):
+    patient_id, scope, scope_id = key
+    updated = LastPaidVisit.objects.filter(
+        patient_id=patient_id,
+        scope=scope,
+        scope_id=scope_id,
+        slot_start__lte=values["slot_start"],
+    ).update(**values)
+    if not updated:
+        LastPaidVisit.objects.get_or_create(patient_id=patient_id, scope=scope, scope_id=scope_id, defaults=values)
+
+
+def record_paid_visits(charge_item_ids):
+    """Advance the table for bookings whose charge items were just marked paid."""
+    bookings = _history_values(_paid_bookings().filter(charge_item_id__in=charge_item_ids))
+    for key, values in _visit_rows(bookings):
+        _upsert(key, values)
+
+
+def forget_booking(booking_id):
+    """Recompute every row that points at a booking that is no longer a visit."""
+    stale = list(LastPaidVisit.objects.filter(booking_id=booking_id).values_list("patient_id", "scope", "scope_id"))
+    if not stale:
+        return
+    expected = compute_last_paid_visits({patient_id for patient_id, _, _ in stale})
+    for key in stale:
+        patient_id, scope, scope_id = key
+        if key in expected:
+            LastPaidVisit.objects.filter(patient_id=patient_id, scope=scope, scope_id=scope_id).update(**expected[key])
+        else:
+            LastPaidVisit.objects.filter(patient_id=patient_id, scope=scope, scope_id=scope_id).delete()
+
+
+def iter_patient_batches(batch_size):
+    """Yield lists of patient ids with paid history, in keyset-paginated batches."""
+    last_id = 0
+    while True:
+        batch = list(
+            _paid_bookings()
+            .filter(patient_id__gt=last_id)
+            .order_by("patient_id")
+            .values_list("patient_id", flat=True)
+            .distinct()[:batch_size]
+        )
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1]
+
+
+def iter_orphaned_patient_batches(batch_size):
+    """Yield batches of patients that have rows but no paid history left."""
+    last_id = 0
+    while True:
+        batch = list(
+            LastPaidVisit.objects.filter(patient_id__gt=last_id)
+            .order_by("patient_id")
+            .values_list("patient_id", flat=True)
+            .distinct()[:batch_size]
+        )
+        if not batch:
+            return
+        with_history = set(_paid_bookings().filter(patient_id__in=batch).values_list("patient_id", flat=True))
+        orphaned = [patient_id for patient_id in batch if patient_id not in with_history]
+        if orphaned:
+            yield orphaned
+        last_id = batch[-1]
+
+
+def scope_revisit_definition_ids(scope, scope_id):
+    """Revisit definitions of the schedules counted in a scope; ``last_paid_on`` may be asked with any of them."""
+    schedules = Schedule.objects.filter(**_schedule_scope_filters(scope, scope_id))
+    return set(schedules.values_list("revisit_charge_item_definition_id", flat=True))
+
+
+def stored_last_paid_visits(patient_ids):
+    return {
+        (row["patient_id"], row["scope"], row["scope_id"]): row
+        for row in LastPaidVisit.objects.filter(patient_id__in=patient_ids).values(
+            "patient_id",
+            "scope",
+            "scope_id",
+            "booking_id",
+            "slot_start",
+            "paid_on",
+            "charge_item_definition_id",
+        )
+    }
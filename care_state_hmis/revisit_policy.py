@@ -0,0 +1,140 @@
+"""Cached per-schedule revisit policy.
+
+Every booking needs its schedule's revisit window, revisit charge item
+definition and revisit scope. Schedules change rarely, so ``policy_for``
+serves a ``RevisitPolicy`` from an in-process dict, checked against a
+per-schedule version in the shared cache at most every
+``HMIS_REVISIT_POLICY_LOCAL_SECONDS``, and falls back to a shared-cache copy
+before reading the database.
+
+A policy holds ids and scalars only: the revisit ChargeItemDefinition is
+loaded (``revisit_definition``) when a revisit item is priced, so edits to a
+definition apply to the next booking without invalidating anything. Saving a
+Schedule or its resource bumps the version after commit; other processes pick
+the change up on their next version check.
+"""
+
+import threading
+import time
+from dataclasses import dataclass
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import transaction
+
+from care.emr.models.charge_item_definition import ChargeItemDefinition
+from care.emr.models.scheduling.schedule import Schedule
+from care_state_hmis.revisit import revisit_scope
+from care_state_hmis.settings import plugin_settings
+
+
+@dataclass(frozen=True)
+class RevisitPolicy:
+    schedule_id: int
+    revisit_allowed_days: int | None
+    revisit_definition_id: int | None
+    scope: str
+    scope_id: int
+
+
+@dataclass
+class _Entry:
+    version: int
+    across: bool
+    checked_at: float
+    policy: RevisitPolicy
+
+
+_local = {}
+_lock = threading.Lock()
+
+
+def from_schedule(schedule):
+    """Build the policy from a schedule with its resource loaded."""
+    scope, scope_id = revisit_scope(schedule)
+    return RevisitPolicy(
+        schedule_id=schedule.id,
+        revisit_allowed_days=schedule.revisit_allowed_days,
+        revisit_definition_id=schedule.revisit_charge_item_definition_id,
+        scope=scope,
+        scope_id=scope_id,
+    )
+
+
+def _load(schedule_id):
+    return from_schedule(Schedule.objects.select_related("resource").get(id=schedule_id))
+
+
+def revisit_definition(policy):
+    """The policy's revisit ChargeItemDefinition, read fresh for pricing."""
+    return ChargeItemDefinition.objects.get(id=policy.revisit_definition_id)
+
+
+def _version_key(schedule_id):
+    return f"hmis:revisit_policy:version:{schedule_id}"
+
+
+def _policy_key(schedule_id, version, across):
+    # v2: policies hold the definition id instead of the definition
+    return f"hmis:revisit_policy:v2:{schedule_id}:{version}:{int(across)}"
+
+
+def _shared_version(schedule_id):
+    key = _version_key(schedule_id)
+    cache.add(key, 1, timeout=None)
+    return cache.get(key) or 1
+
+
+def policy_for(schedule_id):
+    """The revisit policy of ``schedule_id``."""
+    ttl = plugin_settings.HMIS_REVISIT_POLICY_CACHE_SECONDS
+    if not ttl:
+        return _load(schedule_id)
+    across = plugin_settings.HMIS_INVOICE_ALLOW_REVISIT_ACROSS_DEPARTMENTS
+    now = time.monotonic()
+    entry = _local.get(schedule_id)
+    if entry and entry.across == across and now - entry.checked_at < plugin_settings.HMIS_REVISIT_POLICY_LOCAL_SECONDS:
+        return entry.policy
+
+    version = _shared_version(schedule_id)
+    if entry and entry.across == across and entry.version == version:
+        entry.checked_at = now
+        return entry.policy
+
+    key = _policy_key(schedule_id, version, across)
+    policy = cache.get(key)
+    if policy is None:
+        policy = _load(schedule_id)
+        cache.set(key, policy, timeout=ttl)
+    with _lock:
+        _local[schedule_id] = _Entry(version, across, now, policy)
+    return policy
+
+
+async def apolicy_for(schedule_id):
+    """``policy_for`` for async callers; a fresh local copy is served without leaving the event loop."""
+    entry = _local.get(schedule_id)
+    if (
+        entry
+        and plugin_settings.HMIS_REVISIT_POLICY_CACHE_SECONDS
+        and entry.across == plugin_settings.HMIS_INVOICE_ALLOW_REVISIT_ACROSS_DEPARTMENTS
+        and time.monotonic() - entry.checked_at < plugin_settings.HMIS_REVISIT_POLICY_LOCAL_SECONDS
+    ):
+        return entry.policy
+    return await sync_to_async(policy_for)(schedule_id)
+
+
+def _bump(schedule_ids):
+    for schedule_id in schedule_ids:
+        with _lock:
+            _local.pop(schedule_id, None)
+        key = _version_key(schedule_id)
+        cache.add(key, 1, timeout=None)
+        cache.incr(key)
+
+
+def invalidate(schedule_ids):
+    """Drop the cached policies of ``schedule_ids`` once the current transaction commits."""
+    schedule_ids = list(schedule_ids)
+    if schedule_ids:
+        transaction.on_commit(lambda: _bump(schedule_ids))
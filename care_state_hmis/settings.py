@@ -1,10 +1,33 @@
+import threading
+
 import environ
 from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
 from care_state_hmis.apps import PLUGIN_NAME
 from rest_framework.settings import perform_import
 
 env = environ.Env()
 
+_MISSING = object()
+
+
+class SettingsSnapshot:
+    """Immutable, slot-backed values of every plugin setting.
+
+    Subclassed per ``PluginSettings`` with one slot per default, so reads are
+    plain slot lookups.
+    """
+
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Plugin settings are read-only; change PLUGIN_CONFIGS and call reload()")
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
 
 class PluginSettings:  # pragma: no cover
     """
@@ -17,6 +40,14 @@ class PluginSettings:  # pragma: no cover
     Any setting with string import paths will be automatically resolved
     and return the class, rather than the string literal.
 
+    ``reload()`` resolves every setting into a ``SettingsSnapshot`` and binds
+    its values onto the instance, so a read is a plain instance attribute
+    lookup; ``__getattr__`` only runs for a read before the first reload.
+    ``CareSSMMConfig.ready()`` calls it once and the ``setting_changed``
+    signal calls it again when ``PLUGIN_CONFIGS`` is overridden (e.g. in
+    tests). Code that needs several settings from the same generation holds
+    ``snapshot`` instead.
+
     """
 
     def __init__(
@@ -32,31 +63,57 @@ class PluginSettings:  # pragma: no cover
         self.defaults = defaults or {}
         self.import_strings = import_strings or set()
         self.required_settings = required_settings or set()
-        self._cached_attrs = set()
+        self._lock = threading.Lock()
+        self._snapshot_class = type("PluginSettingsSnapshot", (SettingsSnapshot,), {"__slots__": tuple(self.defaults)})
+        self._snapshot = None
 
     def __getattr__(self, attr):
         if attr not in self.defaults:
             raise AttributeError("Invalid setting: '%s'" % attr)
+        return getattr(self.snapshot, attr)
+
+    @property
+    def snapshot(self) -> SettingsSnapshot:
+        snapshot = self._snapshot
+        if snapshot is None:
+            # Accessed before ready(), e.g. from an import-time default
+            snapshot = self.reload()
+        return snapshot
 
+    def _resolve(self, attr):
         # Try to find the setting from user settings, then from environment variables
-        val = self.defaults[attr]
-        try:
-            val = self.user_settings[attr]
-        except KeyError:
+        default = self.defaults[attr]
+        val = self.user_settings.get(attr, _MISSING)
+        if val is _MISSING:
             try:
-                val = env(attr, cast=type(val))
+                val = env(attr, cast=type(default))
             except environ.ImproperlyConfigured:
+                if attr in self.required_settings:
+                    raise ImproperlyConfigured(f"{self.plugin_name}: required setting '{attr}' is not configured") from None
                 # Fall back to defaults
-                pass
+                val = default
+        elif default is not None and attr not in self.import_strings and not isinstance(val, type(default)):
+            raise ImproperlyConfigured(
+                f"{self.plugin_name}: setting '{attr}' must be {type(default).__name__}, got {type(val).__name__}"
+            )
 
         # Coerce import strings into classes
         if attr in self.import_strings:
             val = perform_import(val, attr)
-
-        self._cached_attrs.add(attr)
-        setattr(self, attr, val)
         return val
 
+    def reload(self) -> SettingsSnapshot:
+        """Re-read every setting into a new snapshot and swap it in."""
+        with self._lock:
+            self.__dict__.pop("_user_settings", None)
+            snapshot = self._snapshot_class()
+            for attr in self.defaults:
+                object.__setattr__(snapshot, attr, self._resolve(attr))
+            # One dict update, so readers see either every old or every new value
+            self.__dict__.update(snapshot.as_dict())
+            self._snapshot = snapshot
+        return snapshot
+
     @property
     def user_settings(self) -> dict:
         if not hasattr(self, "_user_settings"):
@@ -65,12 +122,55 @@ class PluginSettings:  # pragma: no cover
             )
         return self._user_settings
 
+
 REQUIRED_SETTINGS = {}
 
 DEFAULTS = {
     "HMIS_INVOICE_ALLOW_REVISIT_ACROSS_DEPARTMENTS": True,
+    # Answer revisit checks from the LastPaidVisit table; enable after running
+    # ``hmis_backfill_last_paid_visits``.
+    "HMIS_REVISIT_USE_LAST_PAID_VISIT": False,
+    # Create appointment invoices from a Celery task after commit instead of
+    # inside the booking save.
+    "HMIS_INVOICE_ASYNC_AUTOMATION": False,
+    "HMIS_INVOICE_QUEUE_BATCH_SIZE": 100,
+    # Claims after which a failing queued booking is parked for inspection
+    # instead of retried (0 = retry indefinitely).
+    "HMIS_INVOICE_QUEUE_MAX_ATTEMPTS": 5,
+    # str.format template for block-allocated automated invoice numbers, e.g.
+    # "OP{yy}{month}-{sequence:06d}". Empty keeps the facility's expression.
+    "HMIS_INVOICE_NUMBER_FORMAT": "",
+    "HMIS_INVOICE_NUMBER_BLOCK_SIZE": 100,
+    # Rebalance each account at most once per window (0 = once per transaction).
+    "HMIS_ACCOUNT_REBALANCE_WINDOW_SECONDS": 0,
+    # Refresh each facility-day's rollup at most once per window from a Celery
+    # task (0 = inline after the committing transaction).
+    "HMIS_DAILY_STATS_REFRESH_WINDOW_SECONDS": 60,
+    # Shared-cache lifetime of per-schedule revisit policies (0 = load per booking),
+    # and how often a process re-checks its local copy against the shared version.
+    "HMIS_REVISIT_POLICY_CACHE_SECONDS": 3600,
+    "HMIS_REVISIT_POLICY_LOCAL_SECONDS": 10,
+    # Share encounter permission results across requests for this long (0 = per request only).
+    "HMIS_AUTHZ_CACHE_TTL_SECONDS": 0,
+    # Receiver instrumentation: "" (off), "log" (one record per call) or
+    # "metrics" (in-process aggregates served in Prometheus text format).
+    "HMIS_INSTRUMENTATION": "",
+    # DATABASES alias of a read replica for revisit history scans, reports and
+    # exports ("" = primary only; needs ``care_state_hmis.replica.ReplicaRouter``
+    # in DATABASE_ROUTERS), how far behind it may be, and how often to measure.
+    "HMIS_REPLICA_DATABASE": "",
+    "HMIS_REPLICA_MAX_LAG_SECONDS": 5,
+    "HMIS_REPLICA_LAG_CHECK_SECONDS": 5,
+    # Log per-module import times of the plugin's startup (``care_state_hmis.startup``).
+    "HMIS_STARTUP_PROFILE": False,
 }
 
 plugin_settings = PluginSettings(
     PLUGIN_NAME, defaults=DEFAULTS, required_settings=REQUIRED_SETTINGS
 )
+
+
+@receiver(setting_changed, dispatch_uid="hmis_reload_plugin_settings")
+def reload_plugin_settings(setting, **kwargs):
+    if setting == "PLUGIN_CONFIGS":
+        plugin_settings.reload()
@@ -1,2 +1,75 @@
-from . import billing  # noqa
-from . import encounter  # noqa
+"""Receiver registration.
+
+The receiver modules pull in the billing, invoicing and reporting stack
+(care's resource specs, Celery tasks, jsonschema). Importing them from
+``ready()`` made every worker boot and management command pay for it, so
+receivers are connected here through small stubs with lazy ``"app.Model"``
+senders; a stub imports its module the first time its signal fires and then
+calls straight through.
+"""
+
+import importlib
+
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+
+BILLING = "care_state_hmis.signals.billing"
+DEMOGRAPHICS = "care_state_hmis.signals.demographics"
+ENCOUNTER = "care_state_hmis.signals.encounter"
+REPORTING = "care_state_hmis.signals.reporting"
+REVISIT_POLICY = "care_state_hmis.signals.revisit_policy"
+
+# (signal, sender, module, receiver name, dispatch_uid)
+RECEIVERS = [
+    (pre_save, "emr.ChargeItem", BILLING, "decide_appointment_charge_item", "hmis_decide_appointment_charge_item"),
+    (post_save, "emr.TokenBooking", BILLING, "handle_appointment_invoice_payment", "handle_appointment_invoice_payment"),
+    (post_save, "emr.TokenBooking", BILLING, "forget_cancelled_booking_visit", "hmis_forget_cancelled_booking_visit"),
+    (pre_save, "emr.PaymentReconciliation", BILLING, "remember_payment_state", "hmis_remember_payment_state"),
+    (post_delete, "emr.PaymentReconciliation", BILLING, "forget_payment_totals", "hmis_forget_payment_totals"),
+    (
+        post_save,
+        "emr.PaymentReconciliation",
+        BILLING,
+        "handle_payment_reconciliation_rebalance",
+        "handle_payment_reconciliation_rebalance",
+    ),
+    (post_init, "emr.Patient", DEMOGRAPHICS, "track_patient_demographics", "hmis_demographics_track"),
+    (post_save, "emr.Patient", DEMOGRAPHICS, "sync_patient_demographics", "sync_patient_demographics"),
+    (post_delete, "emr.Patient", DEMOGRAPHICS, "forget_patient_demographics", "forget_patient_demographics"),
+    (post_init, "emr.Encounter", ENCOUNTER, "track_hospital_identifier", "hmis_hospital_identifier_track"),
+    (pre_save, "emr.Encounter", ENCOUNTER, "guard_hospital_identifier", "hmis_hospital_identifier_immutable"),
+    (post_save, "emr.Encounter", ENCOUNTER, "assign_hospital_identifier", "hmis_hospital_identifier_assign"),
+    (post_save, "emr.TokenBooking", REPORTING, "refresh_booking_rollup", "hmis_rollup_booking"),
+    (post_delete, "emr.TokenBooking", REPORTING, "refresh_deleted_booking_rollup", "hmis_rollup_booking_deleted"),
+    (post_init, "emr.Encounter", REPORTING, "track_encounter_class", "hmis_rollup_encounter_track"),
+    (post_save, "emr.Encounter", REPORTING, "refresh_encounter_rollup", "hmis_rollup_encounter"),
+    (post_delete, "emr.Encounter", REPORTING, "refresh_deleted_encounter_rollup", "hmis_rollup_encounter_deleted"),
+    (post_save, "emr.Schedule", REVISIT_POLICY, "invalidate_schedule_policy", "hmis_revisit_policy_schedule"),
+    (post_delete, "emr.Schedule", REVISIT_POLICY, "invalidate_schedule_policy", "hmis_revisit_policy_schedule_deleted"),
+    (post_save, "emr.SchedulableResource", REVISIT_POLICY, "invalidate_resource_policies", "hmis_revisit_policy_resource"),
+]
+
+DEFERRED_MODULES = sorted({module for _, _, module, _, _ in RECEIVERS})
+
+
+def lazy_receiver(module, name):
+    """A receiver that imports ``module`` on its first call and delegates to ``name``."""
+
+    def stub(sender, **kwargs):
+        resolved = stub.resolved
+        if resolved is None:
+            resolved = stub.resolved = getattr(importlib.import_module(module), name)
+        return resolved(sender=sender, **kwargs)
+
+    stub.resolved = None
+    stub.__qualname__ = stub.__name__ = name
+    stub.__module__ = module
+    return stub
+
+
+def connect_receivers():
+    for signal, sender, module, name, dispatch_uid in RECEIVERS:
+        # Stubs are only referenced by the signal, so they must be held strongly
+        signal.connect(lazy_receiver(module, name), sender=sender, weak=False, dispatch_uid=dispatch_uid)
+
+
+connect_receivers()
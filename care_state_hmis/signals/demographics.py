@@ -0,0 +1,17 @@
+from care_state_hmis import demographics
+from care_state_hmis.models import PatientDemographics
+
+
+def track_patient_demographics(sender, instance, **kwargs):
+    demographics.track_loaded_values(instance)
+
+
+def sync_patient_demographics(sender, instance, created=False, **kwargs):
+    update_fields = kwargs.get("update_fields")
+    if update_fields and "extensions" not in update_fields:
+        return
+    demographics.sync_patient_demographics(instance, created=created)
+
+
+def forget_patient_demographics(sender, instance, **kwargs):
+    PatientDemographics.objects.filter(patient_id=instance.id).delete()
@@ -3,18 +3,32 @@
 
 Format: ``{YY}{MM}{id:08d}`` derived from the encounter's ``created_date`` and
 auto-increment primary key.
+
+Assignments are collected per transaction and written with a single
+``UPDATE`` at commit, so bulk encounter creation costs one round trip.
+
+The value each instance was loaded with is remembered (``post_init``) so the
+immutability guard can decide in memory and only reads the database when the
+original is unknown (deferred field, freshly created encounter) or empty (it
+may have been assigned at commit since the instance was loaded).
 """
 
 from django.core.exceptions import ValidationError
-from django.db import transaction
-from django.db.models.signals import post_save, pre_save
-from django.dispatch import receiver
+from django.db.models import Case, CharField, Value, When
 from django.utils import timezone
 
 from care.emr.models.encounter import Encounter
+from care_state_hmis import instrumentation
+from care_state_hmis.transactions import OnCommitBatch
 
 HOSPITAL_IDENTIFIER_LABEL = "Hospital Identifier"
 
+# Encounters per UPDATE statement when flushing a large transaction
+ASSIGN_CHUNK_SIZE = 1000
+
+# Instance attribute holding the identifier as last read from / written to the DB
+LOADED_IDENTIFIER_ATTR = "_hmis_loaded_external_identifier"
+
 
 def _format_identifier(encounter) -> str:
     created = encounter.created_date or timezone.now()
@@ -24,11 +38,54 @@ def _format_identifier(encounter) -> str:
     return f"{year}{month}{encounter.id:08d}"
 
 
-@receiver(
-    pre_save,
-    sender=Encounter,
-    dispatch_uid="hmis_hospital_identifier_immutable",
-)
+def _assign_identifiers(pending):
+    """Stamp the encounters created in a committed transaction.
+
+    ``.update`` bypasses re-entering the signals and the immutability guard,
+    and the ``isnull`` filter makes it a no-op where another path beat us to it.
+    """
+    identifiers = []
+    for pk, instance in pending.items():
+        # The in-memory instance no longer reflects the row
+        instance.__dict__.pop(LOADED_IDENTIFIER_ATTR, None)
+        identifiers.append((pk, _format_identifier(instance)))
+    for start in range(0, len(identifiers), ASSIGN_CHUNK_SIZE):
+        chunk = identifiers[start:start + ASSIGN_CHUNK_SIZE]
+        Encounter.objects.filter(
+            pk__in=[pk for pk, _ in chunk], external_identifier__isnull=True
+        ).update(
+            external_identifier=Case(
+                *[When(pk=pk, then=Value(identifier)) for pk, identifier in chunk],
+                output_field=CharField(),
+            )
+        )
+
+
+_pending_identifiers = OnCommitBatch(_assign_identifiers)
+
+
+def track_hospital_identifier(sender, instance, **kwargs):
+    """Remember ``external_identifier`` as loaded from the database.
+
+    Only rows read from the database carry a pk at construction; a deferred
+    ``external_identifier`` is absent from ``__dict__`` and stays unknown.
+    """
+    if instance.pk is not None and "external_identifier" in instance.__dict__:
+        instance.__dict__[LOADED_IDENTIFIER_ATTR] = instance.__dict__["external_identifier"]
+
+
+def _reject_identifier_change():
+    instrumentation.outcome("rejected")
+    raise ValidationError(
+        {
+            "external_identifier": (
+                f"{HOSPITAL_IDENTIFIER_LABEL} cannot be changed once assigned."
+            )
+        }
+    )
+
+
+@instrumentation.instrumented("guard_hospital_identifier", default_outcome="skipped")
 def guard_hospital_identifier(sender, instance, **kwargs):
     """Reject any change to ``external_identifier`` after it has been set.
 
@@ -37,6 +94,20 @@ def guard_hospital_identifier(sender, instance, **kwargs):
     """
     if instance._state.adding:  # noqa: SLF001
         return
+    # Saves restricted to other fields cannot change the identifier
+    update_fields = kwargs.get("update_fields")
+    if update_fields is not None and "external_identifier" not in update_fields:
+        return
+    loaded = instance.__dict__.get(LOADED_IDENTIFIER_ATTR)
+    if loaded and loaded == instance.external_identifier:
+        # Untouched since it was loaded
+        instrumentation.outcome("unchanged")
+        return
+    if loaded:
+        _reject_identifier_change()
+    # Unknown or empty original: the identifier may have been assigned at
+    # commit since this instance was loaded, so the row decides
+    instrumentation.outcome("db_read")
     try:
         old = Encounter.objects.only("external_identifier").get(pk=instance.pk)
     except Encounter.DoesNotExist:
@@ -45,34 +116,22 @@ def guard_hospital_identifier(sender, instance, **kwargs):
         old.external_identifier
         and old.external_identifier != instance.external_identifier
     ):
-        raise ValidationError(
-            {
-                "external_identifier": (
-                    f"{HOSPITAL_IDENTIFIER_LABEL} cannot be changed once assigned."
-                )
-            }
-        )
+        _reject_identifier_change()
 
 
-@receiver(
-    post_save,
-    sender=Encounter,
-    dispatch_uid="hmis_hospital_identifier_assign",
-)
+@instrumentation.instrumented("assign_hospital_identifier", default_outcome="skipped")
 def assign_hospital_identifier(sender, instance, created, **kwargs):
     """On create, stamp ``external_identifier`` with ``{YY}{MM}{id:08d}``.
 
-    No-op if an identifier was already supplied with the create payload.
+    Skipped if an identifier was already supplied with the create payload.
+    Every other save records the persisted value for ``guard_hospital_identifier``.
     """
-    if not created or instance.external_identifier:
+    if created and not instance.external_identifier:
+        instrumentation.outcome("queued")
+        _pending_identifiers.add(instance.pk, instance)
         return
 
-    encounter_pk = instance.pk
-
-    def _do():
-        identifier = _format_identifier(instance)
-        Encounter.objects.filter(
-            pk=encounter_pk, external_identifier__isnull=True
-        ).update(external_identifier=identifier)
-
-    transaction.on_commit(_do)
+    update_fields = kwargs.get("update_fields")
+    if update_fields is None or "external_identifier" in update_fields:
+        instrumentation.outcome("tracked")
+        instance.__dict__[LOADED_IDENTIFIER_ATTR] = instance.external_identifier
@@ -0,0 +1,40 @@
+from care_state_hmis import reporting
+
+# Instance attribute holding the encounter class as loaded from the DB
+LOADED_CLASS_ATTR = "_hmis_loaded_encounter_class"
+
+# Booking fields that move it between OPD rollup rows
+BOOKING_ROLLUP_FIELDS = {"charge_item", "status", "token_slot", "patient"}
+
+
+def refresh_booking_rollup(sender, instance, created, **kwargs):
+    update_fields = kwargs.get("update_fields")
+    if not created and update_fields and not BOOKING_ROLLUP_FIELDS.intersection(update_fields):
+        return
+    reporting.mark_booking(instance.id)
+
+
+def refresh_deleted_booking_rollup(sender, instance, **kwargs):
+    token_slot = instance.token_slot
+    reporting.mark_dirty(reporting.OPD, token_slot.availability.schedule.resource.facility_id, token_slot.start_datetime)
+
+
+def track_encounter_class(sender, instance, **kwargs):
+    if instance.pk is not None and "encounter_class" in instance.__dict__:
+        instance.__dict__[LOADED_CLASS_ATTR] = instance.__dict__["encounter_class"]
+
+
+def refresh_encounter_rollup(sender, instance, created, **kwargs):
+    loaded = instance.__dict__.get(LOADED_CLASS_ATTR)
+    instance.__dict__[LOADED_CLASS_ATTR] = instance.encounter_class
+    if created:
+        changed = reporting.is_inpatient(instance.encounter_class)
+    else:
+        changed = reporting.is_inpatient(loaded) != reporting.is_inpatient(instance.encounter_class)
+    if changed:
+        reporting.mark_dirty(reporting.IP, instance.facility_id, instance.created_date)
+
+
+def refresh_deleted_encounter_rollup(sender, instance, **kwargs):
+    if reporting.is_inpatient(instance.encounter_class):
+        reporting.mark_dirty(reporting.IP, instance.facility_id, instance.created_date)
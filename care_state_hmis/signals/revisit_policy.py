@@ -0,0 +1,12 @@
+from care.emr.models.scheduling.schedule import Schedule
+from care_state_hmis import revisit_policy
+
+
+def invalidate_schedule_policy(sender, instance, **kwargs):
+    revisit_policy.invalidate([instance.id])
+
+
+def invalidate_resource_policies(sender, instance, created, **kwargs):
+    # Scope depends on the resource's facility and type
+    if not created:
+        revisit_policy.invalidate(Schedule.objects.filter(resource_id=instance.id).values_list("id", flat=True))
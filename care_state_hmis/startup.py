@@ -0,0 +1,84 @@
+"""Import-time profile of the plugin's startup.
+
+With ``HMIS_STARTUP_PROFILE`` set, ``CareSSMMConfig.ready()`` imports its
+modules under ``profile_imports``, which times every module first imported in
+the block (cumulative and self time, like ``python -X importtime``) and logs
+them to ``care_state_hmis.startup``. The receiver modules normally deferred to
+the first signal are imported too, so their cost shows up separately.
+"""
+
+import logging
+import sys
+import time
+from contextlib import contextmanager
+from importlib.abc import Loader, MetaPathFinder
+
+logger = logging.getLogger(__name__)
+
+# Modules listed besides the plugin's own
+TOP_MODULES = 20
+
+
+class _TimedLoader(Loader):
+    def __init__(self, loader, profiler):
+        self._loader = loader
+        self._profiler = profiler
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        profiler = self._profiler
+        profiler.stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            cumulative = time.perf_counter() - start
+            children = profiler.stack.pop()
+            if profiler.stack:
+                profiler.stack[-1] += cumulative
+            profiler.timings.append((module.__name__, cumulative, cumulative - children))
+
+
+class ImportProfiler(MetaPathFinder):
+    """Meta path finder wrapping the loaders of newly imported modules."""
+
+    def __init__(self):
+        self.timings = []
+        self.stack = []
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = _TimedLoader(spec.loader, self)
+                return spec
+        return None
+
+
+@contextmanager
+def profile_imports(label):
+    profiler = ImportProfiler()
+    sys.meta_path.insert(0, profiler)
+    start = time.perf_counter()
+    try:
+        yield profiler
+    finally:
+        sys.meta_path.remove(profiler)
+        report(label, profiler.timings, time.perf_counter() - start)
+
+
+def report(label, timings, elapsed):
+    own, others = [], []
+    for timing in sorted(timings, key=lambda timing: timing[1], reverse=True):
+        (own if timing[0].split(".")[0] == "care_state_hmis" else others).append(timing)
+    logger.info("%s: %.1fms, %d modules imported", label, elapsed * 1000, len(timings))
+    for name, cumulative, self_time in own + others[:TOP_MODULES]:
+        logger.info("  %8.1fms cumulative %8.1fms self  %s", cumulative * 1000, self_time * 1000, name)
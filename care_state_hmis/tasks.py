@@ -0,0 +1,42 @@
+import logging
+from datetime import date
+
+from celery import shared_task
+
+from care.emr.resources.account.sync_items import rebalance_account_task
+from care_state_hmis.invoicing import invoice_queue_stats, process_invoice_queue
+from care_state_hmis import reporting
+from care_state_hmis.rebalance import clear_pending_marker
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def process_appointment_invoice_queue():
+    processed = 0
+    while batch := process_invoice_queue():
+        processed += batch
+    stats = invoice_queue_stats()
+    logger.info(
+        "Processed %s queued appointment invoices; depth=%s lag=%.1fs parked=%s",
+        processed,
+        stats["depth"],
+        stats["lag_seconds"],
+        stats["parked"],
+    )
+    return processed
+
+
+@shared_task
+def debounced_rebalance_account(account_id):
+    # Cleared first so payments landing during the rebalance schedule another
+    clear_pending_marker(account_id)
+    rebalance_account_task(account_id)
+
+
+@shared_task
+def refresh_daily_stats(group, facility_id, day):
+    day = date.fromisoformat(day)
+    # Cleared first so commits landing during the refresh schedule another
+    reporting.clear_pending_marker(group, facility_id, day)
+    reporting.refresh_day(group, facility_id, day)
@@ -0,0 +1,56 @@
+import threading
+
+from django.db import transaction
+
+
+class _Batch(dict):
+    """Keys added at one savepoint level of a transaction, flushed by one ``on_commit`` callback."""
+
+    def __init__(self, flush, savepoint_ids):
+        super().__init__()
+        self.flush = flush
+        self.savepoint_ids = savepoint_ids
+
+    def __call__(self):
+        self.flush(dict(self))
+
+
+class OnCommitBatch:
+    """Collect keys during a transaction and hand them to ``flush`` once, on commit.
+
+    Outside an atomic block the flush runs immediately, like ``on_commit``.
+    One callback is registered per transaction (and per savepoint that adds
+    keys). When a transaction or savepoint rolls back, Django discards its
+    callback and the keys queued with it are forgotten, so adding them again
+    queues them again.
+    """
+
+    def __init__(self, flush):
+        self._flush = flush
+        self._local = threading.local()
+
+    def _batches(self, connection):
+        # Batches whose callback is no longer registered were either flushed
+        # or discarded by a rollback.
+        registered = {id(entry[1]) for entry in connection.run_on_commit}
+        batches = [batch for batch in getattr(self._local, "batches", ()) if id(batch) in registered]
+        self._local.batches = batches
+        return batches
+
+    def add(self, key, value=None):
+        """Queue ``key``; returns False if it is already queued in this transaction."""
+        connection = transaction.get_connection()
+        if not connection.in_atomic_block:
+            self._flush({key: value})
+            return True
+        batches = self._batches(connection)
+        if any(key in batch for batch in batches):
+            return False
+        savepoint_ids = tuple(connection.savepoint_ids)
+        batch = next((batch for batch in batches if batch.savepoint_ids == savepoint_ids), None)
+        if batch is None:
+            batch = _Batch(self._flush, savepoint_ids)
+            transaction.on_commit(batch)
+            batches.append(batch)
+        batch[key] = value
+        return True
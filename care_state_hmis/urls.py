@@ -1 +1,10 @@
-urlpatterns = [] 
+from django.urls import path
+
+from care_state_hmis.api import DailyStatsView, ExportView, MetricsView, MonthlyStatsView
+
+urlpatterns = [
+    path("facility/<uuid:facility_external_id>/reports/daily/", DailyStatsView.as_view(), name="hmis-daily-stats"),
+    path("facility/<uuid:facility_external_id>/reports/monthly/", MonthlyStatsView.as_view(), name="hmis-monthly-stats"),
+    path("exports/<str:dataset>/", ExportView.as_view(), name="hmis-export"),
+    path("metrics/", MetricsView.as_view(), name="hmis-metrics"),
+]
@@ -14,6 +14,7 @@ requirements = [
     "django",
     "djangorestframework",
     "django-environ",
+    "jsonschema>=4",
 ]
 
 test_requirements = []
@@ -0,0 +1,5 @@
+"""Tests for the plugin, run with Django's test runner from a care checkout
+with this plugin installed (``make test``), like ``benchmarks``.
+
+Fixtures come from ``benchmarks.seed`` at small sizes.
+"""
@@ -0,0 +1,77 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from model_bakery import baker
+
+from care.emr.models.encounter import Encounter
+from care.emr.models.location import FacilityLocation, FacilityLocationOrganization
+from care.emr.models.organization import FacilityOrganizationUser, OrganizationUser
+from care.emr.resources.encounter.constants import COMPLETED_CHOICES
+from care.security.authorization.base import AuthorizationController
+from care.security.models import RolePermission
+from care.security.permissions.encounter import EncounterPermissions
+from care.utils.tests.base import CareAPITestBase
+from care_state_hmis.authorization import cache
+
+CAN_WRITE = EncounterPermissions.can_write_encounter.name
+
+
+class EncounterPermissionMemoTests(CareAPITestBase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user()
+        self.facility = self.create_facility(user=self.create_user())
+        self.organization = self.create_facility_organization(facility=self.facility)
+        self.role = self.create_role_with_permissions(permissions=[CAN_WRITE])
+        self.attach_role_facility_organization_user(self.organization, self.user, self.role)
+        patient = self.create_patient()
+        ids = [
+            encounter.id
+            for encounter in baker.make(Encounter, facility=self.facility, patient=patient, current_location=None, _quantity=100)
+        ]
+        Encounter.objects.filter(id__in=ids).update(
+            facility_organization_cache=[self.organization.id],
+            updated_by=self.user,
+            status=next(iter(COMPLETED_CHOICES)),
+        )
+        self.encounters = list(Encounter.objects.filter(id__in=ids).order_by("id"))
+        # As for a request: request_started opens the memo
+        cache.open_request_memo()
+        self.addCleanup(cache.close_request_memo)
+
+    def _can_restart(self, encounter):
+        return AuthorizationController.call("can_restart_encounter_obj", self.user, encounter)
+
+    def test_page_of_encounters_resolves_in_constant_queries(self):
+        with CaptureQueriesContext(connection) as first:
+            self.assertTrue(self._can_restart(self.encounters[0]))
+        self.assertGreater(len(first), 0)
+        with self.assertNumQueries(0):
+            for encounter in self.encounters[1:]:
+                self.assertTrue(self._can_restart(encounter))
+
+    def test_facility_organization_user_change_invalidates_within_request(self):
+        self.assertTrue(self._can_restart(self.encounters[0]))
+        FacilityOrganizationUser.objects.get(user=self.user, organization=self.organization).delete()
+        self.assertFalse(self._can_restart(self.encounters[0]))
+
+    def test_organization_user_change_invalidates_within_request(self):
+        self.assertTrue(self._can_restart(self.encounters[0]))
+        baker.make(OrganizationUser, user=self.user, organization=self.create_organization(), role=self.role)
+        with CaptureQueriesContext(connection) as resolved:
+            self.assertTrue(self._can_restart(self.encounters[0]))
+        self.assertGreater(len(resolved), 0)
+
+    def test_role_permission_change_invalidates_within_request(self):
+        self.assertTrue(self._can_restart(self.encounters[0]))
+        RolePermission.objects.filter(role=self.role).delete()
+        self.assertFalse(self._can_restart(self.encounters[0]))
+
+    def test_location_organization_change_invalidates_within_request(self):
+        location = baker.make(FacilityLocation, facility=self.facility)
+        self.assertTrue(self._can_restart(self.encounters[0]))
+        with self.assertNumQueries(0):
+            self._can_restart(self.encounters[0])
+        baker.make(FacilityLocationOrganization, location=location, organization=self.organization)
+        with CaptureQueriesContext(connection) as resolved:
+            self.assertTrue(self._can_restart(self.encounters[0]))
+        self.assertGreater(len(resolved), 0)
@@ -0,0 +1,91 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.test import TestCase, override_settings
+
+from benchmarks import seed
+from care.emr.models.charge_item import ChargeItem
+from care.emr.models.invoice import Invoice
+from care.emr.models.payment_reconciliation import PaymentReconciliation
+from care.emr.models.scheduling.booking import TokenBooking
+from care.utils.time_util import care_now
+from care_state_hmis import billing_service, bulk
+from care_state_hmis.models import AutomatedInvoiceLedger
+
+
+# Schedule-scoped revisits: the seeded resources need not be healthcare services
+@override_settings(PLUGIN_CONFIGS={"care_state_hmis": {"HMIS_INVOICE_ALLOW_REVISIT_ACROSS_DEPARTMENTS": False}})
+class BulkInvoiceEquivalenceTests(TestCase):
+    """``bulk_invoice_bookings`` must leave imported bookings as the booking receiver would."""
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = seed.make_rng(7)
+        cls.fixture = seed.seed_facility(rng, patients=4, schedules=2, history=3, revisit_allowed_days=7)
+        # Recent paid visits, so some imported bookings fall in the revisit window
+        for patient, entry in zip(cls.fixture.patients[:2], cls.fixture.schedules, strict=True):
+            seed.paid_booking(cls.fixture, patient, entry, entry.definition, care_now() - timedelta(days=2))
+
+        # Imported bookings: charge items written and linked without the receivers.
+        # Repeat patients make later bookings depend on earlier ones in the import.
+        pairs = seed.pending_bookings(rng, cls.fixture, 12, appointment_resource=False)
+        ChargeItem.objects.bulk_create([charge_item for _, charge_item in pairs])
+        for booking, charge_item in pairs:
+            TokenBooking.objects.filter(pk=booking.pk).update(charge_item=charge_item)
+        cls.booking_ids = [booking.id for booking, _ in pairs]
+
+    def _bookings(self):
+        return TokenBooking.objects.filter(id__in=self.booking_ids).order_by("token_slot__start_datetime", "id")
+
+    def _outcome(self):
+        """What each booking ended up with, without ids that differ between runs."""
+        outcome = {}
+        for booking in self._bookings().select_related("charge_item"):
+            charge_item = booking.charge_item
+            if charge_item is None:
+                outcome[booking.id] = None
+                continue
+            invoice = Invoice.objects.filter(id=charge_item.paid_invoice_id).first()
+            outcome[booking.id] = {
+                "charge_item_definition": charge_item.charge_item_definition_id,
+                "charge_item_status": charge_item.status,
+                "total_price": charge_item.total_price,
+                "invoice_status": invoice and invoice.status,
+                "invoice_total_gross": invoice and invoice.total_gross,
+                "payments": sorted(PaymentReconciliation.objects.filter(target_invoice=invoice).values_list("amount", flat=True))
+                if invoice
+                else [],
+                "ledgered": AutomatedInvoiceLedger.objects.filter(booking_external_id=booking.external_id).exists(),
+            }
+        return outcome
+
+    def _run(self, invoice):
+        savepoint = transaction.savepoint()
+        try:
+            invoice()
+            return self._outcome()
+        finally:
+            transaction.savepoint_rollback(savepoint)
+
+    def test_bulk_matches_signal_path(self):
+        def one_by_one():
+            for booking in self._bookings():
+                billing_service.invoice_booking(booking)
+
+        def in_bulk():
+            result = bulk.bulk_invoice_bookings(TokenBooking.objects.filter(id__in=self.booking_ids), batch_size=5)
+            self.assertEqual(result.processed, len(self.booking_ids))
+
+        expected = self._run(one_by_one)
+        # The fixture has both new visits and revisits
+        revisit_definitions = {entry.schedule.revisit_charge_item_definition_id for entry in self.fixture.schedules}
+        charged = {entry["charge_item_definition"] in revisit_definitions for entry in expected.values() if entry}
+        self.assertEqual(charged, {True, False})
+        self.assertEqual(self._run(in_bulk), expected)
+
+    def test_rerun_invoices_nothing(self):
+        bulk.bulk_invoice_bookings(TokenBooking.objects.filter(id__in=self.booking_ids))
+        invoices = Invoice.objects.count()
+        result = bulk.bulk_invoice_bookings(TokenBooking.objects.filter(id__in=self.booking_ids))
+        self.assertEqual((result.processed, result.invoiced), (0, 0))
+        self.assertEqual(Invoice.objects.count(), invoices)
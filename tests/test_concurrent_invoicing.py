@@ -0,0 +1,61 @@
+import threading
+
+from django.test import TransactionTestCase
+
+from benchmarks import seed
+from benchmarks.harness import run_operations
+from care.emr.models.invoice import Invoice
+from care.emr.models.payment_reconciliation import PaymentReconciliation
+from care.emr.models.scheduling.booking import TokenBooking
+from care_state_hmis import billing_service, invoice_ledger
+from care_state_hmis.models import AutomatedInvoiceLedger
+
+ATTEMPTS = 4
+
+
+class ConcurrentAutomatedInvoiceTests(TransactionTestCase):
+    """Repeated invoicing of one booking per facility, racing across facilities."""
+
+    def setUp(self):
+        self.bookings = {}
+        for index in range(2):
+            fixture = seed.seed_facility(seed.make_rng(23 + index), patients=1, schedules=1, history=0)
+            booking, charge_item = seed.pending_bookings(seed.make_rng(23), fixture, 1)[0]
+            # Linked as the view leaves it, without the booking receiver
+            charge_item.save()
+            TokenBooking.objects.filter(pk=booking.pk).update(charge_item=charge_item)
+            self.bookings[fixture.facility.id] = booking.id
+        self.results = []
+        self.results_lock = threading.Lock()
+
+    def _operations(self):
+        # Every attempt waits until all of them are running, so they claim together
+        barrier = threading.Barrier(ATTEMPTS * len(self.bookings), timeout=30)
+
+        def attempt(booking_id):
+            def operation():
+                booking = TokenBooking.objects.get(id=booking_id)
+                barrier.wait()
+                invoice = billing_service.invoice_booking(booking)
+                with self.results_lock:
+                    self.results.append((booking_id, invoice and invoice.id))
+
+            return operation
+
+        return [attempt(booking_id) for booking_id in self.bookings.values() for _ in range(ATTEMPTS)]
+
+    def test_racing_attempts_create_one_invoice_per_booking(self):
+        result = run_operations(self._operations(), workers=ATTEMPTS * len(self.bookings))
+        self.assertEqual(result["errors"], 0, result.get("first_error"))
+
+        for facility_id, booking_id in self.bookings.items():
+            with self.subTest(facility_id=facility_id):
+                invoices = list(Invoice.objects.filter(facility_id=facility_id).values_list("id", flat=True))
+                self.assertEqual(len(invoices), 1)
+                # One attempt created it, the others stopped at the ledger
+                attempts = sorted((invoice_id for booked, invoice_id in self.results if booked == booking_id), key=bool)
+                self.assertEqual(attempts, [None] * (ATTEMPTS - 1) + invoices)
+                entry = AutomatedInvoiceLedger.objects.get(booking_id=booking_id)
+                self.assertEqual(entry.invoice_id, invoices[0])
+                self.assertEqual(list(PaymentReconciliation.objects.filter(target_invoice_id=invoices[0]).values_list("id", flat=True)), [entry.payment_id])
+                self.assertEqual(list(invoice_ledger.audit(facility_id)), [])
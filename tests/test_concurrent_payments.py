@@ -0,0 +1,68 @@
+import threading
+from decimal import Decimal
+from unittest import mock
+
+from django.test import TransactionTestCase
+
+from benchmarks import seed
+from benchmarks.harness import run_operations
+from care.emr.models.charge_item import ChargeItem
+from care.emr.models.invoice import Invoice
+from care.emr.resources.charge_item.spec import ChargeItemStatusOptions
+from care.emr.resources.invoice.spec import InvoiceStatusOptions
+from care_state_hmis import billing_service
+from care_state_hmis.models import InvoicePaymentTotal
+
+WORKERS = 8
+PAYMENTS = 24
+
+
+class ConcurrentPaymentTests(TransactionTestCase):
+    """Parallel payments of 1 to one invoice of ``PAYMENTS``: it must balance and settle exactly once."""
+
+    def setUp(self):
+        fixture = seed.seed_facility(seed.make_rng(18), patients=1, schedules=1, history=0)
+        self.invoice, self.charge_item = seed.issued_invoices(fixture, 1, 0, total=PAYMENTS)[0]
+        # No totals row yet, so the first payments race to seed it
+        InvoicePaymentTotal.objects.filter(invoice_id=self.invoice.id).delete()
+        self.events = []
+        self.events_lock = threading.Lock()
+
+    def _record(self, name, function):
+        def wrapper(*args, **kwargs):
+            result = function(*args, **kwargs)
+            with self.events_lock:
+                self.events.append((name, result))
+            return result
+
+        return wrapper
+
+    def _operations(self):
+        # The first wave waits until every worker holds one, so they post together
+        barrier = threading.Barrier(WORKERS, timeout=30)
+
+        def first():
+            barrier.wait()
+            seed.new_payment(self.charge_item, self.invoice).save()
+
+        def later():
+            seed.new_payment(self.charge_item, self.invoice).save()
+
+        return [first] * WORKERS + [later] * (PAYMENTS - WORKERS)
+
+    def test_invoice_balances_and_settles_once(self):
+        with (
+            mock.patch.object(billing_service, "transition_invoice", self._record("transition", billing_service.transition_invoice)),
+            mock.patch.object(billing_service, "_settle_invoice_items", self._record("settle", billing_service._settle_invoice_items)),  # noqa: SLF001
+        ):
+            result = run_operations(self._operations(), workers=WORKERS)
+        self.assertEqual(result["errors"], 0, result.get("first_error"))
+        self.assertEqual(result["operations"], PAYMENTS)
+
+        self.assertEqual([event for event in self.events if event == ("transition", True)], [("transition", True)])
+        self.assertEqual([name for name, _ in self.events if name == "settle"], ["settle"])
+        total = InvoicePaymentTotal.objects.get(invoice_id=self.invoice.id)
+        self.assertEqual((total.total_payments, total.total_credit_notes), (Decimal(PAYMENTS), Decimal(0)))
+        self.assertEqual(Invoice.objects.get(id=self.invoice.id).status, InvoiceStatusOptions.balanced.value)
+        charge_item = ChargeItem.objects.get(id=self.charge_item.id)
+        self.assertEqual((charge_item.status, charge_item.paid_invoice_id), (ChargeItemStatusOptions.paid.value, self.invoice.id))
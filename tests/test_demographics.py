@@ -0,0 +1,89 @@
+from types import SimpleNamespace
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from model_bakery import baker
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from care.emr.models.encounter import Encounter
+from care.emr.models.patient import Patient
+from care_state_hmis import exports
+from care_state_hmis.demographics import EXTENSION_NAME
+from care_state_hmis.filters import PatientDemographicsFilter
+from care_state_hmis.models import PatientDemographics
+
+DATA = {"caste": "General", "religion": "Other", "related_person": "Parent"}
+TABLE = PatientDemographics._meta.db_table  # noqa: SLF001
+
+
+class PatientDemographicsSyncTests(TestCase):
+    def setUp(self):
+        self.patient = baker.make(Patient, extensions={EXTENSION_NAME: DATA})
+
+    def _demographics_queries(self, save):
+        with CaptureQueriesContext(connection) as captured:
+            save()
+        return [query["sql"] for query in captured if TABLE in query["sql"]]
+
+    def test_created_patient_is_mirrored(self):
+        self.assertEqual(PatientDemographics.objects.filter(patient_id=self.patient.id, **DATA).count(), 1)
+
+    def test_unchanged_save_skips_the_table(self):
+        loaded = Patient.objects.get(id=self.patient.id)
+        loaded.name = "Renamed"
+        self.assertEqual(self._demographics_queries(loaded.save), [])
+        # Repeated saves of the freshly created instance skip it as well
+        self.assertEqual(self._demographics_queries(self.patient.save), [])
+
+    def test_changed_values_are_written(self):
+        loaded = Patient.objects.get(id=self.patient.id)
+        loaded.extensions = {EXTENSION_NAME: {**DATA, "religion": "Hindu"}}
+        self.assertTrue(self._demographics_queries(loaded.save))
+        self.assertEqual(PatientDemographics.objects.get(patient_id=self.patient.id).religion, "Hindu")
+        self.assertEqual(self._demographics_queries(loaded.save), [])
+
+    def test_cleared_values_drop_the_row(self):
+        loaded = Patient.objects.get(id=self.patient.id)
+        loaded.extensions = {}
+        loaded.save()
+        self.assertFalse(PatientDemographics.objects.filter(patient_id=self.patient.id).exists())
+
+    def test_deferred_extensions_fall_back_to_an_upsert(self):
+        PatientDemographics.objects.filter(patient_id=self.patient.id).update(religion="")
+        deferred = Patient.objects.defer("extensions").get(id=self.patient.id)
+        # Loaded after construction, so the original is unknown
+        self.assertEqual(deferred.extensions, {EXTENSION_NAME: DATA})
+        deferred.save()
+        self.assertEqual(PatientDemographics.objects.get(patient_id=self.patient.id).religion, "Other")
+
+
+class PatientDemographicsFilterTests(TestCase):
+    def setUp(self):
+        self.general, self.obc, self.unknown = (
+            baker.make(Patient, extensions={EXTENSION_NAME: {**DATA, "caste": caste}} if caste else {})
+            for caste in ("General", "OBC", None)
+        )
+
+    def _filter(self, queryset, view=None, **query):
+        request = Request(APIRequestFactory().get("/", query))
+        return set(PatientDemographicsFilter().filter_queryset(request, queryset, view or SimpleNamespace()))
+
+    def test_filters_patients_by_indexed_values(self):
+        patients = Patient.objects.filter(id__in=[self.general.id, self.obc.id, self.unknown.id])
+        self.assertEqual(self._filter(patients, caste="OBC"), {self.obc})
+        self.assertEqual(self._filter(patients, caste="General,OBC", religion="Other"), {self.general, self.obc})
+        self.assertEqual(self._filter(patients, religion="Hindu"), set())
+        self.assertEqual(self._filter(patients), {self.general, self.obc, self.unknown})
+
+    def test_filters_rows_through_their_patient_field(self):
+        facility = baker.make("facility.Facility")
+        encounters = {patient: baker.make(Encounter, facility=facility, patient=patient) for patient in (self.general, self.obc)}
+        view = SimpleNamespace(demographics_patient_field="patient_id")
+        self.assertEqual(self._filter(Encounter.objects.all(), view, caste="OBC"), {encounters[self.obc]})
+
+        today = timezone.localdate()
+        rows = exports.export_rows("encounters", today, today, [facility.id], demographics={"caste__in": ["General"]})
+        self.assertEqual([row["patient"] for row in rows], [self.general.external_id])
@@ -0,0 +1,61 @@
+from model_bakery import baker
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from care.emr.models.organization import OrganizationUser
+from care.utils.tests.base import CareAPITestBase
+from care_state_hmis.api import ExportView
+from care_state_hmis.authorization.reports import EXPORT_PERMISSION, REPORT_PERMISSION
+
+DATES = {"date_from": "2026-01-01", "date_to": "2026-01-31"}
+
+
+class ExportAccessTests(CareAPITestBase):
+    def setUp(self):
+        super().setUp()
+        self.factory = APIRequestFactory()
+        self.facility = self.create_facility(user=self.create_user())
+        self.other_facility = self.create_facility(user=self.create_user())
+        self.organization = self.create_organization()
+
+    def _status(self, user, **query):
+        request = self.factory.get("/", {**DATES, **query})
+        force_authenticate(request, user=user)
+        return ExportView.as_view()(request, dataset="encounters").status_code
+
+    def _facility_member(self, permission, *facilities):
+        user = self.create_user()
+        role = self.create_role_with_permissions(permissions=[permission])
+        for facility in facilities:
+            self.attach_role_facility_organization_user(self.create_facility_organization(facility=facility), user, role)
+        return user
+
+    def _organization_member(self, permission, organization):
+        user = self.create_user()
+        baker.make(OrganizationUser, user=user, organization=organization, role=self.create_role_with_permissions(permissions=[permission]))
+        return user
+
+    def test_facility_export_needs_the_export_permission(self):
+        facility = str(self.facility.external_id)
+        self.assertEqual(self._status(self._facility_member(EXPORT_PERMISSION, self.facility), facility=facility), 200)
+        self.assertEqual(self._status(self._facility_member(REPORT_PERMISSION, self.facility), facility=facility), 403)
+
+    def test_every_listed_facility_is_checked(self):
+        user = self._facility_member(EXPORT_PERMISSION, self.facility)
+        facilities = f"{self.facility.external_id},{self.other_facility.external_id}"
+        self.assertEqual(self._status(user, facility=facilities), 403)
+
+    def test_organization_export_needs_the_export_permission(self):
+        organization = str(self.organization.external_id)
+        self.assertEqual(self._status(self._organization_member(EXPORT_PERMISSION, self.organization), organization=organization), 200)
+        self.assertEqual(self._status(self._organization_member(REPORT_PERMISSION, self.organization), organization=organization), 403)
+
+    def test_superuser_can_export(self):
+        self.assertEqual(self._status(self.create_super_user(), facility=str(self.facility.external_id)), 200)
+
+    def test_malformed_parameters_are_rejected(self):
+        user = self.create_super_user()
+        facility = str(self.facility.external_id)
+        self.assertEqual(self._status(user, facility=facility, date_to="2025-12-31"), 400)
+        self.assertEqual(self._status(user, facility=f"{facility},not-a-uuid"), 400)
+        self.assertEqual(self._status(user, organization="not-a-uuid"), 400)
+        self.assertEqual(self._status(user, facility=facility.upper()), 200)
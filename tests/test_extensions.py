@@ -0,0 +1,54 @@
+import inspect
+import random
+
+from django.test import SimpleTestCase
+from jsonschema import Draft202012Validator
+from rest_framework.exceptions import ValidationError
+
+from care.emr.extensions.base import PlugExtension
+from care_state_hmis.extensions import PatientDemographicsExtension
+
+DATA = {"caste": "General", "religion": "Other", "related_person": "Parent"}
+POSITIONAL = (inspect.Parameter.POSITIONAL_ONLY, inspect.Parameter.POSITIONAL_OR_KEYWORD)
+
+
+class PatientDemographicsExtensionTests(SimpleTestCase):
+    def setUp(self):
+        self.extension = PatientDemographicsExtension()
+
+    def test_overrides_accept_what_core_passes(self):
+        # If core's hooks change shape, the compiled validator and render map
+        # would silently stop being used.
+        for name in ("validate", "serialize"):
+            with self.subTest(name):
+                core = inspect.signature(getattr(PlugExtension, name))
+                ours = inspect.signature(getattr(PatientDemographicsExtension, name))
+                positional = [parameter for parameter in core.parameters.values() if parameter.kind in POSITIONAL]
+                keyword = {parameter.name: None for parameter in core.parameters.values() if parameter.kind == inspect.Parameter.KEYWORD_ONLY}
+                ours.bind(*[None] * len(positional), **keyword)
+
+    def test_validate_agrees_with_jsonschema(self):
+        reference = Draft202012Validator(PatientDemographicsExtension.write_schema)
+        properties = PatientDemographicsExtension.write_schema["properties"]
+        values = [*{value for spec in properties.values() for value in spec.get("enum", [])}, "Unlisted", "", 1, None, ["General"]]
+        rng = random.Random(12)  # noqa: S311
+        cases = [None, "General", [], {}]
+        for _ in range(500):
+            keys = rng.sample([*properties, "extra"], rng.randint(0, len(properties) + 1))
+            cases.append({key: rng.choice(values) for key in keys})
+        for data in cases:
+            with self.subTest(data=data):
+                expected_valid = not list(reference.iter_errors(data))
+                try:
+                    self.extension.validate(data)
+                except ValidationError:
+                    valid = False
+                else:
+                    valid = True
+                self.assertEqual(valid, expected_valid)
+
+    def test_serialize_hides_blacklisted_fields(self):
+        self.assertEqual(self.extension.serialize(DATA, "treatment_summary"), {"related_person": "Parent"})
+        self.assertEqual(self.extension.serialize(DATA, "appointment_print"), {"related_person": "Parent"})
+        self.assertEqual(self.extension.serialize(DATA, "patient_detail"), DATA)
+        self.assertEqual(self.extension.serialize(DATA), DATA)
@@ -0,0 +1,37 @@
+from django.core.exceptions import ValidationError
+from django.test import TestCase
+from model_bakery import baker
+
+from care.emr.models.encounter import Encounter
+from care.emr.models.patient import Patient
+from care.facility.models import Facility
+
+
+class HospitalIdentifierGuardTests(TestCase):
+    def setUp(self):
+        self.facility = baker.make(Facility)
+        self.patient = baker.make(Patient)
+
+    def _create(self):
+        """An encounter, and a copy loaded before the identifier was assigned at commit."""
+        with self.captureOnCommitCallbacks(execute=True):
+            encounter = baker.make(Encounter, facility=self.facility, patient=self.patient, external_identifier=None)
+            stale = Encounter.objects.get(id=encounter.id)
+        self.assertIsNone(stale.external_identifier)
+        return encounter, stale
+
+    def test_stale_instance_cannot_clear_the_assigned_identifier(self):
+        encounter, stale = self._create()
+        assigned = Encounter.objects.values_list("external_identifier", flat=True).get(id=encounter.id)
+        self.assertTrue(assigned)
+        with self.assertRaises(ValidationError):
+            stale.save()
+        self.assertEqual(Encounter.objects.values_list("external_identifier", flat=True).get(id=encounter.id), assigned)
+
+    def test_loaded_instance_saves_but_cannot_change_the_identifier(self):
+        encounter, _ = self._create()
+        loaded = Encounter.objects.get(id=encounter.id)
+        loaded.save()
+        loaded.external_identifier = "000000000000"
+        with self.assertRaises(ValidationError):
+            loaded.save()
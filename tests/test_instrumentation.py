@@ -0,0 +1,88 @@
+import threading
+
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from care_state_hmis import instrumentation
+
+
+def mode(value):
+    return override_settings(PLUGIN_CONFIGS={"care_state_hmis": {"HMIS_INSTRUMENTATION": value}})
+
+
+def _queries(count, branch=None):
+    with connection.cursor() as cursor:
+        for _ in range(count):
+            cursor.execute("SELECT 1")
+    if branch:
+        instrumentation.outcome(branch)
+
+
+run_queries = instrumentation.instrumented("hmis.test_receiver")(_queries)
+
+
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        instrumentation.registry.reset()
+        self.addCleanup(instrumentation.registry.reset)
+
+    @mode(instrumentation.METRICS)
+    def test_counts_the_wrapped_queries(self):
+        run_queries(3)
+        run_queries(2, branch="skipped")
+        # Queries outside the receiver are not counted
+        _queries(4)
+        calls, seconds, queries, query_seconds, lock_wait = instrumentation.registry.totals["hmis.test_receiver"]
+        self.assertEqual((calls, queries, lock_wait), (2, 5, 0.0))
+        self.assertGreater(seconds, 0)
+        self.assertGreaterEqual(seconds, query_seconds)
+        self.assertEqual(
+            dict(instrumentation.registry.outcomes),
+            {("hmis.test_receiver", "completed"): 1, ("hmis.test_receiver", "skipped"): 1},
+        )
+
+    @mode(instrumentation.METRICS)
+    def test_errors_and_lock_wait_are_recorded(self):
+        lock = threading.Lock()
+        lock.acquire()
+        threading.Timer(0.05, lock.release).start()
+
+        def failing():
+            with instrumentation.lock_wait(lock):
+                raise ValueError
+
+        with self.assertRaises(ValueError):
+            instrumentation.instrumented("hmis.failing")(failing)()
+        self.assertEqual(dict(instrumentation.registry.outcomes), {("hmis.failing", "error"): 1})
+        self.assertGreaterEqual(instrumentation.registry.totals["hmis.failing"][4], 0.04)
+
+    @mode(instrumentation.METRICS)
+    def test_prometheus_rendering(self):
+        run_queries(1)
+        run_queries(1, branch="skipped")
+        lines = instrumentation.prometheus_text().splitlines()
+        self.assertEqual(
+            lines[:3],
+            [
+                "# HELP hmis_receiver_calls_total Receiver invocations",
+                "# TYPE hmis_receiver_calls_total counter",
+                'hmis_receiver_calls_total{receiver="hmis.test_receiver"} 2',
+            ],
+        )
+        self.assertIn('hmis_receiver_queries_total{receiver="hmis.test_receiver"} 2', lines)
+        self.assertIn('hmis_receiver_outcomes_total{receiver="hmis.test_receiver",outcome="completed"} 1', lines)
+        self.assertIn('hmis_receiver_outcomes_total{receiver="hmis.test_receiver",outcome="skipped"} 1', lines)
+        self.assertEqual(sum(line.startswith("# TYPE") for line in lines), 6)
+
+    @mode(instrumentation.LOG)
+    def test_log_mode_emits_one_record_per_call(self):
+        with self.assertLogs(instrumentation.logger, "INFO") as logs:
+            run_queries(2, branch="skipped")
+        (record,) = logs.records
+        self.assertEqual((record.receiver, record.outcome, record.queries), ("hmis.test_receiver", "skipped", 2))
+        self.assertEqual(dict(instrumentation.registry.totals), {})
+
+    def test_disabled_records_nothing(self):
+        with self.assertNumQueries(1):
+            run_queries(1)
+        self.assertTrue(all(line.startswith("#") for line in instrumentation.prometheus_text().splitlines()))
@@ -0,0 +1,153 @@
+from dataclasses import replace
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from benchmarks import seed
+from care.emr.models.charge_item import ChargeItem
+from care.emr.models.invoice import Invoice
+from care.emr.models.scheduling.booking import TokenBooking
+from care.emr.models.scheduling.schedule import Schedule
+from care.emr.resources.charge_item.spec import ChargeItemStatusOptions
+from care.emr.resources.invoice.spec import InvoiceStatusOptions
+from care.utils.time_util import care_now
+from care_state_hmis import billing_service, invoicing, revisit, revisit_policy
+
+ainvoice_booking = async_to_sync(billing_service.ainvoice_booking)
+# The async path checks the ledger before loading the booking
+PATHS = {"sync": (billing_service.invoice_booking, 0), "async": (ainvoice_booking, 1)}
+WRITES = ("INSERT", "UPDATE", "DELETE")
+
+
+# Schedule-scoped revisits: the seeded resources need not be healthcare services
+@override_settings(PLUGIN_CONFIGS={"care_state_hmis": {"HMIS_INVOICE_ALLOW_REVISIT_ACROSS_DEPARTMENTS": False}})
+class InvoiceBookingQueryTests(TestCase):
+    """Queries of the new visit, charged revisit and free revisit paths."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.fixture = seed.seed_facility(seed.make_rng(20), patients=2, schedules=2, history=0, revisit_allowed_days=7)
+        cls.new_patient, cls.returning = cls.fixture.patients
+        cls.charged, cls.free = cls.fixture.schedules
+        Schedule.objects.filter(id=cls.free.schedule.id).update(revisit_charge_item_definition=None)
+        # A paid visit inside the revisit window of both schedules
+        for entry in cls.fixture.schedules:
+            seed.paid_booking(cls.fixture, cls.returning, entry, entry.definition, care_now() - timedelta(days=2))
+
+    def setUp(self):
+        self.rng = seed.make_rng(20)
+        # Policies are loaded once per schedule, not per booking
+        for entry in self.fixture.schedules:
+            revisit_policy.policy_for(entry.schedule.id)
+
+    def _pending(self, patient, entry, appointment_resource=True):
+        fixture = replace(self.fixture, patients=[patient], schedules=[entry])
+        return seed.pending_bookings(self.rng, fixture, 1, appointment_resource)[0]
+
+    def _linked(self, patient, entry, appointment_resource=True):
+        """A booking linked to its default charge item as the view leaves it, without the booking receiver."""
+        booking, charge_item = self._pending(patient, entry, appointment_resource)
+        charge_item.save()
+        TokenBooking.objects.filter(pk=booking.pk).update(charge_item=charge_item)
+        return booking
+
+    def _cases(self):
+        return {
+            revisit.NEW_VISIT: (self.new_patient, self.charged),
+            revisit.REVISIT: (self.returning, self.charged),
+            revisit.FREE_REVISIT: (self.returning, self.free),
+        }
+
+    def test_decision_before_the_insert(self):
+        for decision, (patient, entry) in self._cases().items():
+            with self.subTest(decision):
+                booking, charge_item = self._pending(patient, entry)
+                # The booking lookup and the history lookup, plus loading and
+                # pricing the revisit definition
+                expected = 2
+                if decision == revisit.REVISIT:
+                    expected += 1
+                    loaded = TokenBooking.objects.select_related("patient").get(pk=booking.pk)
+                    with CaptureQueriesContext(connection) as pricing:
+                        revisit.build_revisit_charge_item(loaded, entry.schedule.revisit_charge_item_definition, charge_item.facility)
+                    expected += len(pricing)
+                with self.assertNumQueries(expected):
+                    billing_service.decide_visit(charge_item)
+                self.assertEqual(revisit.visit_decision(charge_item), decision)
+                if decision == revisit.REVISIT:
+                    self.assertEqual(charge_item.charge_item_definition_id, entry.schedule.revisit_charge_item_definition_id)
+                else:
+                    self.assertEqual(charge_item.charge_item_definition_id, entry.definition.id)
+                free = decision == revisit.FREE_REVISIT
+                expected_status = ChargeItemStatusOptions.not_billable if free else ChargeItemStatusOptions.billable
+                self.assertEqual(charge_item.status, expected_status.value)
+
+    def test_decided_bookings_cost_one_load(self):
+        for path, (invoice, extra) in PATHS.items():
+            for decision, (patient, entry) in self._cases().items():
+                with self.subTest(path=path, decision=decision):
+                    booking = self._linked(patient, entry)
+                    with mock.patch.object(invoicing, "create_automated_invoice") as create, CaptureQueriesContext(connection) as captured:
+                        invoice(booking)
+                    self.assertEqual(len(captured), 1 + extra)
+                    # Free revisits are neither rewritten nor invoiced
+                    self.assertEqual(create.call_count, int(decision != revisit.FREE_REVISIT))
+                    self.assertFalse([query for query in captured if query["sql"].startswith(WRITES)])
+
+    def test_undecided_bookings_decide_on_the_booking_path(self):
+        for path, (invoice, extra) in PATHS.items():
+            with self.subTest(path=path, decision=revisit.NEW_VISIT):
+                booking = self._linked(self.new_patient, self.charged, appointment_resource=False)
+                # The load and the history lookup
+                with mock.patch.object(invoicing, "create_automated_invoice") as create, self.assertNumQueries(2 + extra):
+                    invoice(booking)
+                create.assert_called_once()
+
+            with self.subTest(path=path, decision=revisit.FREE_REVISIT):
+                booking = self._linked(self.returning, self.free, appointment_resource=False)
+                # The load, the history lookup and marking the item not billable in place
+                with mock.patch.object(invoicing, "create_automated_invoice") as create, self.assertNumQueries(3 + extra):
+                    invoice(booking)
+                create.assert_not_called()
+                charge_item = TokenBooking.objects.select_related("charge_item").get(pk=booking.pk).charge_item
+                self.assertEqual(charge_item.status, ChargeItemStatusOptions.not_billable.value)
+                self.assertEqual(revisit.visit_decision(charge_item), revisit.FREE_REVISIT)
+
+    def test_undecided_charged_revisit_is_replaced(self):
+        booking = self._linked(self.returning, self.charged, appointment_resource=False)
+        default_id = TokenBooking.objects.get(pk=booking.pk).charge_item_id
+        with mock.patch.object(invoicing, "create_automated_invoice") as create:
+            billing_service.invoice_booking(booking)
+        charge_item = create.call_args.args[1]
+        self.assertEqual(charge_item.charge_item_definition_id, self.charged.schedule.revisit_charge_item_definition_id)
+        self.assertEqual(TokenBooking.objects.get(pk=booking.pk).charge_item_id, charge_item.id)
+        self.assertFalse(ChargeItem.objects.filter(id=default_id).exists())
+
+    def test_unlinked_booking_stops_after_loading_it(self):
+        booking, _ = self._pending(self.new_patient, self.charged)
+        with self.assertNumQueries(1):
+            self.assertIsNone(billing_service.invoice_booking(booking))
+        # The ledger check, then the load
+        with self.assertNumQueries(2):
+            self.assertIsNone(ainvoice_booking(booking))
+
+    def test_repeat_async_call_stops_at_the_ledger(self):
+        booking = self._linked(self.new_patient, self.charged)
+        self.assertIsNotNone(ainvoice_booking(booking))
+        with self.assertNumQueries(1):
+            self.assertIsNone(ainvoice_booking(booking))
+
+    def test_async_path_invoices_like_the_sync_path(self):
+        invoices = {}
+        for path, (invoice, _) in PATHS.items():
+            booking = self._linked(self.new_patient, self.charged)
+            invoices[path] = invoice(booking)
+            charge_item = TokenBooking.objects.select_related("charge_item").get(pk=booking.pk).charge_item
+            self.assertEqual(charge_item.paid_invoice_id, invoices[path].id)
+        rows = Invoice.objects.filter(id__in=[invoice.id for invoice in invoices.values()]).values_list("status", "total_net")
+        self.assertEqual(len(set(rows)), 1)
+        self.assertNotEqual(rows[0][0], InvoiceStatusOptions.draft.value)
@@ -0,0 +1,36 @@
+from unittest import mock
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, override_settings
+
+from care_state_hmis import invoice_numbers
+
+
+def template(value):
+    return override_settings(PLUGIN_CONFIGS={"care_state_hmis": {"HMIS_INVOICE_NUMBER_FORMAT": value}})
+
+
+class InvoiceNumberFormatTests(SimpleTestCase):
+    def setUp(self):
+        self.addCleanup(invoice_numbers.allocator.reset)
+
+    def test_template_is_validated(self):
+        for value in ("{yy}-{sequence}", "OP-{count}", "OP-{yy}", "OP-{sequence", "OP-{sequence:q}"):
+            with self.subTest(value), template(value), self.assertRaises(ImproperlyConfigured):
+                invoice_numbers.check_configuration()
+        with template("OP{yy}{month}-{sequence:06d}"):
+            invoice_numbers.check_configuration()
+
+    def test_overlapping_expression_is_refused(self):
+        facility = mock.Mock(id=7)
+        expression = mock.patch.object(invoice_numbers, "evaluate_invoice_identifier_default_expression")
+        with template("INV-{year}-{sequence}"), expression as evaluate:
+            evaluate.return_value = "INV-2026-41"
+            with self.assertRaisesMessage(ImproperlyConfigured, "facility 7"):
+                invoice_numbers.allocator.check_facility(facility)
+
+            # A distinct prefix passes, and is checked once per process
+            evaluate.return_value = "IP/2026/41"
+            invoice_numbers.allocator.check_facility(facility)
+            invoice_numbers.allocator.check_facility(facility)
+        self.assertEqual(evaluate.call_count, 2)
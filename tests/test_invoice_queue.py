@@ -0,0 +1,83 @@
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from benchmarks import seed
+from care.emr.models.invoice import Invoice
+from care.emr.models.payment_reconciliation import PaymentReconciliation
+from care.emr.resources.invoice.spec import InvoiceStatusOptions
+from care_state_hmis import invoicing, tasks
+from care_state_hmis.models import PendingAppointmentInvoice
+
+QUEUED = {"HMIS_INVOICE_ASYNC_AUTOMATION": True, "HMIS_INVOICE_QUEUE_MAX_ATTEMPTS": 2}
+
+
+def failing_once(function):
+    calls = []
+
+    def wrapper(*args, **kwargs):
+        calls.append(args)
+        if len(calls) == 1:
+            raise RuntimeError("settlement failed")
+        return function(*args, **kwargs)
+
+    return wrapper
+
+
+@override_settings(PLUGIN_CONFIGS={"care_state_hmis": QUEUED})
+class InvoiceQueueTests(TestCase):
+    def setUp(self):
+        self.fixture = seed.seed_facility(seed.make_rng(3), patients=1, schedules=1, history=0)
+        self.patient = self.fixture.patients[0]
+        self.task = tasks.process_appointment_invoice_queue
+        # Run the task in-process when it is queued, as Celery's eager mode does
+        patcher = mock.patch.object(self.task, "delay", lambda: self.task.apply())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _book(self):
+        booking, charge_item = seed.pending_bookings(seed.make_rng(3), self.fixture, 1)[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            charge_item.save()
+            booking.charge_item = charge_item
+            booking.save(update_fields=["charge_item"])
+        return booking
+
+    def _expire_claims(self):
+        PendingAppointmentInvoice.objects.update(claimed_until=None)
+
+    def test_retried_claim_creates_one_invoice(self):
+        with mock.patch.object(invoicing, "settle_invoice", failing_once(invoicing.settle_invoice)):
+            booking = self._book()
+            entry = PendingAppointmentInvoice.objects.get(booking_id=booking.id)
+            # The draft survived the failed settlement
+            self.assertEqual((entry.attempts, entry.processed_at), (1, None))
+            self.assertIn("settlement failed", entry.last_error)
+            self.assertIsNotNone(entry.invoice_id)
+
+            self._expire_claims()
+            self.task.apply()
+
+        entry.refresh_from_db()
+        self.assertIsNotNone(entry.processed_at)
+        invoices = Invoice.objects.filter(patient=self.patient)
+        self.assertEqual(list(invoices.values_list("id", "status")), [(entry.invoice_id, InvoiceStatusOptions.issued.value)])
+        self.assertEqual(PaymentReconciliation.objects.filter(target_invoice_id=entry.invoice_id).count(), 1)
+
+    def test_failing_booking_is_parked_and_reported(self):
+        with mock.patch.object(invoicing, "_settle_entry", side_effect=RuntimeError("settlement failed")):
+            self._book()
+            self._expire_claims()
+            self.task.apply()
+            self._expire_claims()
+            # Out of attempts: no longer claimed
+            self.assertEqual(invoicing.process_invoice_queue(), 0)
+        self.assertEqual(PendingAppointmentInvoice.objects.get().attempts, 2)
+        stats = invoicing.invoice_queue_stats()
+        self.assertEqual((stats["depth"], stats["parked"]), (0, 1))
+
+        self.assertEqual(invoicing.retry_parked_invoices(), 1)
+        self.assertEqual(invoicing.process_invoice_queue(), 1)
+        stats = invoicing.invoice_queue_stats()
+        self.assertEqual((stats["depth"], stats["parked"]), (0, 0))
+        self.assertEqual(Invoice.objects.filter(patient=self.patient).count(), 1)
@@ -0,0 +1,52 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+
+from benchmarks import seed
+from care.utils.time_util import care_now
+from care_state_hmis import revisit, revisit_policy
+from care_state_hmis.models import LastPaidVisit
+
+USE_TABLE = {"care_state_hmis": {"HMIS_REVISIT_USE_LAST_PAID_VISIT": True}}
+
+
+@override_settings(PLUGIN_CONFIGS=USE_TABLE)
+class LastPaidVisitTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.fixture = seed.seed_facility(seed.make_rng(3), patients=2, schedules=2, history=5)
+        cls.patient = cls.fixture.patients[0]
+        # The latest visit was charged with the first schedule's revisit definition
+        entry = cls.fixture.schedules[0]
+        seed.paid_booking(cls.fixture, cls.patient, entry, entry.schedule.revisit_charge_item_definition, care_now() - timedelta(hours=1))
+
+    def _answers(self):
+        """``(table answer, live answer)`` for every schedule's policy."""
+        now = care_now()
+        for entry in self.fixture.schedules:
+            policy = revisit_policy.policy_for(entry.schedule.id)
+            live = revisit.live_last_paid_on(self.patient.id, policy.scope, policy.scope_id, now, policy.revisit_definition_id)
+            yield revisit.last_paid_on(self.patient.id, policy, now), live
+
+    def test_missing_row_falls_back_to_live_scan(self):
+        self.assertFalse(LastPaidVisit.objects.exists())
+        for stored, live in self._answers():
+            self.assertIsNotNone(live)
+            self.assertEqual(stored, live)
+
+    def test_table_agrees_with_live_scan(self):
+        call_command("hmis_backfill_last_paid_visits", stdout=StringIO())
+        self.assertTrue(LastPaidVisit.objects.filter(patient_id=self.patient.id).exists())
+        for stored, live in self._answers():
+            self.assertEqual(stored, live)
+        call_command("hmis_check_last_paid_visits", stdout=StringIO())
+
+    def test_check_reports_rows_that_disagree_with_live_scan(self):
+        call_command("hmis_backfill_last_paid_visits", stdout=StringIO())
+        LastPaidVisit.objects.filter(patient_id=self.patient.id).update(paid_on=care_now() - timedelta(days=400))
+        with self.assertRaises(CommandError):
+            call_command("hmis_check_last_paid_visits", stdout=StringIO())
+        call_command("hmis_check_last_paid_visits", fix=True, stdout=StringIO())
+        call_command("hmis_check_last_paid_visits", stdout=StringIO())
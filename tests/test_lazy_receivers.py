@@ -0,0 +1,35 @@
+import importlib
+import weakref
+from unittest import mock
+
+from django.apps import apps
+from django.test import SimpleTestCase
+
+from care_state_hmis import signals
+
+
+class LazyReceiverTests(SimpleTestCase):
+    def _connected(self, signal, dispatch_uid):
+        return [(key, receiver) for key, receiver, *_ in signal.receivers if key[0] == dispatch_uid]
+
+    def test_each_stub_is_connected_once_and_dispatches(self):
+        # Connecting again (e.g. a re-imported module) must not duplicate them
+        signals.connect_receivers()
+        for signal, sender, module, name, dispatch_uid in signals.RECEIVERS:
+            with self.subTest(dispatch_uid):
+                model = apps.get_model(sender)
+                ((key, stub),) = self._connected(signal, dispatch_uid)
+                self.assertEqual(key, (dispatch_uid, id(model)))
+                # Held strongly, not through a weak reference
+                self.assertNotIsInstance(stub, weakref.ReferenceType)
+                self.assertEqual((stub.__module__, stub.__name__), (module, name))
+
+                instance = object()
+                with mock.patch.object(importlib.import_module(module), name) as receiver, mock.patch.object(stub, "resolved", None):
+                    stub(sender=model, instance=instance)
+                    stub(sender=model, instance=instance)
+                self.assertEqual(receiver.call_args_list, [mock.call(sender=model, instance=instance)] * 2)
+
+    def test_dispatch_uids_are_unique(self):
+        uids = [dispatch_uid for *_, dispatch_uid in signals.RECEIVERS]
+        self.assertEqual(len(uids), len(set(uids)))
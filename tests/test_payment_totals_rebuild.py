@@ -0,0 +1,56 @@
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TransactionTestCase
+
+from benchmarks import seed
+from benchmarks.harness import run_operations
+from care_state_hmis.models import InvoicePaymentTotal
+
+COMMAND = "hmis_rebuild_invoice_payment_totals"
+
+
+class RebuildInvoicePaymentTotalsTests(TransactionTestCase):
+    def setUp(self):
+        fixture = seed.seed_facility(seed.make_rng(5), patients=4, schedules=1, history=0)
+        self.invoices = seed.issued_invoices(fixture, 4, payments_each=3)
+        self.invoice_ids = [invoice.id for invoice, _ in self.invoices]
+        # One drifted row and one missing row
+        InvoicePaymentTotal.objects.filter(invoice_id=self.invoice_ids[0]).update(total_payments=99)
+        InvoicePaymentTotal.objects.filter(invoice_id=self.invoice_ids[1]).delete()
+
+    def _totals(self):
+        return dict(InvoicePaymentTotal.objects.filter(invoice_id__in=self.invoice_ids).values_list("invoice_id", "total_payments"))
+
+    def _run(self, *args):
+        out = StringIO()
+        call_command(COMMAND, *args, stdout=out)
+        return out.getvalue()
+
+    def test_dry_run_reports_and_rebuild_repairs(self):
+        before = self._totals()
+        self.assertIn("Found 2 drifted totals across 4 invoices", self._run("--dry-run"))
+        self.assertEqual(self._totals(), before)
+        self.assertIn("Repaired 2 drifted totals across 4 invoices", self._run("--batch-size", "3"))
+        self.assertEqual(self._totals(), dict.fromkeys(self.invoice_ids, Decimal(3)))
+        self.assertIn("Repaired 0 drifted totals", self._run())
+
+    def test_payments_posted_during_the_rebuild_are_kept(self):
+        def pay(invoice, charge_item):
+            def operation():
+                with transaction.atomic():
+                    seed.new_payment(charge_item, invoice).save()
+
+            return operation
+
+        def rebuild():
+            self._run("--batch-size", "2")
+
+        payments = [pay(*self.invoices[index % len(self.invoices)]) for index in range(32)]
+        operations = [operation for index, payment in enumerate(payments) for operation in ([payment, rebuild] if index % 8 == 0 else [payment])]
+        result = run_operations(operations, workers=8, atomic=False)
+        self.assertEqual(result["errors"], 0, result.get("first_error"))
+        # 3 seeded and 8 posted per invoice, whatever order the rebuilds ran in
+        self.assertEqual(self._totals(), dict.fromkeys(self.invoice_ids, Decimal(11)))
@@ -0,0 +1,73 @@
+from unittest import mock
+
+from django.db import connections
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from care_state_hmis import replica
+from care_state_hmis.models import InvoiceNumberBlock
+
+REPLICA = "hmis_replica"
+
+
+@override_settings(
+    DATABASE_ROUTERS=[replica.ROUTER],
+    PLUGIN_CONFIGS={"care_state_hmis": {"HMIS_REPLICA_DATABASE": REPLICA, "HMIS_REPLICA_LAG_CHECK_SECONDS": 0}},
+)
+class ReplicaRoutingTests(TransactionTestCase):
+    """Routing between the primary and a replica alias mirroring it, as Django's test MIRROR does."""
+
+    databases = {"default", REPLICA}
+
+    @classmethod
+    def setUpClass(cls):
+        default = connections["default"].settings_dict
+        connections.settings[REPLICA] = {**default, "TEST": {**default["TEST"], "MIRROR": "default"}}
+        cls.addClassCleanup(cls._remove_replica)
+        super().setUpClass()
+
+    @classmethod
+    def _remove_replica(cls):
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.settings[REPLICA]
+
+    def setUp(self):
+        self.block = InvoiceNumberBlock.objects.create(facility_id=1)
+        lag = mock.patch.object(replica, "measure_lag", return_value=0.0)
+        self.lag = lag.start()
+        self.addCleanup(lag.stop)
+
+    def _queries(self, operation):
+        """``(primary, replica)`` query counts of ``operation``."""
+        with CaptureQueriesContext(connections["default"]) as primary, CaptureQueriesContext(connections[REPLICA]) as mirrored:
+            result = operation()
+        return (len(primary), len(mirrored)), result
+
+    def _read(self):
+        return InvoiceNumberBlock.objects.get(id=self.block.id)
+
+    def test_primary_reads_pin_reads_to_the_primary(self):
+        self.assertEqual(self._queries(self._read)[0], (1, 0))
+        with replica.replica_reads() as alias:
+            self.assertEqual(alias, REPLICA)
+            self.assertEqual(self._queries(self._read)[0], (0, 1))
+            with replica.primary_reads():
+                self.assertEqual(self._queries(self._read)[0], (1, 0))
+            # Reads after the block go back to the replica
+            self.assertEqual(self._queries(self._read)[0], (0, 1))
+        self.assertEqual(self._queries(self._read)[0], (1, 0))
+
+    def test_lagging_replica_is_skipped(self):
+        self.lag.return_value = 60.0
+        with replica.replica_reads() as alias:
+            self.assertEqual(alias, "default")
+            self.assertEqual(self._queries(self._read)[0], (1, 0))
+
+    def test_instances_read_from_the_replica_are_saved_to_the_primary(self):
+        with replica.replica_reads():
+            counts, block = self._queries(self._read)
+            self.assertEqual((counts, block._state.db), ((0, 1), REPLICA))  # noqa: SLF001
+            block.next_value = 101
+            self.assertEqual(self._queries(block.save)[0], (1, 0))
+        self.assertEqual(InvoiceNumberBlock.objects.get(id=self.block.id).next_value, 101)
@@ -0,0 +1,47 @@
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from care.security.permissions.patient import PatientPermissions
+from care.utils.tests.base import CareAPITestBase
+from care_state_hmis.api import DailyStatsView, MonthlyStatsView
+from care_state_hmis.authorization.reports import REPORT_PERMISSION
+
+OTHER_PERMISSION = next(permission.name for permission in PatientPermissions if permission.name != REPORT_PERMISSION)
+
+
+class FacilityReportAccessTests(CareAPITestBase):
+    def setUp(self):
+        super().setUp()
+        self.facility = self.create_facility(user=self.create_user())
+        self.organization = self.create_facility_organization(facility=self.facility)
+        self.factory = APIRequestFactory()
+
+    def _member(self, permission):
+        user = self.create_user()
+        self.attach_role_facility_organization_user(self.organization, user, self.create_role_with_permissions(permissions=[permission]))
+        return user
+
+    def _status(self, view, query, user):
+        request = self.factory.get("/", query)
+        force_authenticate(request, user=user)
+        return view.as_view()(request, facility_external_id=self.facility.external_id).status_code
+
+    def _statuses(self, user):
+        return (
+            self._status(DailyStatsView, {"date_from": "2026-01-01", "date_to": "2026-01-31"}, user),
+            self._status(MonthlyStatsView, {"year": 2026, "month": 1}, user),
+        )
+
+    def test_report_permission_grants_access(self):
+        self.assertEqual(self._statuses(self._member(REPORT_PERMISSION)), (200, 200))
+
+    def test_membership_without_the_permission_is_denied(self):
+        self.assertEqual(self._statuses(self._member(OTHER_PERMISSION)), (403, 403))
+
+    def test_other_facility_membership_is_denied(self):
+        other = self.create_facility_organization(facility=self.create_facility(user=self.create_user()))
+        user = self.create_user()
+        self.attach_role_facility_organization_user(other, user, self.create_role_with_permissions(permissions=[REPORT_PERMISSION]))
+        self.assertEqual(self._statuses(user), (403, 403))
+
+    def test_superuser_has_access(self):
+        self.assertEqual(self._statuses(self.create_super_user()), (200, 200))
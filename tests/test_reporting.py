@@ -0,0 +1,119 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import DatabaseError, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from model_bakery import baker
+
+from benchmarks import seed
+from benchmarks.harness import run_operations
+from care.emr.models.charge_item import ChargeItem
+from care.emr.models.encounter import Encounter
+from care.emr.models.payment_reconciliation import PaymentReconciliation
+from care.emr.models.scheduling.booking import TokenBooking
+from care.emr.resources.charge_item.spec import ChargeItemStatusOptions
+from care.emr.resources.scheduling.slot.spec import CANCELLED_STATUS_CHOICES
+from care.utils.time_util import care_now
+from care_state_hmis import reporting, revisit, tasks
+from care_state_hmis.models import DailyFacilityStat
+
+INLINE = override_settings(PLUGIN_CONFIGS={"care_state_hmis": {"HMIS_DAILY_STATS_REFRESH_WINDOW_SECONDS": 0}})
+
+
+class DailyStatRefreshTests(TransactionTestCase):
+    def setUp(self):
+        self.fixture = seed.seed_facility(seed.make_rng(3), patients=2, schedules=1, history=0)
+        # Six payments of 1 today, written without the receivers
+        seed.issued_invoices(self.fixture, 2, payments_each=3)
+        self.facility_id = self.fixture.facility.id
+        self.today = timezone.localdate()
+
+    def _revenue(self):
+        return list(
+            DailyFacilityStat.objects.filter(facility_id=self.facility_id, metric=DailyFacilityStat.Metric.revenue).values_list(
+                "date", "dimension", "value"
+            )
+        )
+
+    def test_concurrent_refreshes_of_one_day_do_not_collide(self):
+        operations = [lambda: reporting.refresh_day(reporting.REVENUE, self.facility_id, self.today)] * 16
+        result = run_operations(operations, workers=8, atomic=False)
+        self.assertEqual(result["errors"], 0, result.get("first_error"))
+        self.assertEqual(self._revenue(), [(self.today, "", Decimal(6))])
+
+    def test_refresh_updates_in_place_and_drops_emptied_rows(self):
+        reporting.refresh_day(reporting.REVENUE, self.facility_id, self.today)
+        row_id = DailyFacilityStat.objects.get(facility_id=self.facility_id).id
+        PaymentReconciliation.objects.filter(facility_id=self.facility_id).first().delete()
+        reporting.refresh_day(reporting.REVENUE, self.facility_id, self.today)
+        self.assertEqual(DailyFacilityStat.objects.get(id=row_id).value, Decimal(5))
+        PaymentReconciliation.objects.filter(facility_id=self.facility_id).delete()
+        reporting.refresh_day(reporting.REVENUE, self.facility_id, self.today)
+        self.assertEqual(self._revenue(), [])
+
+    @INLINE
+    def test_failed_refresh_is_logged_not_raised(self):
+        with mock.patch.object(reporting, "rebuild", side_effect=DatabaseError), self.assertLogs(reporting.logger, "ERROR"):
+            reporting.mark_dirty(reporting.REVENUE, self.facility_id, timezone.now())
+
+    def test_booking_saves_schedule_one_deferred_refresh_per_day(self):
+        self.addCleanup(cache.clear)
+        entry = self.fixture.schedules[0]
+        bookings = [
+            seed.paid_booking(self.fixture, patient, entry, entry.definition, care_now()) for patient in self.fixture.patients
+        ]
+        with mock.patch.object(tasks.refresh_daily_stats, "apply_async") as apply_async:
+            for _ in range(2):
+                with self.assertNumQueries(1), transaction.atomic():
+                    for booking in bookings:
+                        reporting.mark_booking(booking.id)
+        # Nothing recomputed in the request; the second commit found the day pending
+        apply_async.assert_called_once()
+        self.assertEqual(apply_async.call_args.kwargs["args"], [reporting.OPD, self.facility_id, self.today.isoformat()])
+        self.assertFalse(DailyFacilityStat.objects.filter(metric__startswith="opd").exists())
+
+
+class VisitClassificationTests(TestCase):
+    """OPD and IP figures of one facility-day, as the booking and encounter paths leave them."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.fixture = seed.seed_facility(seed.make_rng(14), patients=3, schedules=1, history=0)
+        cls.facility_id = cls.fixture.facility.id
+        cls.now = care_now()
+        entry = cls.fixture.schedules[0]
+        consultation, revisit_definition = entry.definition, entry.schedule.revisit_charge_item_definition
+        first, second, third = cls.fixture.patients
+
+        def booking(patient, definition, decision=None, **charge_item):
+            booked = seed.paid_booking(cls.fixture, patient, entry, definition, cls.now)
+            if decision:
+                charge_item["meta"] = {revisit.VISIT_KEY: decision}
+            ChargeItem.objects.filter(id=booked.charge_item_id).update(**charge_item)
+            return booked
+
+        # Decided when the charge item was created
+        booking(first, consultation, revisit.NEW_VISIT)
+        booking(second, revisit_definition, revisit.REVISIT)
+        booking(third, consultation, revisit.FREE_REVISIT, status=ChargeItemStatusOptions.not_billable.value)
+        # Linked without a recorded decision
+        booking(first, revisit_definition)
+        booking(second, consultation)
+        # Not counted
+        cancelled = booking(third, consultation, revisit.NEW_VISIT)
+        TokenBooking.objects.filter(id=cancelled.id).update(status=next(iter(CANCELLED_STATUS_CHOICES)))
+        unlinked = booking(third, consultation)
+        TokenBooking.objects.filter(id=unlinked.id).update(charge_item=None)
+
+        for encounter_class in ("imp", "amb"):
+            Encounter.objects.filter(
+                id=baker.make(Encounter, facility=cls.fixture.facility, patient=first, encounter_class=encounter_class).id
+            ).update(created_date=cls.now)
+
+    def test_opd_and_ip_totals(self):
+        day = timezone.localdate(self.now)
+        totals = reporting.compute([reporting.OPD, reporting.IP], day, day, [self.facility_id])
+        expected = {"opd_new": 2, "opd_revisit": 3, "ip_admissions": 1}
+        self.assertEqual({metric: totals[(self.facility_id, day, metric, "")] for metric in expected}, expected)
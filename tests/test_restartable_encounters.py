@@ -0,0 +1,73 @@
+import random
+
+from model_bakery import baker
+
+from care.emr.models.encounter import Encounter
+from care.emr.models.location import FacilityLocation
+from care.emr.resources.encounter.constants import COMPLETED_CHOICES
+from care.security.authorization.base import AuthorizationController
+from care.security.permissions.encounter import EncounterPermissions
+from care.utils.tests.base import CareAPITestBase
+from care_state_hmis.authorization.encounter import filter_restartable_encounters
+
+CAN_WRITE = EncounterPermissions.can_write_encounter.name
+OTHER_PERMISSION = next(permission.name for permission in EncounterPermissions if permission.name != CAN_WRITE)
+STATUSES = [*COMPLETED_CHOICES, "in_progress", "planned"]
+
+
+class RestartableEncounterFilterTests(CareAPITestBase):
+    """``filter_restartable_encounters`` must agree with ``can_restart_encounter_obj`` on generated encounters."""
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user()
+        self.other_user = self.create_user()
+        self.facility = self.create_facility(user=self.other_user)
+        # Write access, another permission only, and no membership
+        self.organizations = [self.create_facility_organization(facility=self.facility) for _ in range(3)]
+        self.attach_role_facility_organization_user(self.organizations[0], self.user, self.create_role_with_permissions(permissions=[CAN_WRITE]))
+        self.attach_role_facility_organization_user(
+            self.organizations[1], self.user, self.create_role_with_permissions(permissions=[OTHER_PERMISSION])
+        )
+        self.patient = self.create_patient()
+
+    def _organization_ids(self, rng):
+        return [organization.id for organization in rng.sample(self.organizations, rng.randint(0, len(self.organizations)))]
+
+    def _generate(self, rng, count):
+        locations = [None]
+        for _ in range(3):
+            location = baker.make(FacilityLocation, facility=self.facility)
+            FacilityLocation.objects.filter(id=location.id).update(facility_organization_cache=self._organization_ids(rng))
+            locations.append(location)
+        encounters = baker.make(Encounter, facility=self.facility, patient=self.patient, _quantity=count)
+        for encounter in encounters:
+            location = rng.choice(locations)
+            Encounter.objects.filter(id=encounter.id).update(
+                status=rng.choice(STATUSES),
+                updated_by=rng.choice([self.user, self.other_user]),
+                facility_organization_cache=self._organization_ids(rng),
+                current_location=location,
+            )
+        return Encounter.objects.filter(id__in=[encounter.id for encounter in encounters])
+
+    def _assert_agrees(self, user, queryset):
+        expected = {
+            encounter.id for encounter in queryset if AuthorizationController.call("can_restart_encounter_obj", user, encounter)
+        }
+        filtered = set(filter_restartable_encounters(user, queryset).values_list("id", flat=True))
+        self.assertEqual(filtered, expected)
+        return expected
+
+    def test_agrees_with_per_object_check(self):
+        restartable = set()
+        for seed in range(5):
+            queryset = self._generate(random.Random(seed), 40)  # noqa: S311
+            restartable |= self._assert_agrees(self.user, queryset)
+        # The generated data exercises both outcomes
+        self.assertTrue(restartable)
+        self.assertLess(len(restartable), Encounter.objects.count())
+
+    def test_agrees_for_superuser(self):
+        queryset = self._generate(random.Random(99), 20)  # noqa: S311
+        self.assertEqual(len(self._assert_agrees(self.create_super_user(), queryset)), 20)
@@ -0,0 +1,48 @@
+import importlib
+
+from django.db import connection
+from django.db.migrations.loader import MigrationLoader
+from django.test import TestCase
+
+from benchmarks import seed
+from care.emr.models.scheduling.booking import TokenBooking
+from care_state_hmis import billing_service, revisit, revisit_policy
+
+
+class RevisitLookupQueryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.fixture = seed.seed_facility(seed.make_rng(1), patients=3, schedules=2, history=4)
+        booking, charge_item = seed.pending_bookings(seed.make_rng(2), cls.fixture, 1)[0]
+        charge_item.save()
+        TokenBooking.objects.filter(pk=booking.pk).update(charge_item=charge_item)
+        cls.booking = booking
+
+    def test_booking_context_is_one_query(self):
+        with self.assertNumQueries(1):
+            loaded = TokenBooking.objects.select_related(*billing_service.BOOKING_RELATIONS).get(pk=self.booking.pk)
+            self.assertEqual(loaded.charge_item.facility, self.fixture.facility)
+            self.assertIsNotNone(loaded.token_slot.availability.schedule_id)
+
+    def test_live_lookup_is_one_query(self):
+        slot = self.booking.token_slot
+        policy = revisit_policy.policy_for(slot.availability.schedule_id)
+        with self.assertNumQueries(1):
+            last_paid_on = revisit.last_paid_on(self.booking.patient_id, policy, slot.start_datetime)
+
+        history = revisit.paid_history([self.booking.patient_id])
+        expected = revisit.pick_last_paid_on(
+            history, self.booking.patient_id, policy.scope, policy.scope_id, slot.start_datetime, policy.revisit_definition_id
+        )
+        self.assertEqual(last_paid_on, expected)
+
+
+class PaidPatientIndexMigrationTests(TestCase):
+    def test_depends_on_an_existing_emr_migration(self):
+        migration = importlib.import_module("care_state_hmis.migrations.0008_tokenbooking_paid_patient_index")
+        self.assertIn(migration.emr_dependency(), MigrationLoader(connection).graph.nodes)
+
+    def test_index_exists(self):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, TokenBooking._meta.db_table)  # noqa: SLF001
+        self.assertIn("hmis_booking_paid_patient_idx", constraints)
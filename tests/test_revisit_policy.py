@@ -0,0 +1,55 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from benchmarks import seed
+from care.emr.models.charge_item_definition import ChargeItemDefinition
+from care.emr.models.scheduling.schedule import Schedule
+from care.utils.time_util import care_now
+from care_state_hmis import billing_service, revisit, revisit_policy
+
+
+class RevisitPolicyCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.fixture = seed.seed_facility(seed.make_rng(19), patients=1, schedules=1, history=0, revisit_allowed_days=7)
+        cls.entry = cls.fixture.schedules[0]
+        cls.patient = cls.fixture.patients[0]
+        seed.paid_booking(cls.fixture, cls.patient, cls.entry, cls.entry.definition, care_now() - timedelta(days=2))
+
+    def setUp(self):
+        cache.clear()
+        revisit_policy._local.clear()  # noqa: SLF001
+        self.schedule_id = self.entry.schedule.id
+        self.policy = revisit_policy.policy_for(self.schedule_id)
+
+    def test_policy_holds_ids_and_scalars(self):
+        self.assertEqual(self.policy.revisit_definition_id, self.entry.schedule.revisit_charge_item_definition_id)
+        self.assertFalse(any(hasattr(value, "_meta") for value in vars(self.policy).values()))
+        with self.assertNumQueries(0):
+            self.assertIs(revisit_policy.policy_for(self.schedule_id), self.policy)
+
+    def test_schedule_save_invalidates_after_commit(self):
+        schedule = Schedule.objects.get(id=self.schedule_id)
+        schedule.revisit_allowed_days = 30
+        with self.captureOnCommitCallbacks(execute=True):
+            schedule.save()
+            # Not before the change commits
+            self.assertEqual(revisit_policy.policy_for(self.schedule_id).revisit_allowed_days, 7)
+        self.assertEqual(revisit_policy.policy_for(self.schedule_id).revisit_allowed_days, 30)
+
+        revisit_definition = seed._definition(self.fixture.facility, "Follow-up", 30)  # noqa: SLF001
+        schedule.revisit_charge_item_definition = revisit_definition
+        with self.captureOnCommitCallbacks(execute=True):
+            schedule.save()
+        self.assertEqual(revisit_policy.policy_for(self.schedule_id).revisit_definition_id, revisit_definition.id)
+
+    def test_definition_change_applies_without_invalidation(self):
+        ChargeItemDefinition.objects.filter(id=self.policy.revisit_definition_id).update(title="Revisit (revised)")
+        booking, charge_item = seed.pending_bookings(seed.make_rng(19), self.fixture, 1)[0]
+        billing_service.decide_visit(charge_item)
+        self.assertEqual(revisit.visit_decision(charge_item), revisit.REVISIT)
+        self.assertEqual(charge_item.title, "Revisit (revised)")
+        # The cached policy itself was not reloaded
+        self.assertIs(revisit_policy.policy_for(self.schedule_id), self.policy)
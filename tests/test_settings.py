@@ -0,0 +1,65 @@
+import os
+from unittest import mock
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, override_settings
+
+from care_state_hmis.settings import PluginSettings, plugin_settings
+
+PLUGIN = "hmis_settings_test"
+DEFAULTS = {"HMIS_TEST_FLAG": False, "HMIS_TEST_COUNT": 10, "HMIS_TEST_NAME": ""}
+
+
+def configured(**values):
+    return override_settings(PLUGIN_CONFIGS={PLUGIN: values})
+
+
+class PluginSettingsTests(SimpleTestCase):
+    def _settings(self, **kwargs):
+        return PluginSettings(PLUGIN, defaults=DEFAULTS, **kwargs)
+
+    def test_reload_binds_values_onto_the_instance(self):
+        settings = self._settings()
+        with configured(HMIS_TEST_COUNT=3):
+            snapshot = settings.reload()
+        # Served from the instance dict, not through __getattr__
+        self.assertEqual(settings.__dict__["HMIS_TEST_COUNT"], 3)
+        self.assertEqual(snapshot.as_dict(), {**DEFAULTS, "HMIS_TEST_COUNT": 3})
+        self.assertIs(settings.snapshot, snapshot)
+        with self.assertRaises(AttributeError):
+            snapshot.HMIS_TEST_COUNT = 4
+
+        settings.reload()
+        self.assertEqual(settings.HMIS_TEST_COUNT, 10)
+
+    def test_first_read_before_reload_resolves(self):
+        settings = self._settings()
+        with configured(HMIS_TEST_NAME="district"):
+            self.assertEqual(settings.HMIS_TEST_NAME, "district")
+        with self.assertRaises(AttributeError):
+            settings.HMIS_TEST_UNKNOWN  # noqa: B018
+
+    def test_environment_values_are_cast_to_the_default_type(self):
+        settings = self._settings()
+        with configured(), mock.patch.dict(os.environ, {"HMIS_TEST_COUNT": "25", "HMIS_TEST_FLAG": "true"}):
+            settings.reload()
+        self.assertEqual((settings.HMIS_TEST_COUNT, settings.HMIS_TEST_FLAG), (25, True))
+
+    def test_wrong_type_is_rejected(self):
+        with configured(HMIS_TEST_COUNT="ten"), self.assertRaisesMessage(ImproperlyConfigured, "'HMIS_TEST_COUNT' must be int"):
+            self._settings().reload()
+
+    def test_missing_required_setting_is_rejected(self):
+        settings = self._settings(required_settings={"HMIS_TEST_NAME"})
+        with configured(), self.assertRaisesMessage(ImproperlyConfigured, "'HMIS_TEST_NAME' is not configured"):
+            settings.reload()
+        with configured(HMIS_TEST_NAME="district"):
+            settings.reload()
+        self.assertEqual(settings.HMIS_TEST_NAME, "district")
+
+    def test_setting_changed_reloads_the_plugin_settings(self):
+        before = plugin_settings.HMIS_REPLICA_MAX_LAG_SECONDS
+        with override_settings(PLUGIN_CONFIGS={"care_state_hmis": {"HMIS_REPLICA_MAX_LAG_SECONDS": before + 7}}):
+            self.assertEqual(plugin_settings.HMIS_REPLICA_MAX_LAG_SECONDS, before + 7)
+            self.assertEqual(plugin_settings.snapshot.HMIS_REPLICA_MAX_LAG_SECONDS, before + 7)
+        self.assertEqual(plugin_settings.HMIS_REPLICA_MAX_LAG_SECONDS, before)
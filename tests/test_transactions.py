@@ -0,0 +1,62 @@
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase
+
+from care_state_hmis.transactions import OnCommitBatch
+
+
+class _Rollback(Exception):
+    pass
+
+
+class _BatchMixin:
+    def setUp(self):
+        super().setUp()
+        self.flushed = []
+        self.batch = OnCommitBatch(lambda pending: self.flushed.append(dict(pending)))
+
+    def _rolled_back(self, *keys):
+        try:
+            with transaction.atomic():
+                for key in keys:
+                    self.assertTrue(self.batch.add(key))
+                raise _Rollback
+        except _Rollback:
+            pass
+
+
+class OnCommitBatchTransactionTests(_BatchMixin, TransactionTestCase):
+    def test_rollback_then_commit_flushes(self):
+        self._rolled_back(7)
+        self.assertEqual(self.flushed, [])
+
+        with transaction.atomic():
+            self.assertTrue(self.batch.add(7))
+            self.assertFalse(self.batch.add(7))
+        self.assertEqual(self.flushed, [{7: None}])
+
+    def test_one_flush_per_transaction(self):
+        with transaction.atomic():
+            for key in (1, 2, 1, 3):
+                self.batch.add(key)
+        self.assertEqual(self.flushed, [{1: None, 2: None, 3: None}])
+
+    def test_outside_a_transaction_flushes_immediately(self):
+        self.assertTrue(self.batch.add(5, "value"))
+        self.assertEqual(self.flushed, [{5: "value"}])
+
+
+class OnCommitBatchSavepointTests(_BatchMixin, TestCase):
+    def test_savepoint_rollback_forgets_only_its_keys(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.batch.add(1)
+            self._rolled_back(2)
+            self.assertTrue(self.batch.add(2))
+            self.assertFalse(self.batch.add(1))
+        self.assertEqual(sorted(key for flushed in self.flushed for key in flushed), [1, 2])
+
+    def test_keys_of_a_released_savepoint_stay_queued(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.batch.add(3)
+            self.assertFalse(self.batch.add(3))
+        self.assertEqual(self.flushed, [{3: None}])